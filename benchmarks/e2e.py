@@ -0,0 +1,277 @@
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import traceback
+from rich.console import Console
+from rich.table import Table
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FLASK_APP_DIR = os.path.join(REPO_DIR, 'flask_app')
+sys.path.insert(0, REPO_DIR)
+
+from mock_server import MockConfig, MockServer
+
+console = Console()
+
+DEFAULT_OBJECTIVE = "Write a small Python command line tool that converts CSV files to JSON"
+# Seconds between status polls of a run queued in the web UI
+JOB_POLL_SECONDS = 0.02
+
+def entry_points():
+    return sorted(f for f in os.listdir(REPO_DIR) if f.endswith('.py') and f.startswith('maestro') and not f.startswith('maestro_'))
+
+def run_arguments(module_name, args):
+    # Only pass the options the backend declares, as the web UI does
+    import maestro_api_router
+    declared = {arg['name'] for arg in maestro_api_router.get_required_args(module_name) if isinstance(arg, dict)}
+    options = {'want_search': args.search, 'want_file_path': False, 'file_path': '', 'want_parallel': args.parallel, 'max_parallel': args.max_parallel}
+    return {name: value for name, value in options.items() if name in declared}
+
+def mock_delta(before, after):
+    """
+    Returns the mock server requests and serving seconds per stage between two `MockServer.stats()` snapshots.
+    """
+    totals = {}
+    for snapshot, sign in ((after, 1), (before, -1)):
+        for row in snapshot:
+            stage = totals.setdefault(row['stage'], {'requests': 0, 'errors': 0, 'truncated': 0, 'seconds': 0.0})
+            for key in stage:
+                stage[key] += sign * row[key]
+    return {stage: values for stage, values in totals.items() if values['requests']}
+
+def measure_run(server, run, verbose):
+    """
+    Runs one objective and measures its wall time and the mock server's view of it.
+
+    Args:
+        server (MockServer): The mock server the run talks to.
+        run (callable): Executes the run.
+        verbose (bool): Show the run's console output.
+
+    Returns:
+        dict: wall_seconds, busy_seconds (time the mock server was serving the run), error and mock (mock server
+        counters per stage).
+    """
+    before = server.stats()
+    error = None
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        try:
+            run()
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+            if verbose:
+                traceback.print_exc()
+    end = time.perf_counter()
+    return {'wall_seconds': end - start, 'busy_seconds': server.busy_seconds(start, end), 'error': error, 'mock': mock_delta(before, server.stats())}
+
+def cli_run(module_name, args):
+    import maestro_api_router
+    from maestro_journal import new_run_id
+    run_id = new_run_id()
+    return run_id, lambda: maestro_api_router.run_module(module_name, args.objective, run_id=run_id, **run_arguments(module_name, args))
+
+def flask_run(client, module_name, args):
+    """
+    Returns a run that submits the objective to the web UI, as the browser does, and waits for the job to finish.
+    """
+    form = {'selected_file': module_name, 'objective': args.objective}
+    form.update({name: str(value) for name, value in run_arguments(module_name, args).items()})
+    job = {}
+
+    def run():
+        response = client.post('/', data=form)
+        job.update(response.get_json())
+        if response.status_code != 202:
+            raise RuntimeError(job.get('message', f"status {response.status_code}"))
+        while True:
+            status = client.get(job['status_url']).get_json()
+            if status['status'] in ('succeeded', 'failed'):
+                break
+            time.sleep(JOB_POLL_SECONDS)
+        if status['status'] == 'failed':
+            raise RuntimeError(status.get('error'))
+    return job, run
+
+def summarize(name, runs):
+    """
+    Aggregates the runs of one entry point.
+
+    Returns:
+        dict: name, runs, failures, wall time statistics, calls per run and per-stage latencies.
+    """
+    succeeded = [run for run in runs if not run['error']]
+    walls = [run['wall_seconds'] for run in succeeded]
+    stages = {}
+    for run in succeeded:
+        for stage, stats in run['stages'].items():
+            totals = stages.setdefault(stage, {'calls': 0, 'client_seconds': 0.0, 'server_seconds': 0.0, 'server_requests': 0, 'wait_seconds': 0.0})
+            totals['calls'] += stats['calls']
+            totals['client_seconds'] += stats['latency_seconds']
+            totals['wait_seconds'] += stats['wait_seconds']
+        for stage, mock in run['mock'].items():
+            totals = stages.setdefault(stage, {'calls': 0, 'client_seconds': 0.0, 'server_seconds': 0.0, 'server_requests': 0, 'wait_seconds': 0.0})
+            totals['server_seconds'] += mock['seconds']
+            totals['server_requests'] += mock['requests']
+    return {
+        'name': name,
+        'runs': len(runs),
+        'failures': [run['error'] for run in runs if run['error']],
+        'wall_median': statistics.median(walls) if walls else None,
+        'wall_min': min(walls) if walls else None,
+        'wall_max': max(walls) if walls else None,
+        'calls_per_run': sum(stage['calls'] for stage in stages.values()) / len(succeeded) if succeeded else None,
+        # Time no model or search request was in flight: orchestration, output, journaling and file writes, and waits
+        # for rate limits (reported on their own, as wait_per_run)
+        'overhead_per_run': sum(run['wall_seconds'] - run['busy_seconds'] for run in succeeded) / len(succeeded) if succeeded else None,
+        'wait_per_run': sum(stage['wait_seconds'] for stage in stages.values()) / len(succeeded) if succeeded else None,
+        'stages': stages,
+    }
+
+def seconds(value, digits=3):
+    return f"{value:.{digits}f}" if value is not None else "n/a"
+
+def print_results(results, baseline=None):
+    previous = {result['name']: result for result in (baseline or {}).get('results', [])}
+    table = Table(title="End-to-end runs against the mock server")
+    for column in ("Entry point", "Runs", "Median (s)", "Min (s)", "Max (s)", "Calls/run", "Overhead/run (s)", "Limit wait/run (s)"):
+        table.add_column(column, justify="left" if column == "Entry point" else "right")
+    if previous:
+        table.add_column("vs baseline", justify="right")
+    for result in results:
+        if result['wall_median'] is None:
+            row = [result['name'], str(result['runs']), f"[red]failed: {result['failures'][0]}[/red]", "", "", "", "", ""]
+        else:
+            runs = f"{result['runs']}" + (f" ([red]{len(result['failures'])} failed[/red])" if result['failures'] else "")
+            row = [result['name'], runs, seconds(result['wall_median']), seconds(result['wall_min']), seconds(result['wall_max']),
+                   f"{result['calls_per_run']:.1f}", seconds(result['overhead_per_run']), seconds(result['wait_per_run'])]
+        if previous:
+            before = previous.get(result['name'], {}).get('wall_median')
+            row.append(f"{(result['wall_median'] - before) / before:+.1%}" if before and result['wall_median'] else "")
+        table.add_row(*row)
+    console.print(table)
+
+    stage_table = Table(title="Per-stage latency (averages per call)")
+    for column in ("Entry point", "Stage", "Calls", "Requests", "Client (ms)", "Server (ms)", "Overhead (ms)"):
+        stage_table.add_column(column, justify="left" if column in ("Entry point", "Stage") else "right")
+    for result in results:
+        for stage, totals in result['stages'].items():
+            calls = totals['calls']
+            client = totals['client_seconds'] / calls * 1000 if calls else None
+            # A call can take several requests (SDK retries after injected errors), all of which it waited for
+            server = totals['server_seconds'] / calls * 1000 if calls else None
+            overhead = client - server if calls else None
+            stage_table.add_row(result['name'], stage, str(calls), str(totals['server_requests']), seconds(client, 1), seconds(server, 1), seconds(overhead, 1))
+    console.print(stage_table)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every Maestro entry point end to end against a local mock of the model providers and Tavily.")
+    parser.add_argument('names', nargs='*', help="Entry points to run (default: all)")
+    parser.add_argument('--runs', type=int, default=3, help="Runs per entry point")
+    parser.add_argument('--objective', default=DEFAULT_OBJECTIVE)
+    parser.add_argument('--search', action='store_true', help="Let the orchestrator request searches")
+    parser.add_argument('--parallel', action='store_true', help="Run independent sub-tasks in parallel")
+    parser.add_argument('--max-parallel', type=int, default=4)
+    parser.add_argument('--incremental-refine', action='store_true', help="Merge each step into a draft that the refiner polishes (see maestro_draft)")
+    parser.add_argument('--sub-agent-context-budget', type=int, default=None,
+                        help="Token budget of the previous tasks given to sub-agents (see maestro_relevance; default: the backends' own)")
+    parser.add_argument('--rate-limits', action='store_true',
+                        help="Keep the rate limits configured in PROVIDER_RATE_LIMITS or the environment; the mock server has none, so they are lifted by default")
+    parser.add_argument('--flask', action='store_true', help="Also submit each entry point's runs through the web UI")
+    parser.add_argument('--latency', type=float, default=0.05, help="Mock seconds to the first token")
+    parser.add_argument('--tokens-per-second', type=float, default=500.0, help="Mock output rate")
+    parser.add_argument('--sub-tasks', type=int, default=3, help="Sub-tasks per run")
+    parser.add_argument('--result-tokens', type=int, default=200, help="Tokens per sub-agent result")
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help="Share of sub-agent/refiner responses cut off")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of model requests that fail")
+    parser.add_argument('--error-status', type=int, default=500, help="HTTP status of injected errors")
+    parser.add_argument('--retry-after', type=float, default=None, help="retry-after header of injected errors, in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help="Write the results as JSON to this file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare the median wall time with")
+    parser.add_argument('--keep-journals', action='store_true', help="Keep the run journals of the benchmark runs")
+    parser.add_argument('--verbose', action='store_true', help="Show the output of the runs")
+    args = parser.parse_args()
+
+    config = MockConfig(latency=args.latency, tokens_per_second=args.tokens_per_second, sub_tasks=args.sub_tasks, result_tokens=args.result_tokens,
+                        truncate_rate=args.truncate_rate, error_rate=args.error_rate, error_status=args.error_status,
+                        retry_after=args.retry_after, seed=args.seed)
+    # Paths given on the command line are relative to where the benchmark was started
+    save_path = os.path.abspath(args.save) if args.save else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    server = MockServer(config).start()
+    # Providers read their base URL when their client is created, i.e. on the first call of a run
+    os.environ.update(server.environment())
+    if not args.rate_limits:
+        # Read when a provider is created, which is when its backend module is first loaded
+        import maestro_ratelimit
+        for name, limits in maestro_ratelimit.PROVIDER_RATE_LIMITS.items():
+            for kind in limits:
+                limits[kind] = None
+                os.environ.pop(maestro_ratelimit.RATE_LIMIT_ENV.format(name.upper(), kind.upper()), None)
+    # Runs write their exchange logs and project folders to the working directory
+    os.chdir(tempfile.mkdtemp(prefix='maestro-e2e-'))
+    from maestro_journal import journal_path
+    from maestro_metrics import get_metrics
+
+    targets = [(name, 'cli') for name in (args.names or entry_points())]
+    if args.incremental_refine or args.sub_agent_context_budget is not None:
+        import maestro_api_router
+        for name in args.names or entry_points():
+            try:
+                backend = maestro_api_router.get_module(name).backend
+                if args.incremental_refine:
+                    backend.incremental_refine = True
+                if args.sub_agent_context_budget is not None:
+                    backend.sub_agent_context_token_budget = args.sub_agent_context_budget
+            except Exception:
+                # Reported by the runs of the entry point (e.g. a missing SDK)
+                pass
+    if args.flask:
+        sys.path.insert(0, FLASK_APP_DIR)
+        import app as flask_app
+        client = flask_app.app.test_client()
+        targets += [(name, 'flask') for name in (args.names or entry_points())]
+
+    results = []
+    try:
+        for name, mode in targets:
+            runs = []
+            for _ in range(args.runs):
+                if mode == 'cli':
+                    run_id, run = cli_run(name, args)
+                    measured = measure_run(server, run, args.verbose)
+                else:
+                    job, run = flask_run(client, name, args)
+                    measured = measure_run(server, run, args.verbose)
+                    # The web UI records the run under its job ID
+                    run_id = job.get('job_id')
+                measured['stages'] = get_metrics().run_summary(run_id) if run_id else {}
+                runs.append(measured)
+                if run_id and not args.keep_journals and os.path.exists(journal_path(run_id)):
+                    os.remove(journal_path(run_id))
+            results.append(summarize(name if mode == 'cli' else f"{name} (web UI)", runs))
+    finally:
+        server.stop()
+
+    baseline = None
+    if compare_path:
+        with open(compare_path, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+    if save_path:
+        with open(save_path, 'w', encoding='utf-8') as file:
+            json.dump({'config': vars(config), 'objective': args.objective, 'search': args.search, 'parallel': args.parallel, 'rate_limits': args.rate_limits,
+                       'incremental_refine': args.incremental_refine, 'sub_agent_context_budget': args.sub_agent_context_budget,
+                       'results': results}, file, indent=2)
+        console.print(f"Results saved to {save_path}")
+
+if __name__ == '__main__':
+    main()
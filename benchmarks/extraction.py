@@ -0,0 +1,92 @@
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from rich.console import Console
+from rich.table import Table
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from maestro_fences import CodeFenceParser, parse_code_fences, FILENAME_LABEL_PATTERN
+
+console = Console()
+
+# The regex the folder structure path used before the single-pass parser, kept as a reference point
+REFERENCE_PATTERN = re.compile(r'Filename: (\S+)\s*```[\w]*\n(.*?)\n```', re.DOTALL)
+
+PROSE = (
+    "This module handles one part of the application. It keeps its state small, validates its inputs and reports "
+    "errors to the caller instead of printing them, so that the other modules can decide how to recover.\n"
+)
+
+def synthetic_output(target_chars, lines_per_file=40):
+    """
+    Builds a refine output in the refine prompt's format (project name, folder structure, 'Filename:' code blocks
+    separated by prose) of about `target_chars` characters.
+
+    Returns:
+        tuple: (text, number of code blocks)
+    """
+    parts = ["Project Name: SyntheticApp\n\n"]
+    files = []
+    size = 0
+    index = 0
+    while size < target_chars:
+        filename = f"module_{index}.py"
+        body = "\n".join(f"def function_{index}_{line}(value):\n    return value * {line}  # keep `{filename}` in sync" for line in range(lines_per_file // 2))
+        block = f"{PROSE}\nFilename: {filename}\n```python\n{body}\n```\n\n"
+        files.append(block)
+        size += len(block)
+        index += 1
+    structure = ", ".join(f'"module_{i}.py": null' for i in range(index))
+    parts.append(f"<folder_structure>\n{{\"SyntheticApp\": {{{structure}}}}}\n</folder_structure>\n\n")
+    parts.extend(files)
+    return "".join(parts), index
+
+def parse_streamed(text, chunk_size):
+    parser = CodeFenceParser(filename_patterns=[FILENAME_LABEL_PATTERN])
+    events = []
+    for start in range(0, len(text), chunk_size):
+        events.extend(parser.feed(text[start:start + chunk_size]))
+    events.extend(parser.close())
+    return events
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure code block extraction on large synthetic refine outputs.")
+    parser.add_argument('--sizes', type=int, nargs='*', default=[100_000, 1_000_000, 5_000_000], help="Output sizes in characters")
+    parser.add_argument('--chunk-size', type=int, default=64, help="Characters per chunk when parsing as a stream")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement")
+    args = parser.parse_args()
+
+    table = Table(title="Code block extraction")
+    table.add_column("Output size")
+    table.add_column("Method")
+    table.add_column("Blocks", justify="right")
+    table.add_column("Median (ms)", justify="right")
+    table.add_column("MB/s", justify="right")
+    for size in args.sizes:
+        text, expected = synthetic_output(size)
+        methods = [
+            ("single pass", lambda: parse_code_fences(text, filename_patterns=[FILENAME_LABEL_PATTERN])[0]),
+            (f"stream, {args.chunk_size}-char chunks", lambda: parse_streamed(text, args.chunk_size)),
+            ("reference re.findall", lambda: REFERENCE_PATTERN.findall(text)),
+        ]
+        for name, function in methods:
+            seconds, blocks = measure(function, args.repeat)
+            found = f"{len(blocks)}" if len(blocks) == expected else f"[red]{len(blocks)}/{expected}[/red]"
+            table.add_row(f"{len(text):,}", name, found, f"{seconds * 1000:.1f}", f"{len(text) / seconds / 1_000_000:.1f}")
+    console.print(table)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,468 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Marker carried by every sub-agent result and summary; the orchestrator counts them to know how far the run is
+RESULT_MARKER = "[MOCK-RESULT]"
+
+# Words the scripted responses are made of
+FILLER = (
+    "the module validates its input and returns a structured result so the caller can decide how to recover from "
+    "errors while keeping state small and every function easy to test in isolation"
+).split()
+
+# Stages told apart by the prompts of maestro_loop and maestro_compaction
+STAGE_MARKERS = (
+    ("Compaction", "Summarize the following sub-task result"),
+    ("Draft", "You maintain the draft of the final output"),
+    ("Refiner", "refine the sub-task results"),
+    ("Orchestrator", "break down the objective"),
+)
+
+# Continuation request of maestro_loop for providers without assistant prefill, with the partial output between tags
+CONTINUE_PATTERN = re.compile(r'^Your previous response was cut off by the output token limit\..*?<partial_response>\n(.*)\n</partial_response>', re.DOTALL)
+
+TOKEN_PATTERN = re.compile(r'\S+\s*|\s+')
+
+class MockConfig:
+    """
+    Behaviour of the mock server.
+
+    Args:
+        latency (float): Seconds before the first token of a response (and the whole latency of a search).
+        tokens_per_second (float): Output rate once the first token is sent.
+        chunk_tokens (int): Tokens per streamed chunk.
+        sub_tasks (int): Sub-tasks the orchestrator hands out before declaring the objective complete.
+        result_tokens (int): Tokens of every sub-agent result.
+        files (int): Code files in the refined output.
+        truncate_rate (float): Share of sub-agent and refiner responses cut off at half length with a
+            max_tokens/length stop reason; their continuations are never cut off.
+        error_rate (float): Share of model requests answered with `error_status`.
+        error_status (int): HTTP status of injected errors.
+        retry_after (float, optional): Seconds sent in the retry-after header of injected errors.
+        seed (int): Seed of the truncation and error draws.
+    """
+    def __init__(self, latency=0.05, tokens_per_second=500.0, chunk_tokens=4, sub_tasks=3, result_tokens=200, files=3,
+                 truncate_rate=0.0, error_rate=0.0, error_status=500, retry_after=None, seed=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.chunk_tokens = chunk_tokens
+        self.sub_tasks = sub_tasks
+        self.result_tokens = result_tokens
+        self.files = files
+        self.truncate_rate = truncate_rate
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.seed = seed
+
+def filler(count, offset=0):
+    return " ".join(FILLER[(offset + index) % len(FILLER)] for index in range(count))
+
+def request_text(body):
+    """
+    Returns the system prompt and messages of a request body (any of the supported APIs) as one string.
+    """
+    def text(content):
+        if isinstance(content, str):
+            return content
+        return "".join(block.get("text", "") for block in content or [])
+    parts = [text(body.get("system"))]
+    parts.extend(text(message.get("content")) for message in body.get("messages", []))
+    return "\n".join(parts)
+
+def split_prefill(body, api):
+    """
+    Splits off the continuation of a cut-off response: a trailing assistant message (a prefill) on the Anthropic API,
+    which is the only one that continues it, or a trailing user message asking to continue the partial output it
+    quotes on any API.
+
+    Returns:
+        tuple: (request body without the continuation, partial output or None)
+    """
+    messages = body.get("messages", [])
+    if not messages:
+        return body, None
+    content = messages[-1].get("content")
+    content = content if isinstance(content, str) else "".join(block.get("text", "") for block in content or [])
+    if messages[-1].get("role") == "assistant" and api == "anthropic":
+        return {**body, "messages": messages[:-1]}, content
+    match = CONTINUE_PATTERN.match(content) if messages[-1].get("role") == "user" else None
+    if match:
+        return {**body, "messages": messages[:-1]}, match.group(1)
+    return body, None
+
+def classify(text):
+    for stage, marker in STAGE_MARKERS:
+        if marker in text:
+            return stage
+    return "Sub-agent"
+
+def scripted_response(config, stage, text):
+    """
+    Returns the full response to a request; it only depends on the request, so a continuation can pick up where
+    a cut-off response stopped.
+    """
+    if stage == "Orchestrator":
+        done = text.count(RESULT_MARKER)
+        if done >= config.sub_tasks:
+            return "The task is complete: every sub-task has been executed and reviewed."
+        parallel = re.search(r'return up to (\d+) independent sub-tasks', text)
+        width = min(int(parallel.group(1)), config.sub_tasks - done) if parallel else 1
+        prompts = [f"Sub-task {done + index + 1}: write module_{done + index}.py. {filler(40, done + index)}" for index in range(width)]
+        response = "\n".join(f"<subtask>{prompt}</subtask>" for prompt in prompts) if parallel else prompts[0]
+        if '"search_query"' in text:
+            response += "\n" + json.dumps({"search_query": f"How to write module {done} of the project?"})
+        return response
+    if stage == "Sub-agent":
+        return f"{RESULT_MARKER} {filler(max(config.result_tokens - 1, 1), len(text))}"
+    if stage == "Compaction":
+        return f"{RESULT_MARKER} Summary: {filler(30)}"
+    if stage == "Draft":
+        # A merged draft stays about one result long, however many results went in
+        return f"Draft: {filler(config.result_tokens, text.count(RESULT_MARKER))}"
+    structure = {"MockProject": {f"module_{index}.py": None for index in range(config.files)}}
+    parts = [f"Project Name: MockProject\n\n<folder_structure>\n{json.dumps(structure)}\n</folder_structure>\n"]
+    for index in range(config.files):
+        body = "\n".join(f"def function_{line}(value):\n    return value * {line}" for line in range(10))
+        parts.append(f"{filler(20, index)}\n\nFilename: module_{index}.py\n```python\n{body}\n```\n")
+    return "\n".join(parts)
+
+class MockHandler(BaseHTTPRequestHandler):
+    """
+    Serves the Anthropic Messages, OpenAI-compatible chat completions (OpenAI, Groq, LM Studio), Ollama chat and
+    Tavily search endpoints from scripted responses.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/_mock/stats":
+            return self.send_json(self.server.mock.stats())
+        if self.path == "/api/ps":
+            return self.send_json({"models": [{"name": model, "model": model, "size": 0, "size_vram": 0} for model in sorted(self.server.mock.loaded_models)]})
+        self.send_json({"error": f"Unknown path {self.path}"}, 404)
+
+    def do_POST(self):
+        start = time.perf_counter()
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        path = self.path.split("?")[0]
+        if path == "/search":
+            return self.search(body, start)
+        if path == "/api/show":
+            return self.send_json({"modelfile": "", "template": "", "details": {"family": "mock"}, "model_info": {}})
+        if path == "/api/pull":
+            return self.send_json({"status": "success"})
+        if path == "/api/generate":
+            # Only model loads (an empty prompt) are used
+            self.server.mock.loaded_models.add(body.get("model"))
+            return self.send_json({"model": body.get("model"), "created_at": "", "response": "", "done": True, "done_reason": "load"})
+        if path.endswith("/v1/messages"):
+            api = "anthropic"
+        elif path.endswith("/chat/completions"):
+            api = "groq" if path.startswith("/openai/") else "openai"
+        elif path == "/api/chat":
+            api = "ollama"
+        else:
+            return self.send_json({"error": f"Unknown path {path}"}, 404)
+
+        base, prefill = split_prefill(body, api)
+        text = request_text(base)
+        stage = classify(text)
+        mock = self.server.mock
+        error, truncate = mock.draw(stage, continuation=prefill is not None)
+        if error:
+            mock.count(api, stage, time.perf_counter() - start, error=True)
+            return self.send_error_response(api)
+
+        full = scripted_response(mock.config, stage, text)
+        if prefill is not None:
+            # The caller strips trailing whitespace from the prefill, so the remainder may start with some
+            output = full[len(prefill):] if full.startswith(prefill) else full
+        else:
+            output = full
+        tokens = TOKEN_PATTERN.findall(output)
+        if truncate:
+            tokens = tokens[:max(len(tokens) // 2, 1)]
+        response = {'tokens': tokens, 'truncated': truncate, 'input_tokens': len(request_text(body)) // 4 + 1}
+        if body.get("stream"):
+            getattr(self, f"stream_{'openai' if api == 'groq' else api}")(body, response, api)
+        else:
+            time.sleep(mock.config.latency + len(tokens) / mock.config.tokens_per_second)
+            self.send_json(getattr(self, f"{'openai' if api == 'groq' else api}_message")(body, response))
+        mock.count(api, stage, time.perf_counter() - start, truncated=truncate)
+
+    def search(self, body, start):
+        time.sleep(self.server.mock.config.latency)
+        self.send_json({"query": body.get("query"), "answer": f"Mock answer to: {body.get('query')}. {filler(30)}", "results": [], "response_time": self.server.mock.config.latency})
+        self.server.mock.count("tavily", "Search", time.perf_counter() - start)
+
+    def send_json(self, data, status=200, headers=None):
+        payload = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_error_response(self, api):
+        message = "Injected error from the mock server"
+        if api == "anthropic":
+            data = {"type": "error", "error": {"type": "api_error", "message": message}}
+        elif api == "ollama":
+            data = {"error": message}
+        else:
+            data = {"error": {"message": message, "type": "server_error"}}
+        retry_after = self.server.mock.config.retry_after
+        self.send_json(data, self.server.mock.config.error_status, {'retry-after': str(retry_after)} if retry_after is not None else None)
+
+    def start_stream(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data):
+        payload = data.encode("utf-8")
+        self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+        self.wfile.flush()
+
+    def end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def paced_chunks(self, tokens):
+        # Yields groups of tokens at the configured rate, after the configured time to first token
+        config = self.server.mock.config
+        time.sleep(config.latency)
+        for index in range(0, len(tokens), config.chunk_tokens):
+            chunk = tokens[index:index + config.chunk_tokens]
+            yield "".join(chunk)
+            time.sleep(len(chunk) / config.tokens_per_second)
+
+    def anthropic_message(self, body, response):
+        return {
+            "id": f"msg_{uuid.uuid4().hex[:24]}", "type": "message", "role": "assistant", "model": body.get("model"),
+            "content": [{"type": "text", "text": "".join(response['tokens'])}],
+            "stop_reason": "max_tokens" if response['truncated'] else "end_turn", "stop_sequence": None,
+            "usage": {"input_tokens": response['input_tokens'], "output_tokens": len(response['tokens'])},
+        }
+
+    def stream_anthropic(self, body, response, api):
+        def event(event_type, data):
+            self.write_chunk(f"event: {event_type}\ndata: {json.dumps({'type': event_type, **data})}\n\n")
+        self.start_stream("text/event-stream")
+        message = {**self.anthropic_message(body, response), "content": [], "stop_reason": None}
+        message["usage"] = {"input_tokens": response['input_tokens'], "output_tokens": 1}
+        event("message_start", {"message": message})
+        event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+        for chunk in self.paced_chunks(response['tokens']):
+            event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": chunk}})
+        event("content_block_stop", {"index": 0})
+        stop_reason = "max_tokens" if response['truncated'] else "end_turn"
+        event("message_delta", {"delta": {"stop_reason": stop_reason, "stop_sequence": None}, "usage": {"output_tokens": len(response['tokens'])}})
+        event("message_stop", {})
+        self.end_stream()
+
+    def openai_message(self, body, response):
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(response['tokens'])}, "finish_reason": "length" if response['truncated'] else "stop"}],
+            "usage": openai_usage(response),
+        }
+
+    def stream_openai(self, body, response, api):
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+        def chunk(choices, **extra):
+            data = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model"), "choices": choices, **extra}
+            self.write_chunk(f"data: {json.dumps(data)}\n\n")
+        self.start_stream("text/event-stream")
+        start = time.perf_counter()
+        for content in self.paced_chunks(response['tokens']):
+            chunk([{"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": None}])
+        finish = [{"index": 0, "delta": {}, "finish_reason": "length" if response['truncated'] else "stop"}]
+        if api == "groq":
+            # Groq reports usage and its generation time on the x_groq extension of the last chunk
+            usage = {**openai_usage(response), "completion_time": time.perf_counter() - start - self.server.mock.config.latency}
+            chunk(finish, x_groq={"id": chunk_id, "usage": usage})
+        else:
+            chunk(finish)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunk([], usage=openai_usage(response))
+        self.write_chunk("data: [DONE]\n\n")
+        self.end_stream()
+
+    def ollama_message(self, body, response, eval_duration=None):
+        config = self.server.mock.config
+        return {
+            "model": body.get("model"), "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": "".join(response['tokens'])},
+            "done": True, "done_reason": "length" if response['truncated'] else "stop",
+            "prompt_eval_count": response['input_tokens'], "eval_count": len(response['tokens']),
+            "eval_duration": int((eval_duration if eval_duration is not None else len(response['tokens']) / config.tokens_per_second) * 1e9),
+        }
+
+    def stream_ollama(self, body, response, api):
+        self.start_stream("application/x-ndjson")
+        created_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        start = None
+        for content in self.paced_chunks(response['tokens']):
+            start = start or time.perf_counter()
+            self.write_chunk(json.dumps({"model": body.get("model"), "created_at": created_at, "message": {"role": "assistant", "content": content}, "done": False}) + "\n")
+        final = self.ollama_message(body, response, time.perf_counter() - start if start else 0.0)
+        final["message"]["content"] = ""
+        self.write_chunk(json.dumps(final) + "\n")
+        self.end_stream()
+
+def openai_usage(response):
+    output_tokens = len(response['tokens'])
+    return {"prompt_tokens": response['input_tokens'], "completion_tokens": output_tokens, "total_tokens": response['input_tokens'] + output_tokens}
+
+class MockServer:
+    """
+    Local stand-in for the model providers and Tavily, running on a background thread.
+
+    Point a backend at it with the environment from `environment()` (see BASE_URL_ENV in maestro_providers). Every
+    request is counted per API and per stage, along with the time the server spent on it, so a benchmark can tell
+    the time spent in Maestro from the time spent waiting for a "provider".
+
+    Args:
+        config (MockConfig): Latency, token rate, script and injected failures.
+        host (str): Interface to listen on.
+        port (int): Port to listen on; 0 picks a free one.
+    """
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or MockConfig()
+        self.httpd = ThreadingHTTPServer((host, port), MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.mock = self
+        self.random = random.Random(self.config.seed)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.counters = {}
+        # (start, end) perf_counter times of every request served
+        self.intervals = []
+        # Models loaded through Ollama's /api/generate, listed by /api/ps
+        self.loaded_models = set()
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self):
+        """
+        Returns the environment variables that point every provider at this server.
+        """
+        return {
+            'MAESTRO_ANTHROPIC_BASE_URL': self.url,
+            'MAESTRO_OPENAI_BASE_URL': f"{self.url}/v1",
+            'MAESTRO_LMSTUDIO_BASE_URL': f"{self.url}/v1",
+            'MAESTRO_GROQ_BASE_URL': self.url,
+            'MAESTRO_OLLAMA_BASE_URL': self.url,
+            'MAESTRO_LITELLM_BASE_URL': f"{self.url}/v1",
+            'MAESTRO_TAVILY_BASE_URL': self.url,
+        }
+
+    def draw(self, stage, continuation):
+        """
+        Decides whether a model request gets an injected error, and whether its response is cut off.
+
+        Returns:
+            tuple: (error, truncate)
+        """
+        with self.lock:
+            if self.random.random() < self.config.error_rate:
+                return True, False
+            truncatable = stage in ("Sub-agent", "Refiner") and not continuation
+            return False, truncatable and self.random.random() < self.config.truncate_rate
+
+    def count(self, api, stage, seconds, error=False, truncated=False):
+        end = time.perf_counter()
+        with self.lock:
+            self.intervals.append((end - seconds, end))
+            counters = self.counters.setdefault((api, stage), {'requests': 0, 'errors': 0, 'truncated': 0, 'seconds': 0.0})
+            counters['requests'] += 1
+            counters['errors'] += int(error)
+            counters['truncated'] += int(truncated)
+            counters['seconds'] += seconds
+
+    def stats(self):
+        """
+        Returns the request counters per API and stage.
+
+        Returns:
+            list of dict: api, stage, requests, errors, truncated and seconds (time spent serving them).
+        """
+        with self.lock:
+            return [{'api': api, 'stage': stage, **counters} for (api, stage), counters in self.counters.items()]
+
+    def busy_seconds(self, start, end):
+        """
+        Returns how long at least one request was being served between the `time.perf_counter()` times `start` and
+        `end`; overlapping requests (parallel sub-agents, prefetched searches) are counted once.
+        """
+        with self.lock:
+            intervals = sorted((max(first, start), min(last, end)) for first, last in self.intervals if last > start and first < end)
+        busy = 0.0
+        current_start = current_end = None
+        for first, last in intervals:
+            if current_end is None or first > current_end:
+                if current_end is not None:
+                    busy += current_end - current_start
+                current_start, current_end = first, last
+            else:
+                current_end = max(current_end, last)
+        if current_end is not None:
+            busy += current_end - current_start
+        return busy
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="maestro-mock-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve scripted Anthropic, OpenAI, Groq, LM Studio, Ollama and Tavily responses locally.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds to the first token")
+    parser.add_argument('--tokens-per-second', type=float, default=500.0)
+    parser.add_argument('--sub-tasks', type=int, default=3, help="Sub-tasks per run")
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help="Share of sub-agent/refiner responses cut off")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of model requests that fail")
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--retry-after', type=float, default=None, help="retry-after header of injected errors, in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    config = MockConfig(latency=args.latency, tokens_per_second=args.tokens_per_second, sub_tasks=args.sub_tasks,
+                        truncate_rate=args.truncate_rate, error_rate=args.error_rate, error_status=args.error_status,
+                        retry_after=args.retry_after, seed=args.seed)
+    server = MockServer(config, args.host, args.port)
+    print(f"Mock server listening on {server.url}. Point Maestro at it with:")
+    for name, value in server.environment().items():
+        print(f"  export {name}={value}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == '__main__':
+    main()
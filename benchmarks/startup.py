@@ -0,0 +1,100 @@
+import argparse
+import os
+import select
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from rich.console import Console
+from rich.table import Table
+
+console = Console()
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FLASK_APP_DIR = os.path.join(REPO_DIR, 'flask_app')
+
+# Imports the Flask app and serves its index page and the UI elements of every backend, as a module switch in the UI does
+FLASK_SNIPPET = (
+    "import app\n"
+    "client = app.app.test_client()\n"
+    "client.get('/')\n"
+    "for name in app.maestro_files:\n"
+    "    client.post('/get_ui_elements', json={'import_name': name})\n"
+    "print('ready', flush=True)\n"
+)
+
+def entry_points():
+    """
+    Returns (name, command, working directory, ready marker) for every maestro*.py script and the Flask app.
+    """
+    scripts = sorted(f for f in os.listdir(REPO_DIR) if f.endswith('.py') and f.startswith('maestro') and not f.startswith('maestro_'))
+    points = [(script, [sys.executable, os.path.join(REPO_DIR, script)], None, None) for script in scripts]
+    points.append(('flask_app/app.py', [sys.executable, '-c', FLASK_SNIPPET], FLASK_APP_DIR, b'ready'))
+    return points
+
+def time_to_first_output(command, cwd, marker, timeout):
+    """
+    Starts `command` and measures the seconds until it first writes to stdout (the first prompt), or until the
+    output contains `marker` if given. The process is killed as soon as it is reached.
+
+    Returns:
+        tuple: (seconds or None, error message or None)
+    """
+    # Scripts write their output files to the working directory, so they start in a scratch one
+    cwd = cwd or tempfile.mkdtemp(prefix='maestro-startup-')
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output = b''
+    try:
+        while time.perf_counter() - start < timeout:
+            ready, _, _ = select.select([process.stdout], [], [], 0.05)
+            if ready:
+                chunk = os.read(process.stdout.fileno(), 4096)
+                if not chunk:
+                    process.wait()
+                    break
+                output += chunk
+                if marker is None or marker in output:
+                    return time.perf_counter() - start, None
+            elif process.poll() is not None:
+                break
+        if process.poll() is None:
+            return None, f"no prompt after {timeout}s"
+        error = process.stderr.read().decode(errors='replace').strip().splitlines()
+        return None, error[-1] if error else f"exited with {process.returncode}"
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold-start time to the first prompt of every Maestro entry point.")
+    parser.add_argument('names', nargs='*', help="Entry points to measure (default: all)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per entry point")
+    parser.add_argument('--timeout', type=float, default=60, help="Seconds to wait for the first prompt")
+    args = parser.parse_args()
+
+    table = Table(title="Cold start to first prompt")
+    table.add_column("Entry point")
+    table.add_column("Median (s)", justify="right")
+    table.add_column("Min (s)", justify="right")
+    table.add_column("Max (s)", justify="right")
+    for name, command, cwd, marker in entry_points():
+        if args.names and name not in args.names:
+            continue
+        timings = []
+        error = None
+        for _ in range(args.repeat):
+            seconds, error = time_to_first_output(command, cwd, marker, args.timeout)
+            if seconds is None:
+                break
+            timings.append(seconds)
+        if error:
+            table.add_row(name, f"[red]failed: {error}[/red]", "", "")
+        else:
+            table.add_row(name, f"{statistics.median(timings):.3f}", f"{min(timings):.3f}", f"{max(timings):.3f}")
+    console.print(table)
+
+if __name__ == '__main__':
+    main()
@@ -6,16 +6,44 @@ current_file_path = os.path.dirname(os.path.abspath(__file__))
 maestro_dir = os.path.dirname(current_file_path)
 sys.path.append(maestro_dir)
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, url_for
 from flask_socketio import SocketIO, emit
 import maestro_api_router as maestro
+from maestro_jobs import JobQueue, QueueFullError
+from maestro_events import get_event_bus, run_context
+from maestro_progress import ProgressStore, PAGE_SIZE
+from maestro_metrics import get_metrics
 
 app = Flask(__name__)
 socketio = SocketIO(app)
 
 # Grab all maestro*.py files for selection in the UI
 maestro_files = [f for f in os.listdir(maestro_dir) if f.endswith('.py') and f.startswith('maestro') and not f.startswith('maestro_')]
-progress_data = []
+# Progress events per run ID, bounded in memory and spilled to disk
+progress_store = ProgressStore()
+
+def send_progress_batch(batch):
+    # Called on the event bus dispatcher thread with every batch of progress events
+    socketio.emit('progress_batch', progress_store.append(batch))
+
+event_bus = get_event_bus()
+event_bus.subscribe(send_progress_batch)
+
+def run_job(job):
+    # Progress events of the run are stored under the job ID
+    with run_context(job.id):
+        maestro.run_module(job.module_name, job.objective, **job.kwargs)
+
+def send_job_update(job):
+    socketio.emit('job_status', job.to_dict())
+    # Final updates go through the event bus so they arrive after the run's own progress events
+    if job.status == 'succeeded':
+        event_bus.publish({'color': 'green', 'content': 'Maestro task completed successfully!', 'title': 'Success', 'footer': job.id, 'run_id': job.id})
+    elif job.status == 'failed':
+        event_bus.publish({'color': 'red', 'content': f"Error executing maestro module: {job.error}", 'title': 'Error', 'footer': job.id, 'run_id': job.id})
+
+# Runs execute on a bounded pool of background workers instead of inside the request thread
+jobs = JobQueue(run_job, on_update=send_job_update)
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -34,27 +62,79 @@ def index():
                 if arg_name != 'objective':
                     additional_args[arg_name] = request.form.get(arg_name, str(arg_default))
 
-            # Call the run_maestro function with all dynamic arguments added
-            maestro.run_maestro(objective, **additional_args)
-            # Emit a final update to the client indicating completion
-            completion_message = {'color': 'green', 'content': 'Maestro task completed successfully!', 'title': 'Success', 'footer': ''}
-            socketio.emit('update_progress', completion_message)
-            
-            return render_template('results.html', results=progress_data)
+            # Queue the run and return its job ID right away; progress arrives over the socket
+            job = jobs.submit(selected_file, objective, **additional_args)
+            return jsonify({"status": "queued", "job_id": job.id, "status_url": url_for('job_status', job_id=job.id)}), 202
+        except QueueFullError as e:
+            response = jsonify({"status": "rejected", "message": str(e)})
+            response.headers['Retry-After'] = '30'
+            return response, 503
         except Exception as e:
             error_message = f"Error executing maestro module: {str(e)}"
-            progress_data.append({'color': 'red', 'content': error_message, 'title': 'Error', 'footer': ''})
-            socketio.emit('progress_update', {'color': 'red', 'content': error_message, 'title': 'Error', 'footer': ''})
+            event_bus.publish({'color': 'red', 'content': error_message, 'title': 'Error', 'footer': ''})
             return jsonify({"status": "error", "message": error_message}), 500
 
     return render_template('index.html', files=maestro_files)
 
+@app.route('/results')
+def results():
+    # One page of a run's progress, the most recent run by default
+    run_ids = progress_store.run_ids()
+    run_id = request.args.get('run_id') or (run_ids[0] if run_ids else None)
+    offset = request.args.get('offset', 0, type=int)
+    page = progress_store.page(run_id, offset, PAGE_SIZE) if run_id else {'events': [], 'next_offset': 0, 'total': 0}
+    return render_template('results.html', results=page['events'], run_id=run_id, offset=offset, page_size=PAGE_SIZE,
+                           next_offset=page['next_offset'], total=page['total'])
+
+@app.route('/runs')
+def list_runs():
+    return jsonify({"runs": progress_store.run_ids()})
+
+@app.route('/runs/<run_id>/progress')
+def run_progress(run_id):
+    offset = request.args.get('offset', 0, type=int)
+    limit = min(request.args.get('limit', PAGE_SIZE, type=int), PAGE_SIZE)
+    return jsonify(progress_store.page(run_id, offset, limit))
+
+@socketio.on('replay')
+def replay(data):
+    # Sends a reconnecting client the events of a run it missed, starting at the given offset
+    offset = int(data.get('offset', 0))
+    while True:
+        page = progress_store.page(data['run_id'], offset, PAGE_SIZE)
+        if not page['events']:
+            break
+        emit('progress_batch', page['events'])
+        offset = page['next_offset']
+
+@app.route('/jobs')
+def list_jobs():
+    return jsonify({"jobs": [job.to_dict() for job in jobs.list()], **jobs.stats()})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Unknown job: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+# Per-call metrics of every run executed by this app: JSON, optionally for a single run, and Prometheus text
+@app.route('/metrics.json')
+def metrics_json():
+    run_id = request.args.get('run_id')
+    if run_id:
+        return jsonify({"run_id": run_id, "stages": get_metrics().run_summary(run_id)})
+    return jsonify(get_metrics().to_dict())
+
+@app.route('/metrics')
+def metrics_prometheus():
+    return get_metrics().to_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+# Remote sink for maestro modules running in another process (see REMOTE_PROGRESS_URL in maestro_events.py)
 @app.route('/update_progress', methods=['POST'])
 def update_progress():
-    global progress_data
-    update = request.json
-    progress_data.append(update)
-    socketio.emit('update_progress', update)
+    # Delivered directly rather than republished, so a remote sink pointed at this app cannot loop
+    send_progress_batch([request.json])
     return jsonify({"status": "success"}), 200
 
 # Get the UI elements from a given module
@@ -1,25 +1,119 @@
+import ast
 import importlib.util
 import os
-import requests
+import threading
 import time
+from maestro_events import get_event_bus, current_run_id
 
 loaded_module = None
 
-def load_module(module_name):
-    """
-    Dynamically load a module with a hyphen in its name.
-    """
-    global loaded_module
+# Loaded modules and their UI metadata, keyed by module name and invalidated when the file's mtime changes
+module_registry = {}
+metadata_registry = {}
+registry_lock = threading.Lock()
+
+# Helpers a module's get_ui_elements/get_required_args may return the result of, evaluated without importing the module
+METADATA_HELPERS = ('default_ui_elements', 'default_required_args')
+
+def module_path(module_name):
     current_file_path = os.path.abspath(__file__)
     maestro_dir = os.path.dirname(current_file_path)
-    module_file_path = os.path.join(maestro_dir, f'{module_name}')
+    return os.path.join(maestro_dir, f'{module_name}')
 
-    spec = importlib.util.spec_from_file_location(module_name, module_file_path)
+def import_module_file(module_name):
+    """
+    Dynamically import a module with a hyphen in its name, without touching the loaded module.
+    """
+    spec = importlib.util.spec_from_file_location(module_name, module_path(module_name))
     module = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(module)
-    loaded_module = module
     return module
 
+def get_module(module_name):
+    """
+    Returns the module from the registry, importing it on first use and again only once its file has changed.
+
+    Args:
+        module_name (str): The name of the maestro module (Ex: maestro-anyapi)
+    """
+    mtime = os.path.getmtime(module_path(module_name))
+    with registry_lock:
+        cached = module_registry.get(module_name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    module = import_module_file(module_name)
+    with registry_lock:
+        module_registry[module_name] = (mtime, module)
+    return module
+
+def evaluate_metadata(node):
+    """
+    Evaluates the return value of a metadata function: a literal, or a call to one of METADATA_HELPERS with literal arguments.
+    """
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in METADATA_HELPERS:
+        import maestro_loop
+        args = [ast.literal_eval(arg) for arg in node.args]
+        kwargs = {keyword.arg: ast.literal_eval(keyword.value) for keyword in node.keywords}
+        return getattr(maestro_loop, node.func.id)(*args, **kwargs)
+    return ast.literal_eval(node)
+
+def read_metadata(module_name):
+    """
+    Reads the values of get_ui_elements and get_required_args from the module's source without executing it.
+
+    Returns:
+        dict: function name -> value, for each function that could be evaluated statically.
+    """
+    with open(module_path(module_name), 'r') as file:
+        tree = ast.parse(file.read(), filename=module_name)
+    metadata = {}
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name in ('get_ui_elements', 'get_required_args'):
+            if len(node.body) == 1 and isinstance(node.body[0], ast.Return) and not node.args.args:
+                try:
+                    metadata[node.name] = evaluate_metadata(node.body[0].value)
+                except (ValueError, TypeError, SyntaxError, AttributeError):
+                    pass
+    return metadata
+
+def get_metadata(module_name, function_name):
+    """
+    Returns the cached result of a module's metadata function, read statically if possible and otherwise by
+    calling it on the registered module.
+
+    Returns:
+        The function's result, or None if the module does not define it.
+    """
+    mtime = os.path.getmtime(module_path(module_name))
+    with registry_lock:
+        cached = metadata_registry.get(module_name)
+    if not cached or cached[0] != mtime:
+        cached = (mtime, read_metadata(module_name))
+        with registry_lock:
+            metadata_registry[module_name] = cached
+    metadata = cached[1]
+    if function_name in metadata:
+        return metadata[function_name]
+    module = get_module(module_name)
+    if not hasattr(module, function_name):
+        return None
+    value = getattr(module, function_name)()
+    # Cached dicts are never changed once stored, since other requests read them without the lock: the value goes
+    # into a copy of the latest entry
+    with registry_lock:
+        latest = metadata_registry.get(module_name)
+        base = latest[1] if latest and latest[0] == mtime else metadata
+        metadata_registry[module_name] = (mtime, {**base, function_name: value})
+    return value
+
+def load_module(module_name):
+    """
+    Dynamically load a module with a hyphen in its name.
+    """
+    global loaded_module
+    loaded_module = get_module(module_name)
+    return loaded_module
+
 def run_maestro(objective, **kwargs):
     """
     Runs the 'run_maestro' function from the specified module.
@@ -38,6 +132,23 @@ def run_maestro(objective, **kwargs):
     else:
         raise AttributeError(f"The loaded module does not have a 'run_maestro' function.")
 
+def run_module(module_name, objective, **kwargs):
+    """
+    Runs the 'run_maestro' function of a registered module.
+
+    Unlike run_maestro this does not depend on the globally loaded module, so several runs can execute on
+    different threads at the same time.
+
+    Args:
+        module_name (str): The name of the maestro module to run (Ex: maestro-anyapi)
+        objective (str): The primary objective to pass to the LLM
+        kwargs (dict): Arguments to pass depending on the module
+    """
+    module = get_module(module_name)
+    if not hasattr(module, 'run_maestro'):
+        raise AttributeError(f"The module {module_name} does not have a 'run_maestro' function.")
+    return module.run_maestro(objective, **kwargs)
+
 def get_ui_elements(module_name):
     """
     Gets the UI elements from the specified module.
@@ -45,9 +156,9 @@ def get_ui_elements(module_name):
     Args:
         module_name (str): The name of the maestro module to get UI elements from (Ex: maestro-anyapi)
     """
-    module = load_module(module_name)
-    if hasattr(module, 'get_ui_elements'):
-        return module.get_ui_elements()
+    elements = get_metadata(module_name, 'get_ui_elements')
+    if elements is not None:
+        return elements
     else:
         return [
             {'type': 'checkbox', 'label': 'Unable to find get_ui_elements function in the loaded module.', 'id': 'failed_get_ui_elements'}
@@ -60,23 +171,22 @@ def get_required_args(module_name):
     Args:
         module_name (str): The name of the maestro module to get required arguments from (Ex: maestro-anyapi)
     """
-    module = load_module(module_name)
-    if hasattr(module, 'get_required_args'):
-        return module.get_required_args()
+    args = get_metadata(module_name, 'get_required_args')
+    if args is not None:
+        return args
     else:
         return ['objective']
 
 def send_progress_update(message, title='', footer='', color="blue"):
+    """
+    Publishes a progress update on the in-process event bus; returns without waiting for delivery.
+    """
     progress = {
         'color': color,
         'time': time.localtime(),
         'title': title,
         'content': message,
-        'footer': footer
+        'footer': footer,
+        'run_id': current_run_id.get()
     }
-    try:
-        response = requests.post('http://localhost:5000/update_progress', json=progress)
-        if response.status_code != 200:
-            print(f"Failed to send progress update: {response.status_code}")
-    except Exception as e:
-        print(f"Error sending progress update: {str(e)}")
\ No newline at end of file
+    get_event_bus().publish(progress)
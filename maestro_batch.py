@@ -0,0 +1,267 @@
+import argparse
+import contextvars
+import json
+import os
+import re
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from rich.console import Console
+from rich.table import Table
+import maestro_api_router
+from maestro_journal import new_run_id
+from maestro_metrics import get_metrics, format_cost
+from maestro_utils import output_context
+
+# Objectives running at the same time
+BATCH_WORKERS = 4
+# Every batch gets a timestamped folder in here, with one folder per objective
+BATCH_OUTPUT_DIR = "batch_runs"
+DEFAULT_MODULE = "maestro.py"
+# Length of the objective part of a run's folder name
+RUN_DIR_NAME_LENGTH = 40
+
+# Console output of the run the current thread works for goes to this file; the terminal if None
+current_log = contextvars.ContextVar('current_log', default=None)
+
+# Colors the module consoles picked when they were created for the terminal
+ANSI_ESCAPE_PATTERN = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+
+class RunOutputRouter:
+    """
+    Stands in for sys.stdout during a batch: writes go to the log file of the run the writing thread works for
+    (see current_log), and to the real stdout for anything else, such as the batch's own progress lines.
+
+    The Rich consoles of the maestro modules write to whatever sys.stdout is at print time, so this keeps the output
+    of concurrent runs apart without changing them.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    def target(self):
+        return current_log.get() or self.stream
+
+    def write(self, text):
+        log = current_log.get()
+        if log is None:
+            return self.stream.write(text)
+        return log.write(ANSI_ESCAPE_PATTERN.sub('', text))
+
+    def flush(self):
+        self.target().flush()
+
+    def isatty(self):
+        # Logs get plain text, without colors or live panels
+        return current_log.get() is None and self.stream.isatty()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def load_objectives(path):
+    """
+    Reads a batch file: one JSON value per line, either an objective string or an object with an "objective" key,
+    an optional "id" (used for the run's folder name) and run options of the backend, e.g. "want_search".
+    Blank lines are skipped.
+
+    Returns:
+        list of dict: One item per objective.
+    """
+    items = []
+    with open(path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({e})")
+            if isinstance(item, str):
+                item = {'objective': item}
+            if not isinstance(item, dict) or not item.get('objective'):
+                raise ValueError(f"{path}:{line_number}: expected an objective string or an object with an 'objective' key")
+            items.append(item)
+    return items
+
+def run_dir_name(index, item):
+    name = re.sub(r'\W+', '_', str(item.get('id') or item['objective'])).strip('_')
+    return f"{index:03d}_{name[:RUN_DIR_NAME_LENGTH]}"
+
+def run_options(module_name, item, defaults):
+    """
+    Returns the run options to pass to the backend: the batch defaults overridden by the item's own, limited to
+    the options the backend declares. No run asks for anything interactively.
+    """
+    declared = {arg['name'] for arg in maestro_api_router.get_required_args(module_name) if isinstance(arg, dict)}
+    options = {'want_search': False, 'want_file_path': False, 'file_path': '', 'want_parallel': False, **defaults}
+    options.update({name: value for name, value in item.items() if name not in ('id', 'objective')})
+    if options.get('file_path'):
+        options['want_file_path'] = True
+    return {name: value for name, value in options.items() if name in declared}
+
+def run_objective(module_name, index, item, output_dir, defaults, run_id=None):
+    """
+    Runs one objective of a batch in its own folder, with its console output in the folder's run.log.
+
+    Args:
+        run_id (str, optional): ID of a run of this objective to resume from its journal; a new run if None.
+
+    Returns:
+        dict: index, objective, run_id, status ('succeeded' or 'failed'), error, duration, calls, input_tokens,
+        output_tokens, cost, unpriced_calls and output_dir.
+    """
+    resumed = run_id is not None
+    run_id = run_id or new_run_id()
+    result = {'index': index, 'objective': item['objective'], 'run_id': run_id, 'status': 'succeeded', 'error': None, 'output_dir': output_dir}
+    start = time.perf_counter()
+    # A resumed run keeps the log of its earlier attempt
+    with output_context(output_dir), open(os.path.join(output_dir, "run.log"), 'a' if resumed else 'w', encoding='utf-8') as log:
+        token = current_log.set(log)
+        try:
+            maestro_api_router.run_module(module_name, item['objective'], run_id=run_id, **run_options(module_name, item, defaults))
+        except Exception as e:
+            result.update(status='failed', error=f"{type(e).__name__}: {e}")
+            log.write(traceback.format_exc())
+        finally:
+            current_log.reset(token)
+    result['duration'] = time.perf_counter() - start
+    stages = get_metrics().run_summary(run_id).values()
+    for key in ('calls', 'input_tokens', 'output_tokens', 'cost', 'unpriced_calls'):
+        result[key] = sum(stats[key] for stats in stages)
+    return result
+
+def run_batch(module_name, items, workers=BATCH_WORKERS, output_dir=BATCH_OUTPUT_DIR, defaults=None, console=None):
+    """
+    Runs every objective of a batch on one backend, `workers` at a time, in this process, so provider clients and
+    their connection pools are shared by all runs.
+
+    Args:
+        module_name (str): The maestro module to run, e.g. "maestro.py".
+        items (list of dict): Objectives and their run options, see load_objectives.
+        workers (int): Objectives running at the same time.
+        output_dir (str): Folder the batch's timestamped folder is created in.
+        defaults (dict, optional): Run options for items that do not set them.
+        console (Console, optional): Console the progress lines are printed to.
+
+    Returns:
+        tuple: (batch folder, list of run results in objective order, wall time in seconds)
+    """
+    batch_dir = os.path.join(output_dir, datetime.now().strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(batch_dir, exist_ok=True)
+    runs = [(index, item, os.path.join(batch_dir, run_dir_name(index, item)), None) for index, item in enumerate(items, 1)]
+    results, wall_seconds = run_objectives(module_name, runs, workers, defaults, console)
+    return batch_dir, results, wall_seconds
+
+def resume_batch(batch_dir, workers=BATCH_WORKERS, console=None):
+    """
+    Resumes the failed runs of a batch from their journals, each in its own folder of the batch, and updates the
+    batch's summary.json with their new results.
+
+    Args:
+        batch_dir (str): The batch folder, holding the summary.json of the batch.
+        workers (int): Objectives running at the same time.
+        console (Console, optional): Console the progress lines are printed to.
+
+    Returns:
+        tuple: (module name, list of run results in objective order, wall time in seconds of the resumed runs)
+    """
+    summary = load_summary(batch_dir)
+    runs = [(result['index'], {'objective': result['objective']}, result['output_dir'], result['run_id'])
+            for result in summary['runs'] if result['status'] == 'failed']
+    resumed, wall_seconds = run_objectives(summary['module'], runs, workers, None, console)
+    by_index = {result['index']: result for result in summary['runs'] + resumed}
+    results = [by_index[index] for index in sorted(by_index)]
+    save_summary(batch_dir, summary['module'], workers, wall_seconds, results)
+    return summary['module'], results, wall_seconds
+
+def run_objectives(module_name, runs, workers, defaults, console):
+    # runs: (index, item, output folder, run ID to resume or None) per objective
+    console = console or Console()
+    # Load the module once up front rather than racing to import it from every worker
+    maestro_api_router.get_module(module_name)
+    results = []
+    stdout = sys.stdout
+    sys.stdout = RunOutputRouter(stdout)
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="maestro-batch") as executor:
+            futures = [executor.submit(contextvars.copy_context().run, run_objective, module_name, index, item, run_dir, defaults or {}, run_id)
+                       for index, item, run_dir, run_id in runs]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                status = "[green]done[/green]" if result['status'] == 'succeeded' else f"[red]failed[/red] ({result['error']})"
+                console.print(f"[{len(results)}/{len(runs)}] #{result['index']} {status} in {result['duration']:.1f}s: {result['output_dir']}")
+    finally:
+        sys.stdout = stdout
+    results.sort(key=lambda result: result['index'])
+    return results, time.perf_counter() - start
+
+def load_summary(batch_dir):
+    with open(os.path.join(batch_dir, "summary.json"), 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def save_summary(batch_dir, module_name, workers, wall_seconds, results):
+    with open(os.path.join(batch_dir, "summary.json"), 'w', encoding='utf-8') as file:
+        json.dump({'module': module_name, 'workers': workers, 'wall_seconds': wall_seconds, 'runs': results}, file, indent=2)
+
+def print_summary(results, wall_seconds, console=None, batch_dir=None):
+    console = console or Console()
+    table = Table(title="Batch Summary", title_justify="left", border_style="cyan")
+    for column in ("#", "Objective", "Status", "Duration", "In/Out tokens", "Cost"):
+        table.add_column(column, justify="left" if column in ("Objective", "Status") else "right")
+    for result in results:
+        objective = result['objective'] if len(result['objective']) <= 40 else result['objective'][:37] + "..."
+        status = "succeeded" if result['status'] == 'succeeded' else "[red]failed[/red]"
+        table.add_row(str(result['index']), objective, status, f"{result['duration']:.1f}s", f"{result['input_tokens']}/{result['output_tokens']}",
+                      format_cost(result['cost'], result['unpriced_calls'], result['calls']))
+    calls = sum(result['calls'] for result in results)
+    table.add_row("", "[bold]Total[/bold]", f"{sum(result['status'] == 'succeeded' for result in results)}/{len(results)}", f"{wall_seconds:.1f}s",
+                  f"{sum(result['input_tokens'] for result in results)}/{sum(result['output_tokens'] for result in results)}",
+                  format_cost(sum(result['cost'] for result in results), sum(result['unpriced_calls'] for result in results), calls))
+    console.print(table)
+    failed = [result for result in results if result['status'] == 'failed']
+    for result in failed:
+        console.print(f"#{result['index']} failed: {result['error']}")
+    if failed and batch_dir:
+        # Resuming through the batch keeps each run's outputs in its own folder of the batch
+        console.print(f"Resume the failed runs with: python maestro_batch.py --resume {batch_dir}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the objectives of a JSONL file concurrently in one process.")
+    parser.add_argument('objectives', nargs='?', help="JSONL file with one objective (string, or object with 'objective' and run options) per line")
+    parser.add_argument('--resume', default=None, help="Batch folder whose failed runs to resume, instead of starting a batch")
+    parser.add_argument('--module', default=DEFAULT_MODULE, help="Backend to run the objectives on, e.g. maestro-ollama.py")
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help="Objectives running at the same time")
+    parser.add_argument('--output-dir', default=BATCH_OUTPUT_DIR, help="Folder the batch folder is created in")
+    parser.add_argument('--want_search', type=str, default=None, help="Default for whether to use search (true/false)")
+    parser.add_argument('--want_parallel', type=str, default=None, help="Default for whether to run independent sub-tasks in parallel (true/false)")
+    args = parser.parse_args()
+
+    console = Console()
+    if args.resume:
+        try:
+            load_summary(args.resume)
+        except (OSError, ValueError) as e:
+            parser.error(f"No batch summary in {args.resume} ({e})")
+        batch_dir = args.resume
+        console.print(f"Resuming the failed runs of {batch_dir} with {args.workers} workers")
+        _, results, wall_seconds = resume_batch(batch_dir, args.workers, console)
+    else:
+        if not args.objectives:
+            parser.error("an objectives file or --resume is required")
+        try:
+            items = load_objectives(args.objectives)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        defaults = {name: getattr(args, name) for name in ('want_search', 'want_parallel') if getattr(args, name) is not None}
+        console.print(f"Running {len(items)} objectives on {args.module} with {args.workers} workers")
+        batch_dir, results, wall_seconds = run_batch(args.module, items, args.workers, args.output_dir, defaults, console)
+        save_summary(batch_dir, args.module, args.workers, wall_seconds, results)
+    print_summary(results, wall_seconds, console, batch_dir)
+    console.print(f"Outputs, logs and summary.json saved to {batch_dir}")
+    sys.exit(1 if any(result['status'] == 'failed' for result in results) else 0)
+
+if __name__ == '__main__':
+    main()
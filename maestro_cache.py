@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Serve repeated provider calls (same model, messages and parameters) from a local SQLite store
+RESPONSE_CACHE = False
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "maestro", "responses.sqlite3")
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+MAX_CACHE_AGE_SECONDS = 30 * 24 * 60 * 60
+
+# Run eviction once every this many writes instead of on every write
+EVICT_EVERY_WRITES = 50
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache for model responses.
+
+    Entries are keyed by a SHA-256 of the provider, model, full message/system payload and generation
+    parameters. Entries older than `max_age_seconds` are dropped, and once the store grows past `max_bytes`
+    the least recently used entries are evicted.
+
+    Args:
+        path (str): Path of the SQLite database file.
+        max_bytes (int): Maximum total size of cached values.
+        max_age_seconds (float): Maximum age of an entry before it is considered stale.
+    """
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_CACHE_BYTES, max_age_seconds=MAX_CACHE_AGE_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(provider, model, payload):
+        """
+        Builds the cache key for a provider call.
+
+        Args:
+            provider (str): Provider and server the call goes to, e.g. "lmstudio@http://localhost:1234/v1".
+            model (str): Model identifier.
+            payload (dict): Messages, system prompt and generation parameters of the call.
+
+        Returns:
+            str: Hex digest identifying the call.
+        """
+        serialized = json.dumps({'provider': provider, 'model': model, 'payload': payload}, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached value for `key`, or None on a miss or a stale entry.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                if row is not None:
+                    self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.connection.commit()
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.connection.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """
+        Stores a JSON-serializable value under `key`.
+        """
+        serialized = json.dumps(value)
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, serialized, len(serialized), now, now),
+            )
+            self.connection.commit()
+            self.writes += 1
+            if self.writes % EVICT_EVERY_WRITES == 1:
+                self.evict_locked(now)
+
+    def evict(self):
+        """
+        Drops stale entries, then least recently used entries until the store fits in `max_bytes`.
+        """
+        with self.lock:
+            self.evict_locked(time.time())
+
+    def evict_locked(self, now):
+        self.connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.max_age_seconds,))
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            excess = total - self.max_bytes
+            rows = self.connection.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+            stale_keys = []
+            for key, size in rows:
+                if excess <= 0:
+                    break
+                stale_keys.append((key,))
+                excess -= size
+            self.connection.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+        self.connection.commit()
+
+    def stats(self):
+        """
+        Returns the hit/miss counters and the current size of the store.
+
+        Returns:
+            dict: hits, misses, hit_rate, entries and bytes.
+        """
+        with self.lock:
+            entries, size = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': size,
+        }
+
+response_cache = None
+response_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """
+    Returns the shared response cache, or None if RESPONSE_CACHE is disabled.
+    """
+    global response_cache
+    if not RESPONSE_CACHE:
+        return None
+    with response_cache_lock:
+        if response_cache is None:
+            response_cache = ResponseCache()
+    return response_cache
@@ -0,0 +1,205 @@
+import ast
+import json
+import textwrap
+import threading
+from collections import Counter, OrderedDict
+from rich.console import Console
+from rich.table import Table
+from maestro_fences import CodeFenceParser
+from maestro_llm import calculate_subagent_cost
+
+console = Console()
+
+# The orchestrator starts its response with this to send the latest sub-task results back to a stronger model
+CASCADE_REJECTED = "The previous results are rejected:"
+
+CASCADE_REVIEW_PROMPT = (
+    "The latest sub-task results were produced by a smaller model. If any of them is wrong, incomplete or does not do what its prompt asked, "
+    "do not plan the next sub-task: start your response with 'The previous results are rejected:' followed by the reasons, and nothing else."
+)
+
+# Runs whose cascade attempts are kept in memory
+MAX_RUNS_IN_MEMORY = 50
+
+# Code block languages whose content a cheap check parses
+PYTHON_LANGUAGES = ('python', 'py', 'python3')
+JSON_LANGUAGES = ('json',)
+
+def check_result(text, truncated=False):
+    """
+    Cheap checks of a result from a lower cascade tier: anything they find sends the sub-task to the next tier.
+
+    Args:
+        text (str): The result.
+        truncated (bool): Whether the output token limit cut the response off.
+
+    Returns:
+        str: Why the result fails, or None if it passes.
+    """
+    if truncated:
+        return "truncated"
+    if not text.strip():
+        return "empty result"
+    parser = CodeFenceParser()
+    blocks = parser.feed(text + "\n")
+    if parser.block is not None:
+        return "unclosed code block"
+    for _, language, content in blocks:
+        if not content.strip():
+            return "empty code block"
+        language = (language or '').lower()
+        try:
+            if language in PYTHON_LANGUAGES:
+                # Snippets are often cut out of an indented body
+                ast.parse(textwrap.dedent(content))
+            elif language in JSON_LANGUAGES:
+                json.loads(content)
+        except (SyntaxError, ValueError):
+            return f"unparseable {language} code block"
+    return None
+
+class CascadeStats:
+    """
+    Records every attempt of the sub-agent cascade per run: the tier and model that made it, its latency, tokens and
+    cost, and whether its result was accepted, escalated to the next tier by a cheap check, or rejected by the
+    orchestrator.
+
+    Args:
+        max_runs (int): Runs whose attempts are kept in memory.
+    """
+    def __init__(self, max_runs=MAX_RUNS_IN_MEMORY):
+        self.max_runs = max_runs
+        self.runs = OrderedDict()
+        # Seconds per output token of each model as the last tier, over every run, for estimating saved latency
+        self.final_tier_rates = {}
+        self.lock = threading.Lock()
+
+    def record(self, run_id, tier, final, model, responses, reason=None):
+        """
+        Records one attempt.
+
+        Args:
+            run_id (str, optional): ID of the run the attempt belongs to.
+            tier (int): Index of the tier in the cascade.
+            final (bool): Whether the tier is the last one.
+            model (str): Model of the tier.
+            responses (list of LLMResponse): The attempt's calls (several with continuations).
+            reason (str, optional): Why the result was escalated; None if it was accepted.
+
+        Returns:
+            dict: The attempt, to be passed to reject() if the orchestrator rejects its result.
+        """
+        attempt = {'tier': tier, 'final': final, 'model': model, 'seconds': sum(response.duration for response in responses),
+                   'input_tokens': 0, 'output_tokens': 0, 'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 0, 'cost': 0.0,
+                   'outcome': 'accepted' if reason is None else 'escalated', 'reason': reason}
+        for response in responses:
+            # A response cache hit cost nothing, and the stronger model would have been a hit too
+            if response.cached:
+                continue
+            for key in ('input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens'):
+                attempt[key] += getattr(response, key)
+            cost = calculate_subagent_cost(model, response.input_tokens, response.output_tokens, response.cache_creation_input_tokens, response.cache_read_input_tokens)
+            attempt['cost'] = None if cost is None or attempt['cost'] is None else attempt['cost'] + cost
+        with self.lock:
+            attempts = self.runs.get(run_id)
+            if attempts is None:
+                attempts = self.runs[run_id] = []
+                while len(self.runs) > self.max_runs:
+                    self.runs.popitem(last=False)
+            attempts.append(attempt)
+            if final and attempt['output_tokens']:
+                seconds, tokens = self.final_tier_rates.get(model, (0.0, 0))
+                self.final_tier_rates[model] = (seconds + attempt['seconds'], tokens + attempt['output_tokens'])
+        return attempt
+
+    def reject(self, attempt, reason="rejected by orchestrator"):
+        """
+        Marks an accepted attempt as rejected by the orchestrator, which escalates its sub-task.
+        """
+        with self.lock:
+            attempt['outcome'] = 'rejected'
+            attempt['reason'] = reason
+
+    def run_summary(self, run_id, models):
+        """
+        Returns how each tier of a run's cascade fared and what answering sub-tasks on the lower tiers saved.
+
+        Every result accepted from a lower tier is priced as if the last tier had produced the same tokens, with
+        calculate_subagent_cost, and timed at the last tier's observed seconds per output token. Everything spent on
+        the lower tiers, including escalated and rejected attempts, is subtracted.
+
+        Args:
+            run_id (str): ID of the run.
+            models (list of str): Model of each tier, cheapest first.
+
+        Returns:
+            dict: tiers (attempts, accepted, escalated, rejected, reasons, seconds and cost per tier), sub_tasks,
+            sub_tasks_on_lower_tiers, saved_cost and saved_seconds (None if unknown).
+        """
+        final_model = models[-1]
+        with self.lock:
+            attempts = [dict(attempt) for attempt in self.runs.get(run_id, [])]
+            seconds, tokens = self.final_tier_rates.get(final_model, (0.0, 0))
+        seconds_per_token = seconds / tokens if tokens else None
+        tiers = [{'model': model, 'attempts': 0, 'accepted': 0, 'escalated': 0, 'rejected': 0, 'reasons': Counter(), 'seconds': 0.0, 'cost': 0.0}
+                 for model in models]
+        saved_cost, saved_seconds = 0.0, 0.0
+        for attempt in attempts:
+            tier = tiers[attempt['tier']]
+            tier['attempts'] += 1
+            tier[attempt['outcome']] += 1
+            if attempt['reason']:
+                tier['reasons'][attempt['reason']] += 1
+            tier['seconds'] += attempt['seconds']
+            tier['cost'] = None if tier['cost'] is None or attempt['cost'] is None else tier['cost'] + attempt['cost']
+            if attempt['final']:
+                continue
+            final_cost = calculate_subagent_cost(final_model, attempt['input_tokens'], attempt['output_tokens'],
+                                                 attempt['cache_creation_input_tokens'], attempt['cache_read_input_tokens']) if attempt['outcome'] == 'accepted' else 0.0
+            if saved_cost is not None:
+                saved_cost = None if final_cost is None or attempt['cost'] is None else saved_cost + final_cost - attempt['cost']
+            if saved_seconds is not None:
+                final_seconds = attempt['output_tokens'] * seconds_per_token if seconds_per_token is not None else None
+                if attempt['outcome'] != 'accepted':
+                    final_seconds = 0.0
+                saved_seconds = None if final_seconds is None else saved_seconds + final_seconds - attempt['seconds']
+        return {
+            'tiers': tiers,
+            'sub_tasks': sum(tier['accepted'] for tier in tiers),
+            'sub_tasks_on_lower_tiers': sum(tier['accepted'] for tier in tiers[:-1]),
+            'saved_cost': saved_cost,
+            'saved_seconds': saved_seconds,
+        }
+
+def print_cascade_summary(run_id, models):
+    """
+    Prints how often each tier of the sub-agent cascade answered a sub-task, and the cost and latency it saved.
+    """
+    summary = get_cascade_stats().run_summary(run_id, models)
+    if not summary['sub_tasks']:
+        return
+    table = Table(title="Sub-agent Cascade", title_justify="left", border_style="cyan")
+    for column in ("Tier", "Model", "Attempts", "Accepted", "Escalated", "Time", "Cost"):
+        table.add_column(column, justify="left" if column in ("Model", "Escalated") else "right")
+    for index, tier in enumerate(summary['tiers'], 1):
+        reasons = ", ".join(f"{count} {reason}" for reason, count in tier['reasons'].most_common())
+        table.add_row(str(index), tier['model'], str(tier['attempts']), str(tier['accepted']), reasons or "0", f"{tier['seconds']:.1f}s",
+                      f"${tier['cost']:.4f}" if tier['cost'] is not None else "n/a")
+    console.print(table)
+    saved_cost = f"${summary['saved_cost']:.4f}" if summary['saved_cost'] is not None else "n/a (unpriced model)"
+    saved_seconds = f"{summary['saved_seconds']:.1f}s" if summary['saved_seconds'] is not None else f"n/a (no {models[-1]} calls to time)"
+    console.print(f"Cascade: {summary['sub_tasks_on_lower_tiers']} of {summary['sub_tasks']} sub-tasks answered below {models[-1]}, "
+                  f"saving about {saved_cost} and {saved_seconds} of model time")
+
+cascade_stats = None
+cascade_stats_lock = threading.Lock()
+
+def get_cascade_stats():
+    """
+    Returns the process-wide cascade statistics.
+    """
+    global cascade_stats
+    with cascade_stats_lock:
+        if cascade_stats is None:
+            cascade_stats = CascadeStats()
+    return cascade_stats
@@ -0,0 +1,129 @@
+import hashlib
+import threading
+from rich.console import Console
+from rich.panel import Panel
+
+console = Console()
+
+# Once the previous results sent to the orchestrator pass this many (estimated) tokens, older ones are summarized
+COMPACTION_TOKEN_BUDGET = 16000
+# The most recent results are always sent verbatim
+KEEP_RECENT_RESULTS = 3
+# Upper bound for a single summary
+SUMMARY_MAX_TOKENS = 512
+
+COMPACTION_PROMPT = (
+    "Summarize the following sub-task result so an orchestrator can keep track of the overall progress without the full text. "
+    "Keep every file name, function and class signature, decision, open issue and bug that was found, and drop code bodies, "
+    "explanations and repetition. Answer with the summary only, in at most {max_words} words.\n\n"
+    "Sub-task result:\n{result}"
+)
+
+def estimate_tokens(text):
+    """
+    Cheap, provider-independent token estimate (roughly four characters per token).
+    """
+    return len(text) // 4 + 1
+
+def compaction_prompt(result, max_tokens=SUMMARY_MAX_TOKENS):
+    """
+    Builds the prompt used to summarize a single sub-task result.
+
+    Args:
+        result (str): The sub-task result to summarize.
+        max_tokens (int): Token budget of the summary.
+
+    Returns:
+        str: The summarization prompt.
+    """
+    return COMPACTION_PROMPT.format(result=result, max_words=int(max_tokens * 0.75))
+
+class HistoryCompactor:
+    """
+    Keeps the previous results sent to the orchestrator within a token budget.
+
+    Once the history passes `token_budget`, the oldest results are replaced by summaries until it fits again, while
+    the last `keep_recent` results are always kept verbatim. A result that has been compacted stays compacted on
+    later turns, and each summary is generated only once per run and then reused, so the prompt prefix stays stable.
+
+    Args:
+        summarize (callable): Called with a result, returns its summary (usually a call to the cheapest model).
+        token_budget (int): Estimated token budget of the whole history.
+        keep_recent (int): Number of most recent results never compacted.
+    """
+    def __init__(self, summarize, token_budget=COMPACTION_TOKEN_BUDGET, keep_recent=KEEP_RECENT_RESULTS):
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.summaries = {}
+        self.compacted_count = 0
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.original_tokens = 0
+        self.sent_tokens = 0
+
+    def summary_for(self, result):
+        key = hashlib.sha256(result.encode('utf-8')).hexdigest()
+        if key not in self.summaries:
+            self.summaries[key] = self.summarize(result).strip()
+        return self.summaries[key]
+
+    def compact(self, results):
+        """
+        Returns the history to send to the orchestrator.
+
+        Args:
+            results (list of str): All previous sub-task results, oldest first.
+
+        Returns:
+            list of str: The results with older entries replaced by summaries where needed.
+        """
+        with self.lock:
+            compacted = list(results)
+            total = sum(estimate_tokens(result) for result in results)
+            original = total
+            compactable = max(len(results) - self.keep_recent, 0)
+            for index in range(compactable):
+                if index >= self.compacted_count and total <= self.token_budget:
+                    break
+                summary = f"[Summary of sub-task result {index + 1}] {self.summary_for(results[index])}"
+                total += estimate_tokens(summary) - estimate_tokens(results[index])
+                compacted[index] = summary
+                self.compacted_count = max(self.compacted_count, index + 1)
+
+            self.calls += 1
+            self.original_tokens += original
+            self.sent_tokens += total
+        if total < original:
+            console.print(f"Compacted orchestrator history: {original} -> {total} estimated tokens ({self.compacted_count} results summarized)")
+        return compacted
+
+    def stats(self):
+        """
+        Returns the token reduction achieved so far in this run.
+
+        Returns:
+            dict: calls, original_tokens, sent_tokens, saved_tokens, reduction and summaries.
+        """
+        saved = self.original_tokens - self.sent_tokens
+        return {
+            'calls': self.calls,
+            'original_tokens': self.original_tokens,
+            'sent_tokens': self.sent_tokens,
+            'saved_tokens': saved,
+            'reduction': saved / self.original_tokens if self.original_tokens else 0.0,
+            'summaries': len(self.summaries),
+        }
+
+    def print_stats(self):
+        """
+        Prints the token reduction achieved so far in this run.
+        """
+        stats = self.stats()
+        if not stats['calls']:
+            return
+        console.print(Panel(
+            f"Orchestrator history: {stats['original_tokens']} -> {stats['sent_tokens']} estimated tokens over {stats['calls']} calls "
+            f"({stats['reduction']:.0%} reduction, {stats['summaries']} summaries generated)",
+            title="[bold]Context Compaction[/bold]", title_align="left", border_style="cyan"
+        ))
@@ -0,0 +1,169 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from rich.console import Console
+from rich.panel import Panel
+from maestro_compaction import estimate_tokens
+
+console = Console()
+
+# Fold every sub-agent step into a running draft of the final output, so the final refine only polishes the draft
+INCREMENTAL_REFINE = False
+# Output limit of a merge, which bounds the draft and with it the final refine call
+DRAFT_MAX_TOKENS = 4096
+
+DRAFT_PROMPT = (
+    "You maintain the draft of the final output for the objective below. Merge the new sub-task results into the current draft: add what is "
+    "new, update what changed and drop what they supersede. Keep every code file complete, with its file name. Keep the draft focused on the "
+    "objective and under {max_words} words, condensing explanations rather than code. Answer with the full updated draft only.\n\n"
+    "Objective: {objective}\n\nCurrent draft:\n{draft}{results}"
+)
+NEW_RESULTS_HEADER = "New sub-task results:"
+# Results escalated to a stronger model (see maestro_cascade) after the draft already took in the ones they replace
+REPLACEMENT_RESULTS_HEADER = "Corrected sub-task results, which replace the earlier results of the same sub-tasks:"
+EMPTY_DRAFT = "(empty, this is the first result)"
+# Marks where the fallback of a failed merge cut a result or the draft
+TRUNCATED_MARKER = "[...]"
+
+# Follows the draft in the final refine call, ahead of the backend's refine prompt
+POLISH_PROMPT = "\n\nEvery sub-task result has already been merged into this draft. Polish it into the final output rather than starting over."
+
+def draft_prompt(objective, draft, results, replacements=(), max_tokens=DRAFT_MAX_TOKENS):
+    """
+    Builds the prompt that merges sub-task results into the draft.
+
+    Args:
+        objective (str): The run's objective.
+        draft (str): The current draft; empty before the first merge.
+        results (list of str): New sub-task results to merge.
+        replacements (list of str): Results that replace earlier results of the same sub-tasks.
+        max_tokens (int): Token budget of the draft.
+
+    Returns:
+        str: The merge prompt.
+    """
+    sections = "".join(f"\n\n{header}\n" + "\n\n".join(items) for header, items in ((NEW_RESULTS_HEADER, results), (REPLACEMENT_RESULTS_HEADER, replacements)) if items)
+    return DRAFT_PROMPT.format(
+        objective=objective,
+        draft=draft or EMPTY_DRAFT,
+        results=sections,
+        max_words=int(max_tokens * 0.75),
+    )
+
+def append_results(draft, results, max_tokens=DRAFT_MAX_TOKENS):
+    """
+    Fallback for results no merge could take in: appends them to the draft, cutting the longest parts down to equal
+    shares so that the whole stays within `max_tokens` (estimated).
+    """
+    parts = [part for part in [draft] + list(results) if part]
+    # Characters, at estimate_tokens' four per token, less the separators and markers
+    budget = max(max_tokens * 4 - len(parts) * (len(TRUNCATED_MARKER) + 3), 0)
+    limits = {}
+    remaining = sorted(range(len(parts)), key=lambda index: len(parts[index]))
+    # Parts shorter than an equal share are kept whole, and what they leave over goes to the longer ones
+    while remaining and len(parts[remaining[0]]) <= budget // len(remaining):
+        index = remaining.pop(0)
+        limits[index] = len(parts[index])
+        budget -= limits[index]
+    for index in remaining:
+        limits[index] = budget // len(remaining)
+    return "\n\n".join(part if len(part) <= limits[index] else part[:limits[index]] + "\n" + TRUNCATED_MARKER for index, part in enumerate(parts))
+
+class IncrementalDraft:
+    """
+    Folds sub-task results into a running draft of the final output on a background thread.
+
+    Merges run one at a time in the order they were added, each on the draft the previous one produced, while the
+    run carries on with the next orchestrator call. A merge that fails (cut off, empty or raising) keeps the previous
+    draft, and its results go into the next merge. `result()` waits for the merges still running and tries once more
+    for results left over; if that fails too, they are appended to the draft, cut down to `max_tokens`.
+
+    Args:
+        merge (callable): Called with (step, draft, results, replacements, sequence), returns the new draft, or None
+            if the merge failed. `sequence` numbers the merges in the order they were added, and is None for the retry
+            of leftover results in `result()`.
+        max_tokens (int): Token budget of the draft.
+    """
+    def __init__(self, merge, max_tokens=DRAFT_MAX_TOKENS):
+        self.merge = merge
+        self.max_tokens = max_tokens
+        self.draft = ""
+        # Batches of (results, replaces) no merge has taken in yet
+        self.unmerged = []
+        self.last_step = 0
+        self.sequence = 0
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="maestro-draft")
+        self.pending = []
+        self.lock = threading.Lock()
+        self.counters = {'merges': 0, 'failed_merges': 0, 'merge_seconds': 0.0, 'wait_seconds': 0.0, 'fallback': False}
+
+    def add(self, step, results, replaces=False):
+        """
+        Schedules a merge of a step's results into the draft.
+        """
+        self.last_step = max(self.last_step, step)
+        # The merge runs in a copy of the caller's context, so the run ID and journal carry over
+        self.pending.append(self.executor.submit(contextvars.copy_context().run, self.run_merge, step, list(results), replaces))
+
+    def run_merge(self, step, results, replaces, leftover=False):
+        # Runs on the executor's single thread, so the draft, the unmerged batches and the sequence need no lock
+        start = time.perf_counter()
+        batches = self.unmerged + ([(results, replaces)] if results else [])
+        sequence = None
+        if not leftover:
+            sequence, self.sequence = self.sequence, self.sequence + 1
+        try:
+            draft = self.merge(step, self.draft, [result for results, replaces in batches if not replaces for result in results],
+                               [result for results, replaces in batches if replaces for result in results], sequence)
+        except Exception as e:
+            console.print(f"[bold yellow]Warning:[/bold yellow] merging the draft failed ({type(e).__name__}: {e}), the results go into the next merge.")
+            draft = None
+        if draft is None:
+            self.unmerged = batches
+        else:
+            self.draft, self.unmerged = draft, []
+        with self.lock:
+            self.counters['merges' if draft is not None else 'failed_merges'] += 1
+            self.counters['merge_seconds'] += time.perf_counter() - start
+
+    def result(self):
+        """
+        Waits for the scheduled merges and returns the draft, with every result in it.
+        """
+        start = time.perf_counter()
+        pending, self.pending = self.pending, []
+        for future in pending:
+            future.result()
+        if self.unmerged:
+            # One more try for the results of failed merges
+            self.executor.submit(contextvars.copy_context().run, self.run_merge, self.last_step, [], False, True).result()
+        with self.lock:
+            self.counters['wait_seconds'] += time.perf_counter() - start
+        if self.unmerged:
+            console.print("[bold yellow]Warning:[/bold yellow] some results could not be merged into the draft, appending them cut down to the draft's budget.")
+            with self.lock:
+                self.counters['fallback'] = True
+            return append_results(self.draft, [result for results, _ in self.unmerged for result in results], self.max_tokens)
+        return self.draft
+
+    def close(self):
+        # Merges still scheduled are dropped; the background thread ends once the running one finishes
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def print_stats(self, sub_task_results, refine_input):
+        """
+        Prints the size of the final refine input compared with the sub-task results it replaces, and the time the
+        run waited for merges.
+        """
+        with self.lock:
+            counters = dict(self.counters)
+        if not counters['merges'] and not counters['failed_merges']:
+            return
+        result_tokens = sum(estimate_tokens(result) for result in sub_task_results)
+        failed = f" ({counters['failed_merges']} failed{', the rest was appended' if counters['fallback'] else ''})" if counters['failed_merges'] else ""
+        console.print(Panel(
+            f"Final refine input: {estimate_tokens(refine_input)} estimated tokens of draft instead of {result_tokens} of sub-task results. "
+            f"{counters['merges']} merges{failed} took {counters['merge_seconds']:.1f}s in the background, of which the run waited {counters['wait_seconds']:.1f}s",
+            title="[bold]Incremental Refine[/bold]", title_align="left", border_style="cyan"
+        ))
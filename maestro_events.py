@@ -0,0 +1,162 @@
+import contextvars
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+# Maximum number of undelivered events; when full, new events are dropped instead of blocking the run
+EVENT_QUEUE_SIZE = 1000
+# The dispatcher hands subscribers up to this many events at once
+DISPATCH_BATCH_SIZE = 50
+# How long the dispatcher waits for more events before delivering a partial batch
+DISPATCH_INTERVAL_SECONDS = 0.1
+
+# Optional remote sink: set to e.g. 'http://localhost:5000/update_progress' to forward events to a Flask app
+# running in another process
+REMOTE_PROGRESS_URL = None
+REMOTE_TIMEOUT_SECONDS = 2
+
+# ID of the run the current thread works for, attached to every published progress event
+current_run_id = contextvars.ContextVar('current_run_id', default=None)
+
+@contextmanager
+def run_context(run_id):
+    """
+    Tags every progress event published inside the block (and in sub-tasks it starts) with `run_id`.
+    """
+    token = current_run_id.set(run_id)
+    try:
+        yield
+    finally:
+        current_run_id.reset(token)
+
+class EventBus:
+    """
+    In-process publish/subscribe bus for progress events.
+
+    `publish` never blocks: events go into a bounded queue and a background dispatcher thread delivers them
+    to the subscribers in batches. If the queue is full the event is dropped and counted in `dropped`.
+
+    Args:
+        max_size (int): Maximum number of undelivered events.
+        batch_size (int): Maximum number of events per delivered batch.
+        interval (float): Seconds to wait for more events before delivering a partial batch.
+    """
+    def __init__(self, max_size=EVENT_QUEUE_SIZE, batch_size=DISPATCH_BATCH_SIZE, interval=DISPATCH_INTERVAL_SECONDS):
+        self.events = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.dispatcher = None
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, callback):
+        """
+        Registers `callback`, which is called on the dispatcher thread with a list of events.
+        """
+        with self.lock:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def publish(self, event):
+        """
+        Queues `event` for delivery without waiting for the subscribers.
+
+        Returns:
+            bool: False if the event was dropped because the queue is full.
+        """
+        self.start()
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return False
+        with self.lock:
+            self.published += 1
+        return True
+
+    def start(self):
+        with self.lock:
+            if self.dispatcher is None:
+                self.dispatcher = threading.Thread(target=self.dispatch, name="maestro-events", daemon=True)
+                self.dispatcher.start()
+
+    def dispatch(self):
+        while True:
+            batch = [self.events.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.events.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.deliver(batch)
+            for _ in batch:
+                self.events.task_done()
+
+    def deliver(self, batch):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try:
+                callback(batch)
+            except Exception as e:
+                print(f"Error delivering progress events: {str(e)}")
+
+    def flush(self, timeout=None):
+        """
+        Waits until every published event has been delivered, or until `timeout` seconds have passed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.events.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+def http_sink(url, timeout=REMOTE_TIMEOUT_SECONDS):
+    """
+    Returns a subscriber that posts each event to `url` (the Flask app's /update_progress endpoint).
+
+    A slow or unreachable server only delays the dispatcher thread, never the run.
+    """
+    import requests
+    session = requests.Session()
+
+    def post_events(batch):
+        for event in batch:
+            try:
+                response = session.post(url, json=event, timeout=timeout)
+                if response.status_code != 200:
+                    print(f"Failed to send progress update: {response.status_code}")
+            except requests.RequestException as e:
+                print(f"Error sending progress update: {str(e)}")
+                # Skip the rest of the batch rather than waiting on an unreachable server for every event
+                return
+
+    return post_events
+
+event_bus = None
+event_bus_lock = threading.Lock()
+
+def get_event_bus():
+    """
+    Returns the shared event bus, subscribing the remote sink on first use if REMOTE_PROGRESS_URL is set.
+    """
+    global event_bus
+    with event_bus_lock:
+        if event_bus is None:
+            event_bus = EventBus()
+            if REMOTE_PROGRESS_URL:
+                event_bus.subscribe(http_sink(REMOTE_PROGRESS_URL))
+    return event_bus
@@ -0,0 +1,159 @@
+import re
+from collections import deque
+
+# Patterns that name the file of a code block, tried on the fence's info string and then on the lines above the
+# fence, nearest line first
+FILENAME_LABEL_PATTERN = re.compile(r'Filename:\s*`?([^\s`]+)`?', re.IGNORECASE)         # Filename: filename.ext
+FILENAME_PATTERNS = [
+    FILENAME_LABEL_PATTERN,
+    re.compile(r'`([^`]+?\.[a-zA-Z0-9]+)`'),                  # `filename.ext`
+    re.compile(r'\*\*FileName: ([^\s]+?\.[a-zA-Z0-9]+)\*\*'), # **FileName: filename.ext**
+    re.compile(r'# ([^\s]+?\.[a-zA-Z0-9]+)'),                 # # filename.ext
+    re.compile(r'File: ([^\s]+?\.[a-zA-Z0-9]+)'),             # File: filename.ext
+    re.compile(r'\'([^\']+?\.[a-zA-Z0-9]+)\''),               # 'filename.ext'
+    re.compile(r'filename:\(([^\)]+?\.[a-zA-Z0-9]+)\)'),      # filename:(filename.ext)
+    re.compile(r'\b([^\s]+?\.[a-zA-Z0-9]+)\b'),               # filename.ext (as a fallback)
+]
+# Lines above an opening fence searched for its filename
+FILENAME_CONTEXT_LINES = 3
+
+PROJECT_NAME_LABEL = "Project Name:"
+FOLDER_STRUCTURE_OPEN = "<folder_structure>"
+FOLDER_STRUCTURE_CLOSE = "</folder_structure>"
+
+class CodeFenceParser:
+    """
+    Incremental, single-pass tokenizer for the fenced code blocks of a model response.
+
+    Text is fed in chunks of any size (e.g. straight from a response stream) and each completed code block is
+    returned as a (filename, language, content) event as soon as its closing fence arrives. Every line is looked
+    at once; filename patterns only run on the few lines above an opening fence. The parser also picks up the
+    'Project Name:' line and the <folder_structure> section of the refine prompt's format on the way.
+
+    A fence is a line starting with three or more backticks, optionally followed by a language and a filename; a
+    block is closed by a line holding only at least as many backticks.
+
+    Args:
+        start_marker (str, optional): Ignore everything up to and including the first line containing this text.
+        filename_patterns (list of re.Pattern): Patterns whose first group names a block's file, in priority order.
+    """
+    def __init__(self, start_marker=None, filename_patterns=FILENAME_PATTERNS):
+        self.start_marker = start_marker
+        self.filename_patterns = filename_patterns
+        self.started = start_marker is None
+        self.partial_line = []
+        self.context = deque(maxlen=FILENAME_CONTEXT_LINES)
+        self.fence = None
+        self.block = None
+        self.structure_lines = None
+        self.project_name = None
+        self.folder_structure = None
+
+    def feed(self, chunk):
+        """
+        Consumes the next chunk of text.
+
+        Returns:
+            list of tuple: (filename or None, language or None, content) for every code block closed in this chunk.
+        """
+        events = []
+        if '\n' not in chunk:
+            # Pieces of a long line are joined once the line is complete rather than on every chunk
+            self.partial_line.append(chunk)
+            return events
+        self.partial_line.append(chunk)
+        lines = "".join(self.partial_line).split('\n')
+        self.partial_line = [lines.pop()]
+        for line in lines:
+            self.handle_line(line, events)
+        return events
+
+    def close(self):
+        """
+        Consumes the last line and ends the text; an unterminated code block is returned as if it had been closed.
+
+        Returns:
+            list of tuple: (filename or None, language or None, content) of the remaining code blocks.
+        """
+        events = []
+        last_line = "".join(self.partial_line)
+        self.partial_line = []
+        if last_line:
+            self.handle_line(last_line, events)
+        if self.block is not None:
+            events.append(self.finish_block())
+        if self.structure_lines is not None and self.folder_structure is None:
+            self.folder_structure = "\n".join(self.structure_lines).strip()
+        return events
+
+    def handle_line(self, line, events):
+        if not self.started:
+            self.started = self.start_marker in line
+            return
+        stripped = line.strip()
+
+        if self.block is not None:
+            if stripped.startswith(self.fence) and not stripped.strip('`'):
+                events.append(self.finish_block())
+            else:
+                self.block['lines'].append(line)
+            return
+
+        if self.structure_lines is not None:
+            end = line.find(FOLDER_STRUCTURE_CLOSE)
+            content = line if end == -1 else line[:end]
+            # Fences around the JSON are not part of it
+            if not content.strip().startswith('```'):
+                self.structure_lines.append(content)
+            if end == -1:
+                return
+            self.folder_structure = "\n".join(self.structure_lines).strip()
+            self.structure_lines = None
+            return
+
+        if stripped.startswith('```'):
+            self.open_block(stripped)
+            return
+
+        start = line.find(FOLDER_STRUCTURE_OPEN)
+        if start != -1 and self.folder_structure is None:
+            self.structure_lines = []
+            self.handle_line(line[start + len(FOLDER_STRUCTURE_OPEN):], events)
+            return
+        if self.project_name is None and PROJECT_NAME_LABEL in line:
+            self.project_name = line.split(PROJECT_NAME_LABEL, 1)[1].strip().strip('*').strip() or None
+        self.context.append(line)
+
+    def open_block(self, fence_line):
+        info = fence_line.lstrip('`')
+        self.fence = fence_line[:len(fence_line) - len(info)]
+        words = info.split()
+        language = words[0] if words and '.' not in words[0] else None
+        self.block = {'filename': self.find_filename([info] + list(reversed(self.context))), 'language': language, 'lines': []}
+        self.context.clear()
+
+    def find_filename(self, lines):
+        for line in lines:
+            for pattern in self.filename_patterns:
+                match = pattern.search(line)
+                if match:
+                    return match.group(1).strip('*')
+        return None
+
+    def finish_block(self):
+        block = self.block
+        self.block = None
+        self.fence = None
+        return (block['filename'], block['language'], '\n'.join(block['lines']))
+
+def parse_code_fences(text, start_marker=None, filename_patterns=FILENAME_PATTERNS):
+    """
+    Parses a complete text in one pass.
+
+    Returns:
+        tuple: (list of (filename, language, content) events, the parser, for its project_name and folder_structure)
+    """
+    parser = CodeFenceParser(start_marker, filename_patterns)
+    events = parser.feed(text)
+    events.extend(parser.close())
+    return events, parser
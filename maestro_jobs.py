@@ -0,0 +1,148 @@
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Number of runs executing at the same time
+MAX_WORKERS = 2
+# Runs waiting for a worker; submissions beyond this are rejected
+MAX_QUEUED_JOBS = 8
+# Finished jobs kept around for status polling
+MAX_FINISHED_JOBS = 100
+
+class QueueFullError(Exception):
+    """
+    Raised when a job is submitted while the queue already holds MAX_QUEUED_JOBS waiting jobs.
+    """
+
+class Job:
+    """
+    One queued maestro run.
+
+    Args:
+        module_name (str): The maestro module to run (Ex: maestro-anyapi.py).
+        objective (str): The objective passed to the module's run_maestro.
+        kwargs (dict): Additional run_maestro arguments.
+    """
+    def __init__(self, module_name, objective, kwargs):
+        self.id = uuid.uuid4().hex
+        self.module_name = module_name
+        self.objective = objective
+        self.kwargs = kwargs
+        self.status = 'queued'
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'module': self.module_name,
+            'objective': self.objective,
+            'status': self.status,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+        }
+
+class JobQueue:
+    """
+    Runs submitted jobs on a fixed pool of worker threads behind a bounded queue.
+
+    `submit` returns immediately with a job whose status moves from 'queued' to 'running' and then to
+    'succeeded' or 'failed'. Once `max_queued` jobs are waiting, further submissions raise QueueFullError
+    instead of piling up.
+
+    Args:
+        run_job (callable): Called with a Job on a worker thread; an exception marks the job as failed.
+        max_workers (int): Number of worker threads.
+        max_queued (int): Maximum number of jobs waiting for a worker.
+        max_finished (int): Number of finished jobs kept for status lookups.
+        on_update (callable, optional): Called with a Job whenever its status changes.
+    """
+    def __init__(self, run_job, max_workers=MAX_WORKERS, max_queued=MAX_QUEUED_JOBS, max_finished=MAX_FINISHED_JOBS, on_update=None):
+        self.run_job = run_job
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self.on_update = on_update
+        self.pending = queue.Queue(maxsize=max_queued)
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.workers = []
+
+    def start(self):
+        # Workers are started on first use, so importing the app does not spawn threads
+        with self.lock:
+            while len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self.work, name=f"maestro-job-{len(self.workers)}", daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def submit(self, module_name, objective, **kwargs):
+        """
+        Queues a run of `module_name` and returns its Job.
+
+        Raises:
+            QueueFullError: If the queue is full.
+        """
+        self.start()
+        job = Job(module_name, objective, kwargs)
+        with self.lock:
+            try:
+                self.pending.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError(f"Too many queued runs ({self.pending.maxsize}), please retry later.")
+            self.jobs[job.id] = job
+        self.notify(job)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def stats(self):
+        """
+        Returns the number of jobs per status and the queue capacity.
+        """
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {'workers': self.max_workers, 'max_queued': self.pending.maxsize, 'counts': counts}
+
+    def work(self):
+        while True:
+            job = self.pending.get()
+            job.status = 'running'
+            job.started_at = time.time()
+            self.notify(job)
+            try:
+                self.run_job(job)
+                job.status = 'succeeded'
+            except Exception as e:
+                job.status = 'failed'
+                job.error = str(e)
+            job.finished_at = time.time()
+            self.forget_finished()
+            self.notify(job)
+            self.pending.task_done()
+
+    def forget_finished(self):
+        with self.lock:
+            finished = [job_id for job_id, job in self.jobs.items() if job.finished_at is not None]
+            for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+                del self.jobs[job_id]
+
+    def notify(self, job):
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception as e:
+                print(f"Error sending job update: {str(e)}")
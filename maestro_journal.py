@@ -0,0 +1,281 @@
+import argparse
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+# Per-run journals, one JSONL file per run ID
+JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".cache", "maestro", "runs")
+# Also fsync every event, so it survives a power loss and not just a crash of the process (slower)
+JOURNAL_FSYNC = False
+
+# Journal of the run the current thread works for
+current_journal = contextvars.ContextVar('current_journal', default=None)
+
+def new_run_id():
+    return datetime.now().strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+
+def journal_path(run_id, directory=JOURNAL_DIR):
+    return os.path.join(directory, f"{run_id}.jsonl")
+
+class RunState:
+    """
+    What a run's journal says it has already completed, so a resumed run can replay it instead of repeating calls.
+
+    Attributes:
+        started (dict): The first run_started event (objective and run options), or None for a new run.
+        orchestrator (dict): Orchestrator event per step number.
+        sub_agents (dict): Sub-agent result per (step, index).
+        sub_agent_tiers (dict): Cascade tier of each sub-agent result (None in journals from before the cascade).
+        escalations (dict): First cascade tier still worth trying per (step, index), after tiers whose results failed a
+            check or were rejected by the orchestrator.
+        searches (dict): Search answer per query.
+        summaries (dict): Compaction summary per result hash.
+        drafts (dict): Incremental refine draft per merge key (the merge's position and results).
+        refined (str): The refined output, or None.
+        finished (bool): Whether the run finished.
+    """
+    def __init__(self):
+        self.started = None
+        self.orchestrator = {}
+        self.sub_agents = {}
+        self.sub_agent_tiers = {}
+        self.escalations = {}
+        self.searches = {}
+        self.summaries = {}
+        self.drafts = {}
+        self.refined = None
+        self.finished = False
+
+    def apply(self, event):
+        event_type = event['type']
+        if event_type == 'run_started' and self.started is None:
+            self.started = event
+        elif event_type == 'orchestrator':
+            self.orchestrator[event['step']] = event
+        elif event_type == 'sub_agent':
+            self.sub_agents[(event['step'], event['index'])] = event['result']
+            self.sub_agent_tiers[(event['step'], event['index'])] = event.get('tier')
+        elif event_type in ('cascade_escalated', 'cascade_rejected'):
+            key = (event['step'], event['index'])
+            self.escalations[key] = max(self.escalations.get(key, 0), event['tier'] + 1)
+            if event_type == 'cascade_rejected':
+                # The escalated result that follows replaces it; without one, the sub-task runs again on the next tier
+                self.sub_agents.pop(key, None)
+                self.sub_agent_tiers.pop(key, None)
+        elif event_type == 'search':
+            self.searches[event['query']] = event['answer']
+        elif event_type == 'summary':
+            self.summaries[event['key']] = event['text']
+        elif event_type == 'draft':
+            # Drafts of leftover retries, and of journals from before merges had keys, are never replayed
+            if event.get('key'):
+                self.drafts[event['key']] = event['text']
+        elif event_type == 'refine':
+            self.refined = event['text']
+        elif event_type == 'run_finished':
+            self.finished = True
+
+class RunJournal:
+    """
+    Append-only JSONL journal of one run.
+
+    Every event is written as one line and flushed as soon as it happens, so the journal of a crashed or interrupted
+    run holds everything up to the last completed event. Opening the journal of an existing run ID reads it once
+    into `state` and appends to it, which is how runs are resumed.
+
+    Args:
+        run_id (str, optional): ID of the run; a new one is generated if None.
+        directory (str): Directory of the journal files.
+    """
+    def __init__(self, run_id=None, directory=JOURNAL_DIR):
+        self.run_id = run_id or new_run_id()
+        self.directory = directory
+        self.path = journal_path(self.run_id, directory)
+        os.makedirs(directory, exist_ok=True)
+        drop_partial_line(self.path)
+        self.seq = 0
+        self.state = RunState()
+        for event in read_journal(self.run_id, directory):
+            self.state.apply(event)
+            self.seq = event['seq'] + 1
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def append(self, event_type, **data):
+        """
+        Writes one event of type `event_type` with the given fields, plus its sequence number and timestamp.
+        """
+        with self.lock:
+            event = {'seq': self.seq, 'type': event_type, 'time': time.time(), **data}
+            self.file.write(json.dumps(event) + '\n')
+            self.file.flush()
+            if JOURNAL_FSYNC:
+                os.fsync(self.file.fileno())
+            self.seq += 1
+        return event
+
+    @property
+    def resumed(self):
+        return self.state.started is not None
+
+    def events(self):
+        return read_journal(self.run_id, self.directory)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def drop_partial_line(path):
+    # A line cut off by a crash would otherwise be glued to the first event appended after it
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as file:
+        content = file.read()
+        if content and not content.endswith(b'\n'):
+            file.truncate(content.rfind(b'\n') + 1)
+
+def read_journal(run_id, directory=JOURNAL_DIR):
+    """
+    Yields the events of a run's journal in order. A last line cut off by a crash is skipped.
+    """
+    path = journal_path(run_id, directory)
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                if line.endswith('\n'):
+                    raise
+                return
+
+@contextmanager
+def journal_context(journal):
+    """
+    Makes `journal` the target of `record` inside the block (and in sub-tasks it starts).
+    """
+    token = current_journal.set(journal)
+    try:
+        yield journal
+    finally:
+        current_journal.reset(token)
+
+def record(event_type, **data):
+    """
+    Appends an event to the current run's journal, if there is one.
+    """
+    journal = current_journal.get()
+    if journal is not None:
+        journal.append(event_type, **data)
+
+def recorded_search(query):
+    """
+    Returns the answer a resumed run already got for `query`, or None.
+    """
+    journal = current_journal.get()
+    return journal.state.searches.get(query) if journal is not None else None
+
+def run_started_event(run_id, directory=JOURNAL_DIR):
+    """
+    Returns the run_started event (objective and run options) of a run, or None if it has no journal.
+    """
+    for event in read_journal(run_id, directory):
+        if event['type'] == 'run_started':
+            return event
+    return None
+
+def read_last_line(path, block_size=65536):
+    # Reads backwards from the end, so only the last event of a long journal is read
+    with open(path, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        position = file.tell()
+        data = b''
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            file.seek(position)
+            data = file.read(step) + data
+            if data.rstrip(b'\n').count(b'\n'):
+                break
+    lines = data.rstrip(b'\n').split(b'\n')
+    return lines[-1].decode('utf-8') if lines[-1] else None
+
+def latest_unfinished_run(directory=JOURNAL_DIR):
+    """
+    Returns the ID of the most recently updated run if it did not finish, else None.
+    """
+    if not os.path.isdir(directory):
+        return None
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.jsonl')]
+    if not paths:
+        return None
+    path = max(paths, key=os.path.getmtime)
+    try:
+        last_event = json.loads(read_last_line(path) or '{}')
+    except json.JSONDecodeError:
+        # Cut off by a crash
+        last_event = {}
+    if last_event.get('type') == 'run_finished':
+        return None
+    return os.path.basename(path)[:-len('.jsonl')]
+
+def write_report(events, path):
+    """
+    Renders a run's events as the Markdown exchange log (objective, task breakdown, refined final output and, for
+    backends that extract code fences, the code blocks written), streaming it to `path` event by event.
+
+    Args:
+        events (iterable of dict): The run's journal events.
+        path (str): The Markdown file to write.
+    """
+    task_number = 0
+    # Parallel sub-agents finish in any order; the tasks of a step are written in the orchestrator's order
+    step_tasks = []
+
+    def write_tasks(file):
+        nonlocal task_number
+        # A sub-task escalated by the cascade is journaled again; its last result counts
+        latest = {event.get('index', 0): event for event in step_tasks}
+        for _, event in sorted(latest.items()):
+            task_number += 1
+            file.write(f"Task {task_number}:\nPrompt: {event['prompt']}\nResult: {event['result']}\n\n")
+        step_tasks.clear()
+
+    started = False
+    with open(path, 'w', encoding='utf-8') as file:
+        for event in events:
+            if event['type'] == 'run_started' and not started:
+                file.write(f"Objective: {event['objective']}\n\n")
+                file.write("=" * 40 + " Task Breakdown " + "=" * 40 + "\n\n")
+                started = True
+            elif event['type'] == 'sub_agent':
+                step_tasks.append(event)
+            elif event['type'] in ('orchestrator', 'refine'):
+                write_tasks(file)
+                if event['type'] == 'refine':
+                    file.write("=" * 40 + " Refined Final Output " + "=" * 40 + "\n\n")
+                    file.write(event['text'])
+            elif event['type'] == 'files':
+                for block in event.get('blocks', []):
+                    file.write("\n".join(block))
+        write_tasks(file)
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the Markdown exchange log of a run from its journal.")
+    parser.add_argument('run_id', help="ID of the run")
+    parser.add_argument('output', nargs='?', help="Markdown file to write (default: <run_id>.md)")
+    args = parser.parse_args()
+    if not os.path.exists(journal_path(args.run_id)):
+        parser.error(f"No journal for run {args.run_id} in {JOURNAL_DIR}")
+    output = args.output or f"{args.run_id}.md"
+    write_report(read_journal(args.run_id), output)
+    print(f"Exchange log of run {args.run_id} saved to {output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,404 @@
+import threading
+import time
+from rich.console import Console
+from rich.live import Live
+from rich.panel import Panel
+from rich.text import Text
+from maestro_cache import get_response_cache
+
+console = Console()
+
+# Stream tokens to the terminal as they arrive instead of waiting for the whole response
+STREAM_RESPONSES = True
+
+# How often the live panel is redrawn while a response is streaming
+STREAM_REFRESH_SECONDS = 0.1
+
+# Model loads shorter than this are not mentioned in a call's latency line (a loaded model still reports a few ms)
+MIN_REPORTED_LOAD_SECONDS = 0.1
+
+# Rich only supports one live display at a time; concurrent sub-agents stream without rendering
+live_lock = threading.Lock()
+
+# Pricing information per model in dollars per million tokens
+MODEL_PRICING = {
+    "claude-3-opus-20240229": {"input_cost_per_mtok": 15.00, "output_cost_per_mtok": 75.00},
+    "claude-3-haiku-20240307": {"input_cost_per_mtok": 0.25, "output_cost_per_mtok": 1.25},
+    "claude-3-sonnet-20240229": {"input_cost_per_mtok": 3.00, "output_cost_per_mtok": 15.00},
+    "claude-3-5-sonnet-20240620": {"input_cost_per_mtok": 3.00, "output_cost_per_mtok": 15.00},
+    "gpt-4o": {"input_cost_per_mtok": 5.00, "output_cost_per_mtok": 15.00},
+    "gpt-4o-mini": {"input_cost_per_mtok": 0.15, "output_cost_per_mtok": 0.60},
+    "llama3-8b-8192": {"input_cost_per_mtok": 0.05, "output_cost_per_mtok": 0.08},
+    "llama3-70b-8192": {"input_cost_per_mtok": 0.59, "output_cost_per_mtok": 0.79},
+    "mixtral-8x7b-32768": {"input_cost_per_mtok": 0.24, "output_cost_per_mtok": 0.24},
+}
+
+def calculate_subagent_cost(model, input_tokens, output_tokens, cache_creation_input_tokens=0, cache_read_input_tokens=0):
+    """
+    Calculates the cost of a call in dollars.
+
+    Args:
+        model (str): Model identifier.
+        input_tokens (int): Uncached prompt tokens.
+        output_tokens (int): Completion tokens.
+        cache_creation_input_tokens (int): Prompt tokens written to the prompt cache.
+        cache_read_input_tokens (int): Prompt tokens read from the prompt cache.
+
+    Returns:
+        float: The cost, or None if there is no pricing information for the model.
+    """
+    pricing = MODEL_PRICING.get(model)
+    if pricing is None:
+        return None
+
+    # Calculate cost; prompt cache writes cost 25% more than regular input tokens, cache reads 90% less
+    input_cost = (input_tokens / 1_000_000) * pricing["input_cost_per_mtok"]
+    cache_write_cost = (cache_creation_input_tokens / 1_000_000) * pricing["input_cost_per_mtok"] * 1.25
+    cache_read_cost = (cache_read_input_tokens / 1_000_000) * pricing["input_cost_per_mtok"] * 0.10
+    output_cost = (output_tokens / 1_000_000) * pricing["output_cost_per_mtok"]
+    total_cost = input_cost + cache_write_cost + cache_read_cost + output_cost
+
+    return total_cost
+
+class LLMResponse:
+    """
+    Provider-independent result of a model call.
+
+    Args:
+        text (str): The generated text.
+        input_tokens (int): Prompt tokens reported by the provider.
+        output_tokens (int): Completion tokens reported by the provider (estimated if not reported).
+        stop_reason (str, optional): Why generation stopped, as reported by the provider.
+        time_to_first_token (float, optional): Seconds until the first token arrived (streaming only).
+        duration (float): Total seconds spent in the call.
+        cached (bool): True if the response was served from the response cache and cost nothing.
+        cache_creation_input_tokens (int): Prompt tokens written to the provider's prompt cache (Anthropic).
+        cache_read_input_tokens (int): Prompt tokens read from the provider's prompt cache (Anthropic).
+        generation_time (float, optional): Seconds the server reports it spent generating output (Ollama, Groq);
+            defaults to the time from the first token to the end of the call.
+        load_time (float): Seconds the server reports it spent loading the model before the call (Ollama); part
+            of the duration and time to first token.
+    """
+    def __init__(self, text, input_tokens=0, output_tokens=0, stop_reason=None, time_to_first_token=None, duration=0.0, cached=False,
+                 cache_creation_input_tokens=0, cache_read_input_tokens=0, generation_time=None, load_time=0.0):
+        self.text = text
+        self.input_tokens = input_tokens or 0
+        self.output_tokens = output_tokens or 0
+        self.stop_reason = stop_reason
+        self.time_to_first_token = time_to_first_token
+        self.duration = duration
+        self.cached = cached
+        self.cache_creation_input_tokens = cache_creation_input_tokens or 0
+        self.cache_read_input_tokens = cache_read_input_tokens or 0
+        self.generation_time = generation_time if generation_time else max(duration - (time_to_first_token or 0), 0.0)
+        self.load_time = load_time or 0.0
+
+    @property
+    def tokens_per_second(self):
+        """Output tokens per second of generation, measured from the first token when streaming."""
+        return self.output_tokens / self.generation_time if self.generation_time > 0 else 0.0
+
+def render_stream(pieces, title, border_style="blue"):
+    """
+    Consumes an iterator of text deltas, rendering them live in a Rich panel.
+
+    Args:
+        pieces (iterator of str): Text deltas in arrival order.
+        title (str): Title of the live panel.
+        border_style (str): Border style of the live panel.
+
+    Returns:
+        tuple: (full text, seconds until the first non-empty delta or None)
+    """
+    start = time.perf_counter()
+    time_to_first_token = None
+    chunks = []
+    live = None
+    if live_lock.acquire(blocking=False):
+        live = Live(console=console, transient=True, auto_refresh=False)
+    try:
+        if live:
+            live.start()
+        last_refresh = 0.0
+        for piece in pieces:
+            if not piece:
+                continue
+            if time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - start
+            chunks.append(piece)
+            now = time.perf_counter()
+            if live and now - last_refresh >= STREAM_REFRESH_SECONDS:
+                last_refresh = now
+                live.update(stream_panel("".join(chunks), title, border_style), refresh=True)
+    finally:
+        if live:
+            live.stop()
+            live_lock.release()
+    return "".join(chunks), time_to_first_token
+
+def stream_panel(text, title, border_style):
+    # Only show the tail of the response so the panel always fits on screen
+    visible_lines = max(console.height - 4, 5)
+    tail = "\n".join(text.splitlines()[-visible_lines:])
+    return Panel(Text(tail), title=f"{title} (streaming)", title_align="left", border_style=border_style)
+
+def print_latency(stage, response):
+    """
+    Prints the time to first token, throughput and duration of a finished call.
+
+    Args:
+        stage (str): Stage name, e.g. "Orchestrator", "Sub-agent" or "Refiner".
+        response (LLMResponse): The finished response.
+    """
+    load = f" (model load {response.load_time:.2f}s)" if response.load_time >= MIN_REPORTED_LOAD_SECONDS else ""
+    if response.time_to_first_token is not None:
+        console.print(f"{stage}: time to first token {response.time_to_first_token:.2f}s, {response.tokens_per_second:.1f} tokens/sec, total {response.duration:.2f}s{load}")
+    else:
+        console.print(f"{stage}: {response.tokens_per_second:.1f} tokens/sec, total {response.duration:.2f}s{load}")
+    return response
+
+def cached_call(provider, stage, kwargs, call, run=None):
+    """
+    Serves a provider call from the response cache when possible, otherwise performs it and stores the result.
+    The cache is checked before `run`, so a hit does not wait for the provider's rate limits or concurrency slots.
+
+    Args:
+        provider (str): Provider and server of the call (see Provider.cache_namespace), part of the cache key.
+        stage (str): Stage name used in the console output.
+        kwargs (dict): The call arguments; model, messages, system prompt and generation parameters form the cache key.
+        call (callable): Performs the real call and returns an LLMResponse.
+        run (callable, optional): Runs `call` on a cache miss, e.g. under the provider's guard; `call` itself is
+            called if None.
+
+    Returns:
+        LLMResponse: The cached or freshly generated response.
+    """
+    run = run or (lambda function: function())
+    cache = get_response_cache()
+    if cache is None:
+        return run(call)
+
+    payload = {name: value for name, value in kwargs.items() if name not in ('stream', 'stream_options', 'keep_alive')}
+    key = cache.make_key(provider, kwargs.get('model'), payload)
+    cached = cache.get(key)
+    if cached is not None:
+        console.print(f"{stage}: served from response cache")
+        return LLMResponse(
+            cached['text'],
+            cached['input_tokens'],
+            cached['output_tokens'],
+            cached['stop_reason'],
+            cached=True,
+            cache_creation_input_tokens=cached.get('cache_creation_input_tokens'),
+            cache_read_input_tokens=cached.get('cache_read_input_tokens'),
+        )
+
+    response = run(call)
+    cache.set(key, {
+        'text': response.text,
+        'input_tokens': response.input_tokens,
+        'output_tokens': response.output_tokens,
+        'stop_reason': response.stop_reason,
+        'cache_creation_input_tokens': response.cache_creation_input_tokens,
+        'cache_read_input_tokens': response.cache_read_input_tokens,
+    })
+    return response
+
+def cache_breakpoint(block):
+    """
+    Marks an Anthropic content block as the end of a cacheable prompt prefix.
+
+    Args:
+        block (dict): A text content block.
+
+    Returns:
+        dict: The same block with an ephemeral cache_control marker.
+    """
+    block["cache_control"] = {"type": "ephemeral"}
+    return block
+
+def anthropic_cached_blocks(header, items, separator="\n", empty="None"):
+    """
+    Lays out a growing list (previous results, previous tasks) as Anthropic text blocks with a cache breakpoint
+    after the last item.
+
+    Each item gets its own block, so a call that appends one more item shares every earlier block byte-for-byte
+    with the previous call and reads them from the prompt cache instead of paying for them again. The blocks
+    concatenate to exactly `header + separator.join(items)`, or `header + empty` if there are no items.
+
+    Args:
+        header (str): Text that precedes the first item.
+        items (list of str): The items, oldest first.
+        separator (str): Text placed between items.
+        empty (str): Text used in place of the items when there are none.
+
+    Returns:
+        list of dict: Text content blocks.
+    """
+    if not items:
+        return [{"type": "text", "text": header + empty}] if header + empty else []
+    blocks = [{"type": "text", "text": header + items[0]}]
+    for item in items[1:]:
+        # The API rejects whitespace-only blocks, so fold those into the previous block
+        if (separator + item).strip():
+            blocks.append({"type": "text", "text": separator + item})
+        else:
+            blocks[-1]["text"] += separator + item
+    cache_breakpoint(blocks[-1])
+    return blocks
+
+def call_anthropic(client, stage, title=None, stream=None, run=None, cache_namespace="anthropic", **kwargs):
+    """
+    Calls the Anthropic Messages API, streaming the response if enabled.
+
+    Args:
+        client (Anthropic): The Anthropic client.
+        stage (str): Stage name used for the live panel and statistics.
+        title (str, optional): Live panel title. Defaults to the stage name.
+        stream (bool, optional): Override STREAM_RESPONSES for this call.
+        run (callable, optional): Runs the request on a response cache miss (see cached_call).
+        cache_namespace (str): Provider and server of the call, part of the response cache key.
+        kwargs: Arguments passed to `client.messages.create` / `client.messages.stream`.
+
+    Returns:
+        LLMResponse: The normalized response.
+    """
+    return cached_call(cache_namespace, stage, kwargs, lambda: request_anthropic(client, stage, title, stream, **kwargs), run)
+
+def request_anthropic(client, stage, title=None, stream=None, **kwargs):
+    stream = STREAM_RESPONSES if stream is None else stream
+    start = time.perf_counter()
+    time_to_first_token = None
+    if stream:
+        with client.messages.stream(**kwargs) as message_stream:
+            text, time_to_first_token = render_stream(message_stream.text_stream, title or stage)
+            message = message_stream.get_final_message()
+    else:
+        message = client.messages.create(**kwargs)
+        text = "".join(block.text for block in message.content if block.type == "text")
+    return print_latency(stage, LLMResponse(
+        text,
+        message.usage.input_tokens,
+        message.usage.output_tokens,
+        message.stop_reason,
+        time_to_first_token,
+        time.perf_counter() - start,
+        cache_creation_input_tokens=getattr(message.usage, 'cache_creation_input_tokens', 0),
+        cache_read_input_tokens=getattr(message.usage, 'cache_read_input_tokens', 0),
+    ))
+
+def call_chat_completion(create, stage, title=None, stream=None, include_usage=True, run=None, cache_namespace="chat_completion", **kwargs):
+    """
+    Calls an OpenAI-compatible chat completion endpoint (OpenAI, Groq, LM Studio or LiteLLM's `completion`),
+    streaming the response if enabled.
+
+    Args:
+        create (callable): `client.chat.completions.create` or `litellm.completion`.
+        stage (str): Stage name used for the live panel and statistics.
+        title (str, optional): Live panel title. Defaults to the stage name.
+        stream (bool, optional): Override STREAM_RESPONSES for this call.
+        include_usage (bool): Ask for token usage in the final stream chunk. Disable for servers that reject `stream_options`.
+        run (callable, optional): Runs the request on a response cache miss (see cached_call).
+        cache_namespace (str): Provider and server of the call, part of the response cache key.
+        kwargs: Arguments passed to `create`.
+
+    Returns:
+        LLMResponse: The normalized response.
+    """
+    return cached_call(cache_namespace, stage, kwargs, lambda: request_chat_completion(create, stage, title, stream, include_usage, **kwargs), run)
+
+def request_chat_completion(create, stage, title=None, stream=None, include_usage=True, **kwargs):
+    stream = STREAM_RESPONSES if stream is None else stream
+    start = time.perf_counter()
+    if not stream:
+        response = create(**kwargs)
+        choice = response.choices[0]
+        usage = response.usage
+        return print_latency(stage, LLMResponse(
+            choice.message.content or "",
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0,
+            choice.finish_reason,
+            None,
+            time.perf_counter() - start,
+        ))
+
+    if include_usage:
+        kwargs['stream_options'] = {"include_usage": True}
+    final = {'usage': None, 'finish_reason': None, 'chunks': 0}
+
+    def pieces():
+        for chunk in create(stream=True, **kwargs):
+            # Groq reports usage on its own extension field instead of `usage`
+            usage = getattr(chunk, 'usage', None) or getattr(getattr(chunk, 'x_groq', None), 'usage', None)
+            if usage:
+                final['usage'] = usage
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.finish_reason:
+                final['finish_reason'] = choice.finish_reason
+            if choice.delta and choice.delta.content:
+                final['chunks'] += 1
+                yield choice.delta.content
+
+    text, time_to_first_token = render_stream(pieces(), title or stage)
+    usage = final['usage']
+    return print_latency(stage, LLMResponse(
+        text,
+        usage.prompt_tokens if usage else 0,
+        # Without reported usage each content chunk is roughly one token
+        usage.completion_tokens if usage else final['chunks'],
+        final['finish_reason'],
+        time_to_first_token,
+        time.perf_counter() - start,
+        # Groq also reports how long the server spent generating
+        generation_time=getattr(usage, 'completion_time', None),
+    ))
+
+def call_ollama(client, stage, title=None, stream=None, run=None, cache_namespace="ollama", **kwargs):
+    """
+    Calls the Ollama chat endpoint, streaming the response if enabled.
+
+    Args:
+        client (ollama.Client): The Ollama client.
+        stage (str): Stage name used for the live panel and statistics.
+        title (str, optional): Live panel title. Defaults to the stage name.
+        stream (bool, optional): Override STREAM_RESPONSES for this call.
+        run (callable, optional): Runs the request on a response cache miss (see cached_call).
+        cache_namespace (str): Provider and server of the call, part of the response cache key.
+        kwargs: Arguments passed to `client.chat`.
+
+    Returns:
+        LLMResponse: The normalized response.
+    """
+    return cached_call(cache_namespace, stage, kwargs, lambda: request_ollama(client, stage, title, stream, **kwargs), run)
+
+def request_ollama(client, stage, title=None, stream=None, **kwargs):
+    stream = STREAM_RESPONSES if stream is None else stream
+    start = time.perf_counter()
+    time_to_first_token = None
+    if stream:
+        final = {}
+
+        def pieces():
+            for chunk in client.chat(stream=True, **kwargs):
+                if chunk.get('done'):
+                    final.update(chunk)
+                yield chunk['message']['content']
+
+        text, time_to_first_token = render_stream(pieces(), title or stage)
+    else:
+        final = client.chat(**kwargs)
+        text = final['message']['content']
+    return print_latency(stage, LLMResponse(
+        text,
+        final.get('prompt_eval_count'),
+        final.get('eval_count'),
+        final.get('done_reason'),
+        time_to_first_token,
+        time.perf_counter() - start,
+        # Ollama reports its generation time in nanoseconds, which excludes model loading and prompt evaluation
+        generation_time=(final.get('eval_duration') or 0) / 1e9,
+        load_time=(final.get('load_duration') or 0) / 1e9,
+    ))
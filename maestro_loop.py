@@ -0,0 +1,784 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from rich.console import Console
+from rich.panel import Panel
+import maestro_utils
+from maestro_api_router import send_progress_update
+from maestro_cascade import CASCADE_REJECTED, CASCADE_REVIEW_PROMPT, check_result, get_cascade_stats, print_cascade_summary
+from maestro_events import current_run_id, run_context
+from maestro_journal import RunJournal, journal_context, record, recorded_search, run_started_event, write_report
+from maestro_llm import cache_breakpoint, anthropic_cached_blocks, calculate_subagent_cost
+from maestro_metrics import get_metrics, print_run_metrics
+from maestro_providers import flatten_messages
+from maestro_parallel import MAX_PARALLEL_SUB_AGENTS, parallel_subtasks_prompt, split_sub_tasks, run_sub_tasks
+from maestro_compaction import COMPACTION_TOKEN_BUDGET, HistoryCompactor, compaction_prompt, estimate_tokens, SUMMARY_MAX_TOKENS
+from maestro_draft import INCREMENTAL_REFINE, DRAFT_MAX_TOKENS, POLISH_PROMPT, IncrementalDraft, draft_prompt
+from maestro_relevance import SUB_AGENT_CONTEXT_TOKEN_BUDGET, RelevanceIndex
+
+console = Console()
+
+# Results/Progress colors
+color_orchestrator = "#30223c"
+color_subagent = "#2b4e73"
+color_refiner = "#5c3615"
+
+TASK_COMPLETE = "The task is complete:"
+
+ORCHESTRATOR_PROMPT = (
+    "Based on the following objective{file_note}, and the previous sub-task results (if any), please break down the objective into the next sub-task, "
+    "and create a concise and detailed prompt for a subagent so it can execute that task. IMPORTANT!!! when dealing with code tasks make sure you check "
+    "the code for errors and provide fixes and support as part of the next sub-task. If you find any bugs or have suggestions for better code, please "
+    "include them in the next sub-task prompt. Please assess if the objective has been fully achieved. If the previous sub-task results comprehensively "
+    "address all aspects of the objective, include the phrase 'The task is complete:' at the beginning of your response. If the objective is not yet fully "
+    "achieved, break it down into the next sub-task and create a concise and detailed prompt for a subagent to execute that task.:\n\n"
+    "Objective: {objective}{file_section}"
+)
+
+SEARCH_QUERY_PROMPT = (
+    "Please also generate a JSON object containing a single 'search_query' key, which represents a question that, when asked online, would yield "
+    "important information for solving the subtask. The question should be specific and targeted to elicit the most relevant and helpful resources. "
+    "Format your JSON like this, with no additional text before or after:\n{\"search_query\": \"<question>\"}\n"
+)
+
+REFINE_PROMPT = (
+    "\n\nPlease review and refine the sub-task results into a cohesive final output. Add any missing information or details as needed. When working on "
+    "code projects, ONLY AND ONLY IF THE PROJECT IS CLEARLY A CODING ONE please provide the following:\n1. Project Name: Create a concise and appropriate "
+    "project name that fits the project based on what it's creating. The project name should be no more than 20 characters long.\n2. Folder Structure: "
+    "Provide the folder structure as a valid JSON object, where each key represents a folder or file, and nested keys represent subfolders. Use null values "
+    "for files. Ensure the JSON is properly formatted without any syntax errors. Please make sure all keys are enclosed in double quotes, and ensure objects "
+    "are correctly encapsulated with braces, separating items with commas as necessary.\nWrap the JSON object in <folder_structure> tags.\n3. Code Files: "
+    "For each code file, include ONLY the file name NEVER EVER USE THE FILE PATH OR ANY OTHER FORMATTING YOU ONLY USE THE FOLLOWING format "
+    "'Filename: <filename>' followed by the code block enclosed in triple backticks, with the language identifier after the opening backticks, like this:"
+    "\n\n```python\n<code>\n```"
+)
+
+# Stop reasons meaning the output token limit cut the response off (Anthropic reports max_tokens,
+# OpenAI-compatible APIs and Ollama report length)
+TRUNCATED_STOP_REASONS = ("max_tokens", "length")
+# Maximum number of continuation calls for one sub-agent or refiner response
+MAX_CONTINUATIONS = 3
+# A continuation that starts by repeating the end of the partial output is stitched without the repeat, if the
+# repeated text is at least MIN_OVERLAP_CHARS long and lies within the last MAX_OVERLAP_CHARS of the partial output
+MIN_OVERLAP_CHARS = 16
+MAX_OVERLAP_CHARS = 2000
+
+# Continues a cut-off response on providers without assistant prefill (OpenAI-compatible chat completions, Ollama
+# chat), which would otherwise start the answer over in a new assistant turn
+CONTINUE_PROMPT = (
+    "Your previous response was cut off by the output token limit. This is what you wrote so far:\n\n"
+    "<partial_response>\n{text}\n</partial_response>\n\n"
+    "Continue exactly where it stops, even in the middle of a word, line or code block. Do not repeat any of it, start over, "
+    "summarize it or add an introduction: your answer is appended to it as is."
+)
+
+class Stage:
+    """
+    One model stage of a backend.
+
+    Args:
+        provider (Provider): The provider serving the stage.
+        model (str): Model identifier.
+        title (str): Name shown on the stage's result panels, e.g. "Opus Orchestrator".
+        max_tokens (int, optional): Output token limit; omitted from the request if None.
+        system (str, optional): System prompt. For the sub-agent it precedes the list of previous tasks.
+        params: Extra generation parameters, e.g. temperature.
+    """
+    def __init__(self, provider, model, title, max_tokens=None, system=None, **params):
+        self.provider = provider
+        self.model = model
+        self.title = title
+        self.max_tokens = max_tokens
+        self.system = system
+        self.params = params
+
+    def complete(self, stage_name, messages, system=None, title=None, max_tokens=None):
+        # Every call of every backend goes through here, so this is where calls are rate limited and retried (by the
+        # provider's guard) and where metrics are recorded. The guard only wraps the request itself: a response cache
+        # hit takes no rate limit tokens or concurrency slot.
+        run_id = current_run_id.get()
+        guard = self.provider.guard
+        estimated_tokens = sum(estimate_tokens(message["content"]) for message in flatten_messages(messages, system))
+        guarded = lambda request: guard.call(
+            request,
+            estimated_tokens,
+            on_retry=lambda error: get_metrics().record_retry(run_id, stage_name, self.provider.name, self.model),
+            on_wait=lambda seconds: get_metrics().record_wait(run_id, stage_name, self.provider.name, self.model, seconds),
+        )
+        try:
+            response = self.provider.complete(
+                stage_name, self.model, messages, system=system, max_tokens=max_tokens or self.max_tokens, title=title or self.title, run=guarded, **self.params
+            )
+        except Exception:
+            get_metrics().record_error(run_id, stage_name, self.provider.name, self.model)
+            raise
+        if not response.cached:
+            guard.settle_tokens(estimated_tokens, response.input_tokens + response.cache_creation_input_tokens + response.cache_read_input_tokens + response.output_tokens)
+        get_metrics().record(run_id, stage_name, self.provider.name, self.model, response)
+        return response
+
+class Backend:
+    """
+    Everything that differs between the maestro-*.py entry points: providers, models, prompts and output conventions.
+
+    Args:
+        name (str): Display name of the backend.
+        orchestrator (Stage): Breaks the objective into sub-tasks.
+        sub_agent (Stage): Executes sub-tasks (and summarizes old results for context compaction).
+        refiner (Stage): Refines all results into the final output.
+        search (SearchClient, optional): Search client; search is unavailable if None.
+        orchestrator_prompt (str): Template with {objective}, {file_note} and {file_section} placeholders.
+        refine_prompt (str): Instructions that follow the sub-task results in the refine call.
+        sub_agent_history_header (str): Header of the previous tasks list given to the sub-agent.
+        sub_agent_history_in_prompt (bool): Put the previous tasks in the user prompt instead of the system prompt.
+        refine_with_prompts (bool): Give the refiner each orchestrator prompt along with its result.
+        file_extraction (str): "folder_structure" to follow the refine prompt's <folder_structure>/'Filename:' format,
+            "code_fences" to extract every fenced code block.
+        report_progress (bool): Send progress updates to the Flask UI.
+        max_continuations (int): Continuation calls allowed for a sub-agent or refiner response cut off by the
+            output token limit; 0 disables continuations.
+        compaction_token_budget (int): Token budget of the orchestrator history, see maestro_compaction.
+        sub_agent_cascade (list of Stage, optional): Cheaper stages tried, in order, before `sub_agent` for every
+            sub-task; they share the sub-agent's system prompt. A result failing the cheap checks of maestro_cascade,
+            or rejected by the orchestrator, goes to the next stage.
+        incremental_refine (bool): Merge every sub-agent step into a running draft of the final output with the
+            cheapest sub-agent model, in the background, and have the refiner polish the draft instead of refining
+            every result at the end; see maestro_draft.
+        sub_agent_context_token_budget (int, optional): Token budget of the previous tasks given to a sub-agent; past
+            it, only the parts most relevant to the sub-task are given, see maestro_relevance. None gives them all.
+    """
+    def __init__(self, name, orchestrator, sub_agent, refiner, search=None, orchestrator_prompt=ORCHESTRATOR_PROMPT, refine_prompt=REFINE_PROMPT,
+                 sub_agent_history_header="Previous tasks:\n", sub_agent_history_in_prompt=False, refine_with_prompts=False,
+                 file_extraction="folder_structure", report_progress=False, max_continuations=MAX_CONTINUATIONS,
+                 compaction_token_budget=COMPACTION_TOKEN_BUDGET, sub_agent_cascade=None, incremental_refine=INCREMENTAL_REFINE,
+                 sub_agent_context_token_budget=SUB_AGENT_CONTEXT_TOKEN_BUDGET):
+        self.name = name
+        self.orchestrator = orchestrator
+        self.sub_agent = sub_agent
+        self.refiner = refiner
+        self.search = search
+        self.orchestrator_prompt = orchestrator_prompt
+        self.refine_prompt = refine_prompt
+        self.sub_agent_history_header = sub_agent_history_header
+        self.sub_agent_history_in_prompt = sub_agent_history_in_prompt
+        self.refine_with_prompts = refine_with_prompts
+        self.file_extraction = file_extraction
+        self.report_progress = report_progress
+        self.max_continuations = max_continuations
+        self.compaction_token_budget = compaction_token_budget
+        # Cheapest first; the sub-agent is the last tier
+        self.sub_agent_tiers = list(sub_agent_cascade or []) + [sub_agent]
+        self.incremental_refine = incremental_refine
+        self.sub_agent_context_token_budget = sub_agent_context_token_budget
+
+def progress(backend, message, title='', footer='', color="blue"):
+    if backend.report_progress:
+        send_progress_update(message, title, footer, color=color)
+
+def print_usage(stage_name, stage, response):
+    usage = f"Input Tokens: {response.input_tokens}, Output Tokens: {response.output_tokens}"
+    if response.cache_creation_input_tokens or response.cache_read_input_tokens:
+        usage += f", Cache Write Tokens: {response.cache_creation_input_tokens}, Cache Read Tokens: {response.cache_read_input_tokens}"
+    console.print(usage)
+    total_cost = 0.0 if response.cached else calculate_subagent_cost(
+        stage.model, response.input_tokens, response.output_tokens, response.cache_creation_input_tokens, response.cache_read_input_tokens
+    )
+    if total_cost is not None:
+        console.print(f"{stage_name} Cost: ${total_cost:.4f}")
+
+def is_truncated(response):
+    return response.stop_reason in TRUNCATED_STOP_REASONS
+
+def stitch_continuation(text, continuation):
+    """
+    Appends a continuation to partial output, dropping text the model repeated from the end of the partial output.
+
+    Args:
+        text (str): The partial output sent back to the model.
+        continuation (str): The text generated to continue it.
+
+    Returns:
+        str: The stitched output.
+    """
+    stripped = continuation.lstrip()
+    if len(stripped) >= MIN_OVERLAP_CHARS:
+        tail = text[-MAX_OVERLAP_CHARS:]
+        start = tail.find(stripped[:MIN_OVERLAP_CHARS])
+        # The earliest match is the longest overlap
+        while start != -1:
+            if stripped.startswith(tail[start:]):
+                return text + stripped[len(tail) - start:]
+            start = tail.find(stripped[:MIN_OVERLAP_CHARS], start + 1)
+    return text + continuation
+
+def complete_with_continuations(backend, stage, stage_name, messages, system=None, title=None, responses=None):
+    """
+    Runs a stage call and, while the provider reports that the output token limit cut the response off, continues
+    it (up to `backend.max_continuations` times) by sending the partial output back: as the start of the assistant
+    turn where the provider supports an assistant prefill, else in a user turn asking to continue it (CONTINUE_PROMPT).
+
+    Args:
+        responses (list, optional): Every response of the call and its continuations is appended to it.
+
+    Returns:
+        str: The full response text.
+    """
+    if responses is None:
+        responses = []
+    response = stage.complete(stage_name, messages, system=system, title=title)
+    responses.append(response)
+    print_usage(stage_name, stage, response)
+    text = response.text
+    continuations = 0
+    while is_truncated(response) and continuations < backend.max_continuations:
+        continuations += 1
+        console.print(f"[bold yellow]Warning:[/bold yellow] {stage_name} output hit the token limit. Continuing the response ({continuations}/{backend.max_continuations}).")
+        progress(backend, f"Output hit the token limit. Continuing the response ({continuations}/{backend.max_continuations}).", f"{stage_name}: Generation Warning", color="yellow")
+        if stage.provider.assistant_prefill:
+            # The API rejects an assistant prefill that ends in whitespace; the model re-emits it if needed
+            text = text.rstrip()
+            continuation = {"role": "assistant", "content": text}
+        else:
+            continuation = {"role": "user", "content": CONTINUE_PROMPT.format(text=text)}
+        response = stage.complete(stage_name, messages + [continuation], system=system, title=title)
+        responses.append(response)
+        print_usage(stage_name, stage, response)
+        # A prefill continuation is new text by construction, so a line it legitimately repeats (a closing brace, a
+        # repeated statement) must be kept; only a model asked to continue in a new turn restarts with what it wrote
+        text = text + response.text if stage.provider.assistant_prefill else stitch_continuation(text, response.text)
+    if is_truncated(response) and backend.max_continuations:
+        console.print(f"[bold red]Warning:[/bold red] {stage_name} output is still truncated after {continuations} continuations.")
+        progress(backend, f"Output is still truncated after {continuations} continuations.", f"{stage_name}: Generation Warning", color="red")
+    return text
+
+def orchestrate(backend, objective, file_content=None, previous_results=None, use_search=False, parallel=False, max_parallel=MAX_PARALLEL_SUB_AGENTS, review=False):
+    """
+    Asks the orchestrator for the next sub-task(s), or for the final verdict. With `review`, the orchestrator may
+    instead reject the latest results, which came from a cheaper cascade tier.
+
+    Returns:
+        tuple: (response text, file content, search query or None)
+    """
+    stage = backend.orchestrator
+    use_search = use_search and backend.search is not None
+    console.print(f"\n[bold]Calling Orchestrator for your objective[/bold]")
+    progress(backend, f"Calling {stage.model} for your objective", "Orchestrator: Calling Model", color=color_orchestrator)
+    if file_content:
+        console.print(Panel(f"File content:\n{file_content}", title="[bold blue]File Content[/bold blue]", title_align="left", border_style="blue"))
+        progress(backend, f"File content:\n{file_content}", "Orchestrator: File Content", color="blue")
+
+    content = [
+        # The instructions, objective and file content never change within a run, and every previous result is
+        # its own block, so each call re-reads the previous call's prompt from Anthropic's prompt cache
+        cache_breakpoint({"type": "text", "text": backend.orchestrator_prompt.format(
+            objective=objective,
+            file_note=' and file content' if file_content else '',
+            file_section=f"\nFile content:\n{file_content}" if file_content else '',
+        )}),
+        *anthropic_cached_blocks("\n\nPrevious sub-task results:\n", previous_results or []),
+    ]
+    if parallel:
+        content.append({"type": "text", "text": "\n\n" + parallel_subtasks_prompt(max_parallel)})
+    if use_search:
+        content.append({"type": "text", "text": "\n\n" + SEARCH_QUERY_PROMPT})
+    if review:
+        content.append({"type": "text", "text": "\n\n" + CASCADE_REVIEW_PROMPT})
+
+    response = stage.complete("Orchestrator", [{"role": "user", "content": content}], system=stage.system, title=f"[bold green]{stage.title}[/bold green]")
+    response_text = response.text
+    print_usage("Orchestrator", stage, response)
+
+    search_query = None
+    if use_search:
+        # Extract the JSON from the response
+        json_match = re.search(r'{.*}', response_text, re.DOTALL)
+        if json_match:
+            json_string = json_match.group()
+            try:
+                search_query = json.loads(json_string)["search_query"]
+                # Start searching right away; the sub-agent picks the result up from the search cache
+                backend.search.prefetch(search_query)
+                console.print(Panel(f"Search Query: {search_query}", title="[bold blue]Search Query[/bold blue]", title_align="left", border_style="blue"))
+                progress(backend, f"Search Query: {search_query}", "Orchestrator: Search Query")
+                response_text = response_text.replace(json_string, "").strip()
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                console.print(Panel(f"Error parsing JSON: {e}", title="[bold red]JSON Parsing Error[/bold red]", title_align="left", border_style="red"))
+                console.print(Panel(f"Skipping search query extraction.", title="[bold yellow]Search Query Extraction Skipped[/bold yellow]", title_align="left", border_style="yellow"))
+                progress(backend, f"Error parsing JSON: {e}", "Orchestrator: JSON Parsing Error", color="red")
+
+    console.print(Panel(response_text, title=f"[bold green]{stage.title}[/bold green]", title_align="left", border_style="green", subtitle="Sending task to sub-agent 👇"))
+    progress(backend, response_text, "Orchestrator: Response Text", "Sending task to sub-agent", color=color_orchestrator)
+    return response_text, file_content, search_query
+
+def run_sub_agent(backend, prompt, search_query=None, previous_tasks=None, use_search=False, first_tier=0, on_escalate=None):
+    """
+    Executes one sub-task with the sub-agent, given the previous tasks and results as context.
+
+    With a sub-agent cascade, the sub-task goes to the cheapest tier from `first_tier` on, in a single call, and
+    moves on to the next tier while the result fails the cheap checks; the last tier (the sub-agent) answers with
+    continuations as usual. `on_escalate` is called with the tier and the reason whenever a tier's result fails.
+
+    Returns:
+        tuple: (the sub-agent result, the cascade attempt that produced it, or None without a cascade)
+    """
+    stage = backend.sub_agent
+    tiers = backend.sub_agent_tiers
+    if previous_tasks is None:
+        previous_tasks = []
+    progress(backend, f"Calling {tiers[first_tier].model} to complete a task:", "Sub-agent: Calling Model", color=color_subagent)
+
+    # One block per previous task, so the growing history is read from the prompt cache on the next call
+    history = anthropic_cached_blocks(
+        (stage.system or "") + backend.sub_agent_history_header,
+        [f"Task: {task['task']}\nResult: {task['result']}" for task in previous_tasks],
+        empty="",
+    )
+
+    qna_response = None
+    if search_query and use_search and backend.search is not None:
+        # Perform a QnA search based on the search query
+        qna_response = recorded_search(search_query)
+        if qna_response is None:
+            qna_response = backend.search.qna_search(search_query)
+            record('search', query=search_query, answer=qna_response)
+        console.print(f"QnA response: {qna_response}", style="yellow")
+        progress(backend, f"QnA response: {qna_response}", "Sub-agent: QnA Response", color=color_subagent)
+
+    if backend.sub_agent_history_in_prompt:
+        system = None
+        content = history + [{"type": "text", "text": f"\n\n{prompt}"}]
+    else:
+        system = history
+        content = [{"type": "text", "text": prompt}]
+    # Add search results to the messages if there are any
+    if qna_response:
+        content.append({"type": "text", "text": f"\nSearch Results:\n{qna_response}"})
+
+    messages = [{"role": "user", "content": content}]
+    attempt = None
+    for tier in range(first_tier, len(tiers)):
+        stage = tiers[tier]
+        title = f"[bold blue]{stage.title}[/bold blue]"
+        final = tier == len(tiers) - 1
+        responses = []
+        if final:
+            response_text = complete_with_continuations(backend, stage, "Sub-agent", messages, system=system, title=title, responses=responses)
+            reason = None
+        else:
+            # A lower tier gets no continuations: a cut-off result goes to the next tier instead
+            response = stage.complete("Sub-agent", messages, system=system, title=title)
+            responses.append(response)
+            print_usage("Sub-agent", stage, response)
+            response_text = response.text
+            reason = check_result(response_text, is_truncated(response))
+        if len(tiers) > 1:
+            attempt = get_cascade_stats().record(current_run_id.get(), tier, final, stage.model, responses, reason)
+        if reason is None:
+            break
+        console.print(f"[bold yellow]Cascade:[/bold yellow] {stage.model} result failed a check ({reason}), escalating to {tiers[tier + 1].model}.")
+        progress(backend, f"{stage.model} result failed a check ({reason}), escalating to {tiers[tier + 1].model}.", "Sub-agent: Cascade", color="yellow")
+        if on_escalate:
+            on_escalate(tier, reason)
+    progress(backend, response_text, "Sub-agent: Response Text", "Task completed, sending result to Orchestrator 👇", color=color_subagent)
+
+    console.print(Panel(response_text, title=f"[bold blue]{stage.title} Result[/bold blue]", title_align="left", border_style="blue", subtitle="Task completed, sending result to Orchestrator 👇"))
+    return response_text, attempt
+
+def refine(backend, objective, sub_task_results, draft=None):
+    """
+    Refines the sub-task results into the final output, or polishes the draft they were merged into.
+
+    Returns:
+        str: The refined output.
+    """
+    stage = backend.refiner
+    console.print("\nCalling Refiner to provide the refined final output for your objective:")
+    progress(backend, f"Calling {stage.model} to provide the refined final output for your objective:", "Refiner: Calling Model", color=color_refiner)
+    if draft is not None:
+        content = [
+            cache_breakpoint({"type": "text", "text": "Objective: " + objective + "\n\nDraft of the final output:\n" + draft}),
+            {"type": "text", "text": POLISH_PROMPT + backend.refine_prompt},
+        ]
+    else:
+        content = [
+            # Continuation calls resend the same blocks, so they are read from the prompt cache
+            *anthropic_cached_blocks("Objective: " + objective + "\n\nSub-task results:\n", sub_task_results, empty=""),
+            {"type": "text", "text": backend.refine_prompt},
+        ]
+
+    response_text = complete_with_continuations(
+        backend, stage, "Refiner", [{"role": "user", "content": content}], system=stage.system, title=f"[bold green]{stage.title}[/bold green]"
+    ).strip()
+
+    console.print(Panel(response_text, title=f"[bold green]{stage.title}[/bold green]", title_align="left", border_style="green"))
+    progress(backend, response_text, "Refiner: Final Output", color=color_refiner)
+    return response_text
+
+def summarize_result(backend, result):
+    # Summaries for context compaction use the sub-agent model (its cheapest cascade tier), the cheapest one in the run
+    response = backend.sub_agent_tiers[0].complete(
+        "Compaction",
+        [{"role": "user", "content": compaction_prompt(result)}],
+        title="[bold magenta]Compacting History[/bold magenta]",
+        max_tokens=SUMMARY_MAX_TOKENS,
+    )
+    return response.text
+
+def merge_into_draft(backend, objective, draft, results, replacements=()):
+    """
+    Merges new sub-task results, and results that replace earlier ones, into the draft of the final output with the
+    cheapest sub-agent model.
+
+    Returns:
+        str: The updated draft, or None if the merge was cut off or empty.
+    """
+    stage = backend.sub_agent_tiers[0]
+    response = stage.complete(
+        "Draft",
+        [{"role": "user", "content": draft_prompt(objective, draft, results, replacements)}],
+        title="[bold magenta]Updating Draft[/bold magenta]",
+        max_tokens=DRAFT_MAX_TOKENS,
+    )
+    print_usage("Draft", stage, response)
+    if is_truncated(response) or not response.text.strip():
+        console.print("[bold yellow]Warning:[/bold yellow] the merged draft was cut off, keeping the results for the next merge.")
+        return None
+    return response.text.strip()
+
+def run_maestro_loop(backend, objective, file_content=None, use_search=False, parallel=False, max_parallel=MAX_PARALLEL_SUB_AGENTS, run_id=None):
+    """
+    Runs the orchestrator / sub-agent loop until the objective is complete, then refines the results, creates the
+    project files and saves the exchange log.
+
+    Every orchestrator, search, sub-agent, summary and refiner result is appended to the run's journal (see
+    maestro_journal) as it happens; the Markdown exchange log is rendered from the journal at the end. Given the ID
+    of an interrupted run, the run is resumed: everything its journal holds is replayed instead of called again,
+    and the objective, file content, search and parallel settings (including max_parallel) of the original run are used.
+
+    Args:
+        backend (Backend): The backend to run on.
+        objective (str): The objective.
+        file_content (str, optional): Content of a file attached to the objective.
+        use_search (bool): Let the orchestrator request a search for each sub-task.
+        parallel (bool): Let the orchestrator return several independent sub-tasks per turn.
+        max_parallel (int): Maximum number of sub-agents running at the same time.
+        run_id (str, optional): ID of the run's journal. Defaults to the current run ID (the job ID in the web UI)
+            or a new ID.
+
+    Returns:
+        list of tuple: (prompt, result) for every sub-task.
+    """
+    journal = RunJournal(run_id or current_run_id.get())
+    state = journal.state
+    if journal.resumed:
+        objective = state.started['objective']
+        file_content = state.started.get('file_content')
+        use_search = state.started['use_search']
+        parallel = state.started['parallel']
+        max_parallel = state.started.get('max_parallel', max_parallel)
+        console.print(Panel(f"Resuming run {journal.run_id}: {objective}", title="[bold blue]Resuming Run[/bold blue]", title_align="left", border_style="blue"))
+        journal.append('run_resumed', backend=backend.name)
+    else:
+        journal.append('run_started', objective=objective, backend=backend.name, file_content=file_content, use_search=use_search, parallel=parallel, max_parallel=max_parallel)
+    console.print(f"Run ID: {journal.run_id} (journal: {journal.path})")
+    try:
+        # Progress events and metrics of the run are tagged with the journal's run ID
+        with journal_context(journal), run_context(journal.run_id):
+            return execute_run(backend, journal, objective, file_content, use_search, parallel, max_parallel)
+    except (Exception, KeyboardInterrupt):
+        console.print(f"[bold yellow]Run {journal.run_id} stopped.[/bold yellow] Resume it with --resume {journal.run_id}")
+        raise
+    finally:
+        journal.close()
+
+def execute_run(backend, journal, objective, file_content, use_search, parallel, max_parallel):
+    state = journal.state
+    task_exchanges = []
+    sub_agent_tasks = []
+
+    def summarize(result):
+        # Summaries are provider calls too, so they are journaled and replayed
+        key = hashlib.sha256(result.encode('utf-8')).hexdigest()
+        if key not in state.summaries:
+            state.summaries[key] = summarize_result(backend, result)
+            record('summary', key=key, text=state.summaries[key])
+        return state.summaries[key]
+
+    # Older results sent to the orchestrator are summarized once the history passes the compaction budget
+    compactor = HistoryCompactor(summarize, backend.compaction_token_budget)
+
+    def merge(step, draft_text, results, replacements, sequence):
+        # Merges are provider calls too. A journaled draft is only replayed for the same merge: the same position in
+        # the run's merges with the same results. The retry of leftover results (no sequence) always runs.
+        key = None if sequence is None else hashlib.sha256(json.dumps([sequence, results, list(replacements)]).encode('utf-8')).hexdigest()
+        if key is not None and key in state.drafts:
+            return state.drafts[key]
+        draft_text = merge_into_draft(backend, objective, draft_text, results, replacements)
+        if draft_text is not None:
+            record('draft', step=step, key=key, text=draft_text)
+        return draft_text
+
+    # Previous tasks are indexed as their results arrive, to give each sub-agent the relevant ones past the budget
+    context_index = RelevanceIndex(backend.sub_agent_context_token_budget)
+    # Each step's results are merged into the draft while the orchestrator works on the next step
+    draft = IncrementalDraft(merge) if backend.incremental_refine else None
+    # Results of the last step that came from a cheaper cascade tier, which the orchestrator may still reject:
+    # (position in task_exchanges, sub-task index, prompt, cascade attempt), and the step's execute_sub_task to rerun them
+    reviewable = []
+    escalate = None
+    step = 0
+
+    try:
+        while True:
+            step += 1
+            replayed = state.orchestrator.get(step)
+            if replayed:
+                orchestrator_result, search_query = replayed['text'], replayed['search_query']
+                console.print(Panel(orchestrator_result, title=f"[bold green]{backend.orchestrator.title} (step {step}, replayed from journal)[/bold green]", title_align="left", border_style="green"))
+            else:
+                # Call Orchestrator to break down the objective into the next sub-task or provide the final output
+                previous_results = compactor.compact([result for _, result in task_exchanges])
+                if not task_exchanges:
+                    # Pass the file content only in the first iteration if available
+                    orchestrator_result, _, search_query = orchestrate(backend, objective, file_content, previous_results, use_search, parallel, max_parallel)
+                else:
+                    orchestrator_result, _, search_query = orchestrate(backend, objective, previous_results=previous_results, use_search=use_search, parallel=parallel,
+                                                                       max_parallel=max_parallel, review=bool(reviewable))
+                if reviewable and CASCADE_REJECTED in orchestrator_result:
+                    # Rerun the last step's cheaper results on the next tier and ask the orchestrator again; the rejecting
+                    # response is not journaled, the rejections are and the escalated results replace the rejected ones
+                    console.print(f"[bold yellow]Cascade:[/bold yellow] the orchestrator rejected {len(reviewable)} result(s), escalating.")
+                    progress(backend, f"The orchestrator rejected {len(reviewable)} result(s), escalating.", "Orchestrator: Cascade", color="yellow")
+                    for _, index, _, attempt in reviewable:
+                        get_cascade_stats().reject(attempt)
+                        record('cascade_rejected', step=step - 1, index=index, tier=attempt['tier'])
+                    escalated = run_sub_tasks([(index, prompt, attempt['tier'] + 1) for _, index, prompt, attempt in reviewable], escalate, max_parallel)
+                    for (position, index, prompt, _), (result, attempt) in zip(reviewable, escalated):
+                        sub_agent_tasks[position] = {"task": prompt, "result": result}
+                        task_exchanges[position] = (prompt, result)
+                        context_index.add(position, prompt, result)
+                    if draft is not None:
+                        draft.add(step - 1, [refine_input(backend, prompt, result) for (_, _, prompt, _), (result, _) in zip(reviewable, escalated)], replaces=True)
+                    reviewable = [(position, index, prompt, attempt) for (position, index, prompt, _), (_, attempt) in zip(reviewable, escalated)
+                                  if attempt is not None and not attempt['final']]
+                    step -= 1
+                    continue
+                record('orchestrator', step=step, text=orchestrator_result, search_query=search_query)
+            reviewable = []
+
+            if TASK_COMPLETE in orchestrator_result:
+                # If the orchestrator indicates the task is complete, exit the loop
+                break
+
+            # Split the response into independent sub-tasks when running in parallel mode
+            sub_task_prompts = split_sub_tasks(orchestrator_result) if parallel else [orchestrator_result]
+            # Append file content to the prompt for the initial call to the sub-agent, if applicable
+            if file_content and not sub_agent_tasks:
+                sub_task_prompts = [f"{sub_task_prompt}\n\nFile content:\n{file_content}" for sub_task_prompt in sub_task_prompts]
+            if len(sub_task_prompts) > 1:
+                progress(backend, f"Running {len(sub_task_prompts)} independent sub-tasks with up to {max_parallel} in parallel", "Orchestrator: Parallel Sub-tasks", color=color_orchestrator)
+            # Every concurrent sub-agent sees the same previous tasks
+            previous_tasks = list(sub_agent_tasks)
+
+            def execute_sub_task(item, step=step, search_query=search_query, previous_tasks=previous_tasks):
+                index, prompt, first_tier = item
+                last_tier = len(backend.sub_agent_tiers) - 1
+                # An escalated sub-task replaces its journaled result
+                if first_tier == 0 and (step, index) in state.sub_agents:
+                    tier = state.sub_agent_tiers.get((step, index))
+                    # A replayed result of a cheaper tier can still be rejected by the orchestrator
+                    return state.sub_agents[(step, index)], {'tier': tier, 'final': False} if tier is not None and tier < last_tier else None
+                # Tiers the journal says already failed this sub-task are not paid for again
+                first_tier = min(max(first_tier, state.escalations.get((step, index), 0)), last_tier)
+                result, attempt = run_sub_agent(backend, prompt, search_query, context_index.select(prompt, previous_tasks), use_search, first_tier,
+                                                on_escalate=lambda tier, reason: record('cascade_escalated', step=step, index=index, tier=tier, reason=reason))
+                tier = attempt['tier'] if attempt else last_tier
+                record('sub_agent', step=step, index=index, prompt=prompt, result=result, model=backend.sub_agent_tiers[tier].model, tier=tier)
+                return result, attempt
+
+            escalate = execute_sub_task
+            sub_task_results = run_sub_tasks([(index, prompt, 0) for index, prompt in enumerate(sub_task_prompts)], execute_sub_task, max_parallel)
+            for index, (sub_task_prompt, (sub_task_result, attempt)) in enumerate(zip(sub_task_prompts, sub_task_results)):
+                if attempt is not None and not attempt['final']:
+                    reviewable.append((len(task_exchanges), index, sub_task_prompt, attempt))
+                # Log the task and its result for future reference
+                context_index.add(len(sub_agent_tasks), sub_task_prompt, sub_task_result)
+                sub_agent_tasks.append({"task": sub_task_prompt, "result": sub_task_result})
+                # Record the exchange for processing and output generation
+                task_exchanges.append((sub_task_prompt, sub_task_result))
+            if draft is not None:
+                draft.add(step, [refine_input(backend, prompt, result) for prompt, (result, _) in zip(sub_task_prompts, sub_task_results)])
+
+        # Call the refiner to review and refine the sub-task results
+        sub_task_results = [refine_input(backend, prompt, result) for prompt, result in task_exchanges]
+        draft_text = None
+        if state.refined is not None:
+            refined_output = state.refined
+            console.print(Panel(refined_output, title=f"[bold green]{backend.refiner.title} (replayed from journal)[/bold green]", title_align="left", border_style="green"))
+        else:
+            draft_text = draft.result() if draft is not None else None
+            refined_output = refine(backend, objective, sub_task_results, draft_text)
+            record('refine', text=refined_output)
+    finally:
+        # Also when the run fails: merges still scheduled must not call the provider after it
+        if draft is not None:
+            draft.close()
+
+    # Create the .md filename
+    sanitized_objective = re.sub(r'\W+', '_', objective)
+    timestamp = datetime.now().strftime("%H-%M-%S")
+
+    # Truncate the sanitized_objective to a maximum of 25 characters
+    max_length = 25
+    truncated_objective = sanitized_objective[:max_length] if len(sanitized_objective) > max_length else sanitized_objective
+    # Runs finishing in the same second get numbered logs instead of overwriting each other; the name is claimed by
+    # creating the file exclusively, so concurrent runs (batch workers) cannot both pick it
+    counter = 0
+    while True:
+        filename = maestro_utils.output_path(f"{timestamp}_{truncated_objective}{f'_{counter}' if counter else ''}.md")
+        try:
+            open(filename, 'x').close()
+            break
+        except FileExistsError:
+            counter += 1
+
+    # Create the project folder and code files from the refined output
+    if backend.file_extraction == "code_fences":
+        project_name = maestro_utils.extract_project_name(refined_output, sanitized_objective)
+        code_blocks = maestro_utils.extract_and_write_project_files(refined_output, project_name, start_marker=None)
+    else:
+        code_blocks = maestro_utils.write_project_from_folder_structure(refined_output, sanitized_objective)
+    for code_filename, code_content in code_blocks:
+        progress(backend, code_content, f"File Creation: {code_filename}", color="darkolivegreen")
+    # Code blocks extracted from fences are also appended to the exchange log, as they always were
+    record('files', paths=[code_filename for code_filename, _ in code_blocks],
+           **({'blocks': [list(block) for block in code_blocks]} if backend.file_extraction == "code_fences" else {}))
+
+    console.print(f"\n[bold]Refined Final output:[/bold]\n{refined_output}")
+    print_run_metrics(journal.run_id)
+    if len(backend.sub_agent_tiers) > 1:
+        print_cascade_summary(journal.run_id, [stage.model for stage in backend.sub_agent_tiers])
+    compactor.print_stats()
+    context_index.print_stats()
+    if draft is not None:
+        draft.print_stats(sub_task_results, draft_text if draft_text is not None else draft.draft)
+    if use_search and backend.search:
+        backend.search.print_stats(journal.run_id)
+    progress(backend, refined_output, "Refined Final Output", color="darkslategrey")
+
+    write_report(journal.events(), filename)
+    record('run_finished', report=os.path.abspath(filename))
+    print(f"\nFull exchange log saved to {filename}")
+    progress(backend, f"\nFull exchange log saved to {filename}")
+    return task_exchanges
+
+def refine_input(backend, prompt, result):
+    # What the refiner gets for one sub-task
+    if backend.refine_with_prompts:
+        return f"Orchestrator Prompt: {prompt}\nSub-agent Result: {result}"
+    return result
+
+def as_bool(value):
+    # Flask form values and CLI flags arrive as strings such as 'True'/'False'
+    return str(value).lower() in ('true', 'y', 'yes', '1')
+
+def resolve_file_content(want_file_path=None, file_path=""):
+    """
+    Reads the file attached to an objective, asking the user interactively for anything not given.
+
+    Args:
+        want_file_path (bool or str, optional): Whether a file should be attached; asked if None.
+        file_path (str): Path of the file; asked if empty.
+
+    Returns:
+        str: The file content, or None.
+    """
+    if want_file_path is None:
+        provide_file = input("Do you want to provide a file path? (y/n): ").lower() == 'y'
+    else:
+        provide_file = as_bool(want_file_path)
+    if not provide_file:
+        return None
+    if not file_path:
+        file_path = input("Please enter the file path: ")
+    file_path = os.path.expanduser(file_path)
+    if not os.path.exists(file_path):
+        console.print(Panel(f"File not found: {file_path}. Proceeding without file content.", title="[bold red]File Error[/bold red]", title_align="left", border_style="red"))
+        return None
+    return maestro_utils.read_file(file_path)
+
+def resolve_use_search(want_search=None):
+    """
+    Returns whether to use search, asking the user interactively if `want_search` is None.
+    """
+    if want_search is None:
+        return input("Do you want to use search? (y/n): ").lower() == 'y'
+    return as_bool(want_search)
+
+def default_ui_elements(search=True):
+    """
+    UI elements for the run options understood by every backend's run_maestro.
+    """
+    elements = [{'type': 'checkbox', 'label': 'Use Search?', 'id': 'want_search'}] if search else []
+    return elements + [
+        {'type': 'checkbox', 'label': 'Do you want to provide a file path?', 'id': 'want_file_path'},
+        {'type': 'textbox', 'label': 'File Path:', 'id': 'file_path'},
+        {'type': 'checkbox', 'label': 'Run independent sub-tasks in parallel?', 'id': 'want_parallel'},
+        {'type': 'textbox', 'label': 'Max parallel sub-agents:', 'id': 'max_parallel'},
+    ]
+
+def default_required_args(search=True):
+    """
+    Arguments of the run options understood by every backend's run_maestro.
+    """
+    args = [{'name': 'objective', 'type': 'str', 'default': ''}]
+    if search:
+        args.append({'name': 'want_search', 'type': 'bool', 'default': False})
+    return args + [
+        {'name': 'want_file_path', 'type': 'bool', 'default': False},
+        {'name': 'file_path', 'type': 'str', 'default': ''},
+        {'name': 'want_parallel', 'type': 'bool', 'default': False},
+        {'name': 'max_parallel', 'type': 'int', 'default': MAX_PARALLEL_SUB_AGENTS},
+    ]
+
+def main(run_maestro, search=True, file_path_in_objective=False, objective_prompt="Please enter your objective: "):
+    """
+    Command line entry point shared by the maestro-*.py scripts.
+
+    Args:
+        run_maestro (callable): The backend's run_maestro function.
+        search (bool): Whether the backend supports search.
+        file_path_in_objective (bool): Read a file path typed at the end of the objective instead of asking for one.
+        objective_prompt (str): Prompt used to ask for the objective if it is not given on the command line.
+    """
+    parser = argparse.ArgumentParser(description="Run Maestro with a given objective.")
+    parser.add_argument("--objective", type=str, default='', help="The primary objective to pass to the LLM")
+    if search:
+        parser.add_argument("--want_search", type=str, default=None, help="Whether to use search (true/false)")
+    parser.add_argument("--want_file_path", type=str, default=None, help="Whether to attach a file (true/false)")
+    parser.add_argument("--file_path", type=str, default='', help="The path to the file")
+    parser.add_argument("--want_parallel", type=str, default=None, help="Whether to run independent sub-tasks in parallel (true/false)")
+    parser.add_argument("--max_parallel", type=int, default=MAX_PARALLEL_SUB_AGENTS, help="Maximum number of sub-agents running at the same time")
+    parser.add_argument("--resume", type=str, default=None, help="ID of an interrupted run to resume from its journal")
+    args = parser.parse_args()
+
+    # Collecting additional arguments
+    additional_args = {k: v for k, v in vars(args).items() if k not in ('objective', 'resume') and v is not None}
+    if args.resume:
+        started = run_started_event(args.resume)
+        if started is None:
+            parser.error(f"No journal for run {args.resume}")
+        # The objective, file content and run options come from the journal, so nothing is asked interactively
+        additional_args.update(want_file_path=False, run_id=args.resume)
+        if search:
+            additional_args['want_search'] = started['use_search']
+        return run_maestro(started['objective'], **additional_args)
+    objective = args.objective or input(objective_prompt)
+    if file_path_in_objective and not args.file_path:
+        objective, file_path = maestro_utils.split_file_path_from_objective(objective)
+        additional_args['want_file_path'] = file_path is not None
+        additional_args['file_path'] = file_path or ''
+    return run_maestro(objective, **additional_args)
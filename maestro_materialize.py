@@ -0,0 +1,119 @@
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from rich.console import Console
+from rich.panel import Panel
+
+console = Console()
+
+# Files written at the same time
+WRITE_WORKERS = 8
+
+# Renamed temporary files would keep their private mode, so they get the mode a plain open() would have given
+# them. The umask can only be read by setting it, which is done once at import rather than from writer threads.
+UMASK = os.umask(0)
+os.umask(UMASK)
+FILE_MODE = 0o666 & ~UMASK
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def file_hash(path):
+    """
+    Returns the SHA-256 of the file at `path`, or None if it does not exist.
+    """
+    try:
+        with open(path, 'rb') as file:
+            return content_hash(file.read())
+    except FileNotFoundError:
+        return None
+
+class ProjectWriter:
+    """
+    Writes the files of a generated project on a thread pool.
+
+    Each file is written atomically (to a temporary file in the same folder, then renamed over the target), so an
+    interrupted run never leaves a half-written file behind. A file whose content hash matches what is already on
+    disk is left untouched, so re-running an objective into an existing project folder only rewrites changed files.
+
+    Args:
+        workers (int): Number of writer threads.
+    """
+    def __init__(self, workers=WRITE_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="maestro-write")
+        self.futures = []
+        self.created_dirs = set()
+        self.dirs_lock = threading.Lock()
+
+    def make_dirs(self, directory):
+        with self.dirs_lock:
+            if directory in self.created_dirs:
+                return
+            os.makedirs(directory, exist_ok=True)
+            self.created_dirs.add(directory)
+
+    def write(self, path, content):
+        """
+        Queues `content` to be written to `path`.
+        """
+        self.futures.append((path, self.executor.submit(self.write_file, path, content)))
+
+    def write_file(self, path, content):
+        data = content.encode('utf-8')
+        if file_hash(path) == content_hash(data):
+            return 'unchanged'
+        directory = os.path.dirname(path) or '.'
+        self.make_dirs(directory)
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            os.chmod(temp_path, FILE_MODE)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return 'written'
+
+    def finish(self):
+        """
+        Waits for every queued write and prints a summary.
+
+        Returns:
+            dict: 'written' and 'unchanged' lists of paths, and 'failed', a list of (path, error message).
+        """
+        report = {'written': [], 'unchanged': [], 'failed': []}
+        for path, future in self.futures:
+            try:
+                report[future.result()].append(path)
+            except Exception as e:
+                report['failed'].append((path, str(e)))
+        self.futures = []
+        self.executor.shutdown()
+        print_report(report)
+        return report
+
+def print_report(report):
+    lines = [f"{len(report['written'])} written, {len(report['unchanged'])} unchanged (skipped), {len(report['failed'])} failed"]
+    lines.extend(f"Written: [bold]{path}[/bold]" for path in report['written'])
+    lines.extend(f"[red]Failed: [bold]{path}[/bold] ({error})[/red]" for path, error in report['failed'])
+    border_style = "red" if report['failed'] else "green"
+    console.print(Panel("\n".join(lines), title="[bold green]Project Files[/bold green]", title_align="left", border_style=border_style))
+
+def materialize(files, workers=WRITE_WORKERS):
+    """
+    Writes (path, content) pairs in parallel, atomically, skipping files whose content is unchanged.
+
+    Args:
+        files (iterable of tuple): (path, content) for every file.
+        workers (int): Number of writer threads.
+
+    Returns:
+        dict: 'written' and 'unchanged' lists of paths, and 'failed', a list of (path, error message).
+    """
+    writer = ProjectWriter(workers)
+    for path, content in files:
+        writer.write(path, content)
+    return writer.finish()
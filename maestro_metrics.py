@@ -0,0 +1,281 @@
+import threading
+from collections import OrderedDict
+from rich.console import Console
+from rich.table import Table
+from maestro_cache import get_response_cache
+from maestro_llm import MIN_REPORTED_LOAD_SECONDS, calculate_subagent_cost
+
+console = Console()
+
+# Runs whose per-stage aggregates are kept in memory; older runs only remain in the process-wide totals
+MAX_RUNS_IN_MEMORY = 50
+# Waits for rate limits shorter than this are not mentioned in a run's metrics
+MIN_REPORTED_WAIT_SECONDS = 0.1
+# Upper bounds in seconds of the call latency histogram exported to Prometheus
+LATENCY_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+class CallStats:
+    """
+    Aggregated metrics of a group of model calls (one stage of a run, or one stage/provider/model in the process).
+    """
+    def __init__(self, buckets=None):
+        self.calls = 0
+        self.cached_calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.streamed_calls = 0
+        self.unpriced_calls = 0
+        self.latency_seconds = 0.0
+        self.time_to_first_token_seconds = 0.0
+        self.generation_seconds = 0.0
+        self.load_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.cost = 0.0
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets) if buckets else None
+
+    def add(self, response, cost):
+        # A response cache hit made no provider call, so it is only counted as cached
+        if response.cached:
+            self.cached_calls += 1
+            return
+        self.calls += 1
+        self.latency_seconds += response.duration
+        self.input_tokens += response.input_tokens
+        self.output_tokens += response.output_tokens
+        self.cache_read_input_tokens += response.cache_read_input_tokens
+        self.cache_creation_input_tokens += response.cache_creation_input_tokens
+        self.generation_seconds += response.generation_time
+        self.load_seconds += response.load_time
+        if response.time_to_first_token is not None:
+            self.streamed_calls += 1
+            self.time_to_first_token_seconds += response.time_to_first_token
+        if cost is None:
+            self.unpriced_calls += 1
+        else:
+            self.cost += cost
+        if self.buckets:
+            for index, bound in enumerate(self.buckets):
+                if response.duration <= bound:
+                    self.bucket_counts[index] += 1
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'cached_calls': self.cached_calls,
+            'errors': self.errors,
+            'retries': self.retries,
+            'latency_seconds': self.latency_seconds,
+            'average_latency_seconds': self.latency_seconds / self.calls if self.calls else 0.0,
+            'average_time_to_first_token_seconds': self.time_to_first_token_seconds / self.streamed_calls if self.streamed_calls else None,
+            'load_seconds': self.load_seconds,
+            'wait_seconds': self.wait_seconds,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'cache_read_input_tokens': self.cache_read_input_tokens,
+            'cache_creation_input_tokens': self.cache_creation_input_tokens,
+            'tokens_per_second': self.output_tokens / self.generation_seconds if self.generation_seconds > 0 else 0.0,
+            'cost': self.cost,
+            'unpriced_calls': self.unpriced_calls,
+        }
+
+class MetricsRegistry:
+    """
+    Records every model call of every backend: latency, time to first token, input/output/cached tokens,
+    tokens/sec and cost, aggregated per stage of each run and per stage/provider/model for the whole process.
+
+    Args:
+        max_runs (int): Runs whose aggregates are kept in memory.
+    """
+    def __init__(self, max_runs=MAX_RUNS_IN_MEMORY):
+        self.max_runs = max_runs
+        self.totals = {}
+        self.runs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def run_stats(self, run_id, stage):
+        # Must be called with the lock held
+        stages = self.runs.get(run_id)
+        if stages is None:
+            stages = self.runs[run_id] = {}
+            while len(self.runs) > self.max_runs:
+                self.runs.popitem(last=False)
+        return stages.setdefault(stage, CallStats())
+
+    def total_stats(self, stage, provider, model):
+        # Must be called with the lock held
+        return self.totals.setdefault((stage, provider, model), CallStats(LATENCY_BUCKETS))
+
+    def record(self, run_id, stage, provider, model, response):
+        """
+        Records a finished call.
+
+        Args:
+            run_id (str, optional): ID of the run the call belongs to.
+            stage (str): Stage name, e.g. "Orchestrator".
+            provider (str): Provider name, e.g. "anthropic".
+            model (str): Model identifier.
+            response (LLMResponse): The response.
+        """
+        cost = 0.0 if response.cached else calculate_subagent_cost(
+            model, response.input_tokens, response.output_tokens, response.cache_creation_input_tokens, response.cache_read_input_tokens
+        )
+        with self.lock:
+            self.total_stats(stage, provider, model).add(response, cost)
+            if run_id:
+                self.run_stats(run_id, stage).add(response, cost)
+
+    def record_error(self, run_id, stage, provider, model):
+        """
+        Records a call that raised an exception.
+        """
+        with self.lock:
+            self.total_stats(stage, provider, model).errors += 1
+            if run_id:
+                self.run_stats(run_id, stage).errors += 1
+
+    def record_retry(self, run_id, stage, provider, model):
+        """
+        Records a failed attempt of a call that is being retried.
+        """
+        with self.lock:
+            self.total_stats(stage, provider, model).retries += 1
+            if run_id:
+                self.run_stats(run_id, stage).retries += 1
+
+    def record_wait(self, run_id, stage, provider, model, seconds):
+        """
+        Records the time an attempt of a call waited for the provider's rate limits and concurrency limit.
+        """
+        with self.lock:
+            self.total_stats(stage, provider, model).wait_seconds += seconds
+            if run_id:
+                self.run_stats(run_id, stage).wait_seconds += seconds
+
+    def run_summary(self, run_id):
+        """
+        Returns the per-stage aggregates of a run.
+
+        Returns:
+            dict: Stage name to aggregate, or an empty dict for an unknown run.
+        """
+        with self.lock:
+            return {stage: stats.to_dict() for stage, stats in self.runs.get(run_id, {}).items()}
+
+    def to_dict(self):
+        """
+        Returns every aggregate as JSON-serializable data: process-wide totals and the per-run, per-stage aggregates.
+        """
+        with self.lock:
+            return {
+                'totals': [{'stage': stage, 'provider': provider, 'model': model, **stats.to_dict()} for (stage, provider, model), stats in self.totals.items()],
+                'runs': {run_id: {stage: stats.to_dict() for stage, stats in stages.items()} for run_id, stages in self.runs.items()},
+            }
+
+    def to_prometheus(self):
+        """
+        Renders the process-wide totals in the Prometheus text exposition format.
+        """
+        metrics = [
+            ('maestro_llm_calls_total', 'counter', 'Model calls made to providers (response cache hits excluded)', lambda stats: stats.calls),
+            ('maestro_llm_cached_calls_total', 'counter', 'Model calls served from the response cache', lambda stats: stats.cached_calls),
+            ('maestro_llm_errors_total', 'counter', 'Model calls that failed', lambda stats: stats.errors),
+            ('maestro_llm_retries_total', 'counter', 'Failed attempts of model calls that were retried', lambda stats: stats.retries),
+            ('maestro_llm_input_tokens_total', 'counter', 'Uncached prompt tokens', lambda stats: stats.input_tokens),
+            ('maestro_llm_output_tokens_total', 'counter', 'Completion tokens', lambda stats: stats.output_tokens),
+            ('maestro_llm_cache_read_tokens_total', 'counter', 'Prompt tokens read from the provider prompt cache', lambda stats: stats.cache_read_input_tokens),
+            ('maestro_llm_cache_write_tokens_total', 'counter', 'Prompt tokens written to the provider prompt cache', lambda stats: stats.cache_creation_input_tokens),
+            ('maestro_llm_generation_seconds_total', 'counter', 'Seconds spent generating output tokens', lambda stats: stats.generation_seconds),
+            ('maestro_llm_load_seconds_total', 'counter', 'Seconds the server spent loading models before calls', lambda stats: stats.load_seconds),
+            ('maestro_llm_wait_seconds_total', 'counter', 'Seconds calls waited for rate limits and the concurrency limit', lambda stats: stats.wait_seconds),
+            ('maestro_llm_time_to_first_token_seconds_total', 'counter', 'Summed time to first token of streamed calls', lambda stats: stats.time_to_first_token_seconds),
+            ('maestro_llm_streamed_calls_total', 'counter', 'Streamed model calls', lambda stats: stats.streamed_calls),
+            ('maestro_llm_cost_dollars_total', 'counter', 'Cost of priced model calls in dollars', lambda stats: stats.cost),
+        ]
+        with self.lock:
+            totals = list(self.totals.items())
+            lines = []
+            for name, metric_type, help_text, value in metrics:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for key, stats in totals:
+                    lines.append(f"{name}{{{prometheus_labels(key)}}} {value(stats)}")
+            lines.append("# HELP maestro_llm_latency_seconds Model call latency")
+            lines.append("# TYPE maestro_llm_latency_seconds histogram")
+            for key, stats in totals:
+                labels = prometheus_labels(key)
+                for bound, count in zip(stats.buckets, stats.bucket_counts):
+                    lines.append(f'maestro_llm_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'maestro_llm_latency_seconds_bucket{{{labels},le="+Inf"}} {stats.calls}')
+                lines.append(f"maestro_llm_latency_seconds_sum{{{labels}}} {stats.latency_seconds}")
+                lines.append(f"maestro_llm_latency_seconds_count{{{labels}}} {stats.calls}")
+        return "\n".join(lines) + "\n"
+
+def prometheus_labels(key):
+    stage, provider, model = key
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return f'stage="{escape(stage)}",provider="{escape(provider)}",model="{escape(model)}"'
+
+def print_run_metrics(run_id):
+    """
+    Prints the per-stage metrics of a run, and the response cache hit rate if the cache is enabled.
+    """
+    summary = get_metrics().run_summary(run_id)
+    if summary:
+        table = Table(title="Call Stats", title_justify="left", border_style="cyan")
+        for column in ("Stage", "Calls", "Latency", "TTFT", "In/Out", "Cached", "Tok/s", "Cost"):
+            table.add_column(column, justify="left" if column == "Stage" else "right")
+        totals = {'calls': 0, 'cached_calls': 0, 'errors': 0, 'retries': 0, 'input_tokens': 0, 'output_tokens': 0, 'cache_read_input_tokens': 0, 'cost': 0.0, 'unpriced_calls': 0}
+        for stage, stats in summary.items():
+            table.add_row(*format_row(stage, stats))
+            for key in totals:
+                totals[key] += stats[key]
+        table.add_row("[bold]Run[/bold]", format_calls(totals['calls'], totals['errors'], totals['retries'], totals['cached_calls']), "", "", f"{totals['input_tokens']}/{totals['output_tokens']}",
+                      str(totals['cache_read_input_tokens']), "", format_cost(totals['cost'], totals['unpriced_calls'], totals['calls']))
+        console.print(table)
+        loads = {stage: stats['load_seconds'] for stage, stats in summary.items() if stats['load_seconds'] >= MIN_REPORTED_LOAD_SECONDS}
+        if loads:
+            # Part of the latency and TTFT above, but not of Tok/s
+            console.print("Model load time: " + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in loads.items()))
+        waits = {stage: stats['wait_seconds'] for stage, stats in summary.items() if stats['wait_seconds'] >= MIN_REPORTED_WAIT_SECONDS}
+        if waits:
+            # Before the calls, so not part of the latency above
+            console.print("Rate limit wait: " + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in waits.items()))
+    cache = get_response_cache()
+    if cache is not None:
+        cache_stats = cache.stats()
+        console.print(f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%} hit rate), {cache_stats['entries']} entries, {cache_stats['bytes'] / 1_000_000:.1f} MB")
+
+def format_row(stage, stats):
+    ttft = stats['average_time_to_first_token_seconds']
+    return (
+        stage, format_calls(stats['calls'], stats['errors'], stats['retries'], stats['cached_calls']), f"{stats['average_latency_seconds']:.2f}s", f"{ttft:.2f}s" if ttft is not None else "n/a",
+        f"{stats['input_tokens']}/{stats['output_tokens']}", str(stats['cache_read_input_tokens']), f"{stats['tokens_per_second']:.1f}",
+        format_cost(stats['cost'], stats['unpriced_calls'], stats['calls']),
+    )
+
+def format_calls(calls, errors, retries=0, cached=0):
+    notes = [f"{count} {label}" for count, label in ((cached, "cached"), (retries, "retried"), (errors, "failed")) if count]
+    return f"{calls} ({', '.join(notes)})" if notes else str(calls)
+
+def format_cost(cost, unpriced_calls, calls):
+    if calls and unpriced_calls == calls:
+        return "n/a"
+    return f"${cost:.4f}" + ("*" if unpriced_calls else "")
+
+metrics = None
+metrics_lock = threading.Lock()
+
+def get_metrics():
+    """
+    Returns the process-wide metrics registry.
+    """
+    global metrics
+    with metrics_lock:
+        if metrics is None:
+            metrics = MetricsRegistry()
+    return metrics
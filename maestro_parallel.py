@@ -0,0 +1,64 @@
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# Default number of sub-agents allowed to run at the same time
+MAX_PARALLEL_SUB_AGENTS = 4
+
+subtask_pattern = re.compile(r'<subtask>(.*?)</subtask>', re.DOTALL | re.IGNORECASE)
+
+def parallel_subtasks_prompt(max_subtasks=MAX_PARALLEL_SUB_AGENTS):
+    """
+    Builds the orchestrator instruction that allows it to return several independent sub-tasks in one turn.
+
+    Args:
+        max_subtasks (int): Maximum number of sub-tasks the orchestrator may return at once.
+
+    Returns:
+        str: Instruction text to append to the orchestrator prompt.
+    """
+    return (
+        f"If the remaining work splits into parts that do not depend on each other (for example backend, frontend and tests), "
+        f"you may return up to {max_subtasks} independent sub-tasks in this turn. Wrap each sub-task prompt in its own "
+        "<subtask></subtask> tags and make every prompt self-contained, because the subagents run at the same time and "
+        "cannot see each other's results. If the parts depend on each other, return a single sub-task prompt as usual."
+    )
+
+def split_sub_tasks(response_text):
+    """
+    Splits an orchestrator response into independent sub-task prompts.
+
+    Args:
+        response_text (str): The orchestrator response.
+
+    Returns:
+        list of str: One prompt per <subtask> block, in the order they appear. A response without
+        <subtask> blocks is returned unchanged as a single sub-task.
+    """
+    sub_tasks = [task.strip() for task in subtask_pattern.findall(response_text) if task.strip()]
+    return sub_tasks or [response_text]
+
+def run_sub_tasks(sub_tasks, run_sub_task, max_workers=MAX_PARALLEL_SUB_AGENTS):
+    """
+    Runs sub-tasks concurrently with a bounded number of workers.
+
+    Results are returned in the same order as `sub_tasks`, regardless of which call finishes first,
+    so merging them into `task_exchanges` is deterministic.
+
+    Args:
+        sub_tasks (list of tuple): (index, prompt, first cascade tier) of each sub-task to execute; the index is the
+            sub-task's position in its step, which stays the same when a rejected result is rerun on a higher tier.
+        run_sub_task (callable): Called with one of the tuples, returns the sub-agent's (result, cascade attempt).
+        max_workers (int): Maximum number of sub-agent calls in flight at once.
+
+    Returns:
+        list: The result of `run_sub_task` for each sub-task, in submission order.
+    """
+    max_workers = max(1, int(max_workers))
+    if len(sub_tasks) <= 1 or max_workers == 1:
+        return [run_sub_task(task) for task in sub_tasks]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(sub_tasks)), thread_name_prefix="maestro-subagent") as executor:
+        # Each sub-task runs in a copy of the caller's context, so context variables such as the run ID carry over
+        futures = [executor.submit(contextvars.copy_context().run, run_sub_task, task) for task in sub_tasks]
+        return [future.result() for future in futures]
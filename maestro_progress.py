@@ -0,0 +1,166 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from maestro_journal import drop_partial_line
+
+# Events of a run kept in memory; older ones are read back from the run's file
+MAX_EVENTS_PER_RUN = 500
+# Runs kept in memory; the least recently updated ones only live on disk
+MAX_RUNS_IN_MEMORY = 20
+# Default page size of progress queries
+PAGE_SIZE = 100
+
+PROGRESS_DIR = os.path.join(os.path.expanduser("~"), ".cache", "maestro", "progress")
+
+# Run ID of progress events published outside of any run
+GLOBAL_RUN_ID = 'global'
+
+class RunLog:
+    """
+    Progress events of one run: a ring buffer of the most recent events plus the total count.
+
+    Args:
+        max_events (int): Size of the ring buffer.
+    """
+    def __init__(self, max_events=MAX_EVENTS_PER_RUN, total=0):
+        self.events = deque(maxlen=max_events)
+        self.total = total
+
+    @property
+    def first_seq(self):
+        # Sequence number of the oldest event still in memory
+        return self.total - len(self.events)
+
+class ProgressStore:
+    """
+    Stores progress events per run ID in bounded memory and pages through them by offset.
+
+    Every event gets a per-run sequence number `seq`, starting at 0. Events are appended to a JSONL file per
+    run as they arrive, so runs evicted from memory, and events that fell out of a run's ring buffer, are still
+    served from disk.
+
+    Args:
+        directory (str): Directory of the per-run JSONL files; None keeps events in memory only.
+        max_events_per_run (int): Events of a run kept in memory.
+        max_runs (int): Runs kept in memory.
+    """
+    def __init__(self, directory=PROGRESS_DIR, max_events_per_run=MAX_EVENTS_PER_RUN, max_runs=MAX_RUNS_IN_MEMORY):
+        self.directory = directory
+        self.max_events_per_run = max_events_per_run
+        self.max_runs = max_runs
+        self.runs = OrderedDict()
+        self.lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, run_id):
+        return os.path.join(self.directory, re.sub(r'[^\w-]', '_', run_id) + '.jsonl')
+
+    def lines(self, path):
+        # Complete lines only: files are read without the lock, so the last line may still be being written
+        if not os.path.exists(path):
+            return
+        with open(path, 'r') as file:
+            for line in file:
+                if not line.endswith('\n'):
+                    return
+                yield line
+
+    def read_file(self, run_id, offset=0, limit=None):
+        if not self.directory:
+            return []
+        events = []
+        for index, line in enumerate(self.lines(self.path_for(run_id))):
+            if index < offset:
+                continue
+            if limit is not None and len(events) >= limit:
+                break
+            events.append(json.loads(line))
+        return events
+
+    def count_file(self, run_id):
+        if not self.directory:
+            return 0
+        return sum(1 for _ in self.lines(self.path_for(run_id)))
+
+    def file_run_id(self, name):
+        # File names are sanitized run IDs; the events themselves hold the original ID
+        for line in self.lines(os.path.join(self.directory, name)):
+            return json.loads(line).get('run_id') or name[:-len('.jsonl')]
+        return name[:-len('.jsonl')]
+
+    def run_log(self, run_id):
+        # Must be called with the lock held
+        log = self.runs.get(run_id)
+        if log is None:
+            # A run evicted earlier (or from before a restart) continues its numbering from its file, less a line a
+            # crash cut off, which the next append would otherwise be glued to
+            if self.directory:
+                drop_partial_line(self.path_for(run_id))
+            log = RunLog(self.max_events_per_run, self.count_file(run_id))
+            self.runs[run_id] = log
+        self.runs.move_to_end(run_id)
+        while len(self.runs) > self.max_runs:
+            self.runs.popitem(last=False)
+        return log
+
+    def append(self, events):
+        """
+        Stores a batch of events, grouped by their 'run_id' key.
+
+        Returns:
+            list of dict: The stored events, each with its 'run_id' and 'seq' set.
+        """
+        stored = []
+        with self.lock:
+            by_run = OrderedDict()
+            for event in events:
+                event = dict(event)
+                event['run_id'] = event.get('run_id') or GLOBAL_RUN_ID
+                log = self.run_log(event['run_id'])
+                event['seq'] = log.total
+                log.total += 1
+                log.events.append(event)
+                by_run.setdefault(event['run_id'], []).append(event)
+                stored.append(event)
+            if self.directory:
+                for run_id, run_events in by_run.items():
+                    with open(self.path_for(run_id), 'a') as file:
+                        file.writelines(json.dumps(event) + '\n' for event in run_events)
+        return stored
+
+    def page(self, run_id, offset=0, limit=PAGE_SIZE):
+        """
+        Returns up to `limit` events of `run_id`, starting at sequence number `offset`.
+
+        Returns:
+            dict: run_id, offset, events, next_offset and total.
+        """
+        offset = max(int(offset), 0)
+        with self.lock:
+            log = self.runs.get(run_id)
+            if log is not None:
+                total = log.total
+                if offset >= log.first_seq:
+                    start = offset - log.first_seq
+                    events = list(log.events)[start:start + limit]
+                    return {'run_id': run_id, 'offset': offset, 'events': events, 'next_offset': offset + len(events), 'total': total}
+        events = self.read_file(run_id, offset, limit)
+        if log is None:
+            total = self.count_file(run_id)
+        return {'run_id': run_id, 'offset': offset, 'events': events, 'next_offset': offset + len(events), 'total': total}
+
+    def run_ids(self):
+        """
+        Returns the IDs of all stored runs, most recently updated first.
+        """
+        with self.lock:
+            in_memory = list(reversed(self.runs.keys()))
+        on_disk = []
+        if self.directory:
+            files = [name for name in os.listdir(self.directory) if name.endswith('.jsonl')]
+            files.sort(key=lambda name: os.path.getmtime(os.path.join(self.directory, name)), reverse=True)
+            on_disk = [self.file_run_id(name) for name in files]
+        return in_memory + [run_id for run_id in on_disk if run_id not in in_memory]
@@ -0,0 +1,555 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from rich.console import Console
+from rich.panel import Panel
+from maestro_events import current_run_id
+from maestro_llm import call_anthropic, call_chat_completion, call_ollama
+from maestro_ratelimit import ProviderGuard
+
+# Per-provider request timeouts in seconds (local servers get more room for slow model loads)
+PROVIDER_TIMEOUTS = {
+    'anthropic': 600,
+    'openai': 600,
+    'groq': 120,
+    'lmstudio': 900,
+    'ollama': 900,
+    'litellm': 600,
+    'tavily': 60,
+}
+CONNECT_TIMEOUT = 10
+
+# Connection pool limits shared by every long-lived HTTP client
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 60
+
+# Search results are reused for this long, keyed on the normalized query
+SEARCH_CACHE_TTL_SECONDS = 60 * 60
+SEARCH_CACHE_SIZE = 256
+# Searches running in the background at the same time (prefetches and parallel sub-agents)
+SEARCH_WORKERS = 4
+# Runs whose search counters are kept in memory
+SEARCH_STATS_MAX_RUNS = 50
+
+# How long Ollama keeps a model loaded after its last request (a duration such as "30m", or -1 for as long as the
+# server runs); sent with every call, so the orchestrator model is not evicted while the sub-agent model runs
+OLLAMA_KEEP_ALIVE = "30m"
+# Models checked (and pulled if missing) at the same time
+MODEL_CHECK_WORKERS = 4
+
+# Environment variable that points a provider at another server, e.g. MAESTRO_ANTHROPIC_BASE_URL=http://localhost:8765
+# for the mock server of benchmarks/mock_server.py; the override wins over the URL configured in the backend script
+BASE_URL_ENV = "MAESTRO_{}_BASE_URL"
+
+console = Console()
+
+def base_url_override(provider_name):
+    """
+    Returns the base URL set for `provider_name` in the environment (see BASE_URL_ENV), or None.
+    """
+    return os.environ.get(BASE_URL_ENV.format(provider_name.upper())) or None
+
+def http_limits():
+    import httpx
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS, keepalive_expiry=KEEPALIVE_EXPIRY)
+
+def http_timeout(provider_name):
+    import httpx
+    return httpx.Timeout(PROVIDER_TIMEOUTS[provider_name], connect=CONNECT_TIMEOUT)
+
+def flatten_content(content):
+    """
+    Converts Anthropic-style content blocks into the plain string other providers expect.
+    """
+    if isinstance(content, str):
+        return content
+    return "".join(block["text"] for block in content)
+
+def flatten_messages(messages, system=None):
+    """
+    Converts a system prompt and Anthropic-style messages into OpenAI-style chat messages.
+
+    Args:
+        messages (list of dict): Messages whose content is a string or a list of text blocks.
+        system (str or list of dict, optional): System prompt as a string or a list of text blocks.
+
+    Returns:
+        list of dict: Chat messages with string content, led by a system message if one was given.
+    """
+    flattened = []
+    if system:
+        flattened.append({"role": "system", "content": flatten_content(system)})
+    flattened.extend({"role": message["role"], "content": flatten_content(message["content"])} for message in messages)
+    return flattened
+
+class Provider:
+    """
+    A model provider owning one long-lived, pooled client.
+
+    The SDK is imported and the client created on the first call rather than in the constructor, so loading a
+    backend module stays cheap until it actually runs.
+
+    Calls are made through `guard` (see maestro_ratelimit), which rate limits and retries them, so the SDKs' own
+    retries are disabled.
+
+    `complete` takes Anthropic-style messages (string content or text blocks, optionally with cache_control markers)
+    and a separate system prompt; providers that do not understand blocks flatten them to plain strings.
+
+    `assistant_prefill` tells whether the API continues a trailing assistant message (a prefill) instead of starting
+    a new assistant turn after it.
+    """
+    name = None
+    assistant_prefill = False
+    # Server the client talks to; None for the SDK's default
+    base_url = None
+
+    def __init__(self):
+        self.sdk_client = None
+        self.client_lock = threading.Lock()
+        self.guard = ProviderGuard(self.name)
+
+    @property
+    def client(self):
+        with self.client_lock:
+            if self.sdk_client is None:
+                self.sdk_client = self.create_client()
+        return self.sdk_client
+
+    def create_client(self):
+        raise NotImplementedError
+
+    def cache_namespace(self):
+        """
+        Returns the provider name and server, which are part of the response cache key: the same model name served
+        by two endpoints (LM Studio and the mock server, say) must not share cached responses.
+        """
+        return f"{self.name}@{base_url_override(self.name) or self.base_url or 'default'}"
+
+    def complete(self, stage, model, messages, system=None, max_tokens=None, title=None, run=None, **params):
+        """
+        Runs one model call.
+
+        Args:
+            stage (str): Stage name used for streaming output and statistics.
+            model (str): Model identifier.
+            messages (list of dict): Conversation messages.
+            system (str or list of dict, optional): System prompt.
+            max_tokens (int, optional): Output token limit; omitted from the request if None.
+            title (str, optional): Title of the streaming panel.
+            run (callable, optional): Runs the request when the response cache cannot serve it, e.g. under the
+                provider's guard.
+            params: Extra generation parameters, e.g. temperature.
+
+        Returns:
+            LLMResponse: The normalized response.
+        """
+        raise NotImplementedError
+
+class AnthropicProvider(Provider):
+    name = 'anthropic'
+    assistant_prefill = True
+
+    def __init__(self, api_key=None, timeout=None):
+        super().__init__()
+        self.api_key = api_key
+        self.timeout = timeout or PROVIDER_TIMEOUTS[self.name]
+
+    def create_client(self):
+        from anthropic import Anthropic, DefaultHttpxClient
+        return Anthropic(api_key=self.api_key, base_url=base_url_override(self.name), timeout=self.timeout, max_retries=0, http_client=DefaultHttpxClient(limits=http_limits(), timeout=self.timeout))
+
+    def complete(self, stage, model, messages, system=None, max_tokens=None, title=None, run=None, **params):
+        if system:
+            params['system'] = system
+        return call_anthropic(self.client, stage, title=title, run=run, cache_namespace=self.cache_namespace(), model=model, max_tokens=max_tokens or 4096, messages=messages, **params)
+
+class OpenAIProvider(Provider):
+    name = 'openai'
+
+    def __init__(self, api_key=None, base_url=None, timeout=None, include_usage=True):
+        super().__init__()
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout or PROVIDER_TIMEOUTS[self.name]
+        self.include_usage = include_usage
+
+    def create_client(self):
+        from openai import OpenAI, DefaultHttpxClient
+        return OpenAI(api_key=self.api_key, base_url=base_url_override(self.name) or self.base_url, timeout=self.timeout, max_retries=0, http_client=DefaultHttpxClient(limits=http_limits(), timeout=self.timeout))
+
+    def complete(self, stage, model, messages, system=None, max_tokens=None, title=None, run=None, **params):
+        if max_tokens:
+            params['max_tokens'] = max_tokens
+        return call_chat_completion(
+            self.client.chat.completions.create, stage, title=title, include_usage=self.include_usage, run=run, cache_namespace=self.cache_namespace(),
+            model=model, messages=flatten_messages(messages, system), **params
+        )
+
+class LMStudioProvider(OpenAIProvider):
+    name = 'lmstudio'
+
+    def __init__(self, base_url="http://localhost:1234/v1", api_key="lm-studio", timeout=None):
+        # LM Studio does not accept OpenAI's stream_options, usage is estimated from the stream instead
+        super().__init__(api_key=api_key, base_url=base_url, timeout=timeout or PROVIDER_TIMEOUTS[self.name], include_usage=False)
+
+class GroqProvider(OpenAIProvider):
+    name = 'groq'
+
+    def __init__(self, api_key=None, timeout=None):
+        # Groq reports usage on its x_groq extension field and rejects stream_options
+        super().__init__(api_key=api_key, timeout=timeout or PROVIDER_TIMEOUTS[self.name], include_usage=False)
+
+    def create_client(self):
+        from groq import Groq, DefaultHttpxClient
+        return Groq(api_key=self.api_key, base_url=base_url_override(self.name), timeout=self.timeout, max_retries=0, http_client=DefaultHttpxClient(limits=http_limits(), timeout=self.timeout))
+
+class OllamaProvider(Provider):
+    # The chat endpoint answers a trailing assistant message with a new turn; only raw generate continues it
+    name = 'ollama'
+
+    def __init__(self, host='http://localhost:11434', timeout=None, keep_alive=OLLAMA_KEEP_ALIVE):
+        super().__init__()
+        self.base_url = host
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        # One check per model and one warm-up per set of models and process, shared by every caller that needs it
+        self.model_checks = {}
+        self.warm_ups = {}
+        self.model_checks_lock = threading.Lock()
+
+    def create_client(self):
+        from ollama import Client
+        return Client(host=base_url_override(self.name) or self.base_url, timeout=self.timeout or http_timeout(self.name), limits=http_limits())
+
+    def run_once(self, checks, key, function):
+        """
+        Runs `function` once per `key` of `checks` and process; callers that find it running wait for it and get its
+        error if it fails. A failed run is tried again by the next caller.
+        """
+        with self.model_checks_lock:
+            check = checks.get(key)
+            owner = check is None
+            if owner:
+                check = checks[key] = {'done': threading.Event(), 'error': None}
+        if not owner:
+            check['done'].wait()
+            if check['error'] is not None:
+                raise check['error']
+            return
+        try:
+            function()
+        except BaseException as e:
+            check['error'] = e
+            with self.model_checks_lock:
+                del checks[key]
+            raise
+        finally:
+            check['done'].set()
+
+    def ensure_model(self, model):
+        """
+        Pulls `model` if the Ollama server does not have it yet; each model is checked once per process, and callers
+        asking for a model that is being checked wait for that check.
+        """
+        self.run_once(self.model_checks, model, lambda: self.check_model(model))
+
+    def check_model(self, model):
+        from ollama import ResponseError
+        try:
+            console.print(f"Checking for model: {model}")
+            self.client.show(model)
+        except ResponseError:
+            console.print(f"Pulling model from ollama: {model}")
+            self.client.pull(model)
+
+    def ensure_models(self, models):
+        """
+        Checks (and pulls if missing) every distinct model of `models` concurrently.
+        """
+        models = list(dict.fromkeys(models))
+        with ThreadPoolExecutor(max_workers=min(MODEL_CHECK_WORKERS, len(models)) or 1, thread_name_prefix="maestro-ollama-check") as executor:
+            for future in [executor.submit(self.ensure_model, model) for model in models]:
+                future.result()
+
+    def loaded_models(self):
+        """
+        Returns the names of the models the server has in memory, or None if it cannot tell.
+        """
+        try:
+            return {entry.get('model') or entry.get('name') for entry in self.client.ps()['models']}
+        except Exception:
+            return None
+
+    def preload(self, model):
+        """
+        Loads `model` into the server's memory with the provider's keep-alive, without generating anything.
+
+        Returns:
+            float: Seconds the load took (next to nothing for a model that was already loaded).
+        """
+        start = time.perf_counter()
+        # Ollama loads a model and returns right away for a request with an empty prompt
+        self.client.generate(model=model, prompt='', keep_alive=self.keep_alive)
+        return time.perf_counter() - start
+
+    def warm_up(self, models):
+        """
+        Prepares the server for a run that uses `models` in this order: checks (and pulls) the distinct models
+        concurrently, then loads them one at a time in reverse order of first use, so that if the server cannot hold
+        them all, the model the run needs first is the one left loaded. The check and the loads happen once per
+        process and set of models.
+
+        Prints the load time of each model, and a warning if the models cannot all stay loaded, in which case every
+        switch between them reloads a model.
+
+        Callers warming up the same models while this runs wait for it; if it fails (e.g. the server is not up yet),
+        the next call tries again.
+        """
+        models = list(dict.fromkeys(models))
+        self.run_once(self.warm_ups, tuple(models), lambda: self.load_models(models))
+
+    def load_models(self, models):
+        start = time.perf_counter()
+        self.ensure_models(models)
+        check_seconds = time.perf_counter() - start
+        load_seconds = {model: self.preload(model) for model in reversed(models)}
+        loaded = self.loaded_models()
+        lines = [f"Checked {len(models)} model(s) in {check_seconds:.1f}s, keep-alive {self.keep_alive}"]
+        lines += [f"{model}: loaded in {load_seconds[model]:.1f}s" + ("" if loaded is None or model in loaded else " [yellow](evicted)[/yellow]") for model in models]
+        console.print(Panel("\n".join(lines), title="[bold blue]Ollama Warm-up[/bold blue]", title_align="left", border_style="blue"))
+        if loaded is not None and not loaded.issuperset(models):
+            console.print(f"[bold yellow]Warning:[/bold yellow] the Ollama server cannot keep {', '.join(models)} loaded together, so switching between them "
+                          "reloads a model. Run independent sub-tasks in parallel (fewer orchestrator turns), use smaller models, or raise OLLAMA_MAX_LOADED_MODELS.")
+
+    def complete(self, stage, model, messages, system=None, max_tokens=None, title=None, run=None, **params):
+        options = dict(params.pop('options', None) or {})
+        if max_tokens:
+            options['num_predict'] = max_tokens
+        if options:
+            params['options'] = options
+        if self.keep_alive is not None:
+            params.setdefault('keep_alive', self.keep_alive)
+        return call_ollama(self.client, stage, title=title, run=run, cache_namespace=self.cache_namespace(), model=model, messages=flatten_messages(messages, system), **params)
+
+class LiteLLMProvider(Provider):
+    name = 'litellm'
+
+    def __init__(self, timeout=None):
+        super().__init__()
+        self.timeout = timeout
+
+    def create_client(self):
+        import httpx
+        import litellm
+        # LiteLLM reuses this session for the providers it calls over plain HTTP
+        litellm.client_session = httpx.Client(limits=http_limits(), timeout=self.timeout or http_timeout(self.name))
+        return litellm
+
+    def complete(self, stage, model, messages, system=None, max_tokens=None, title=None, run=None, **params):
+        if max_tokens:
+            params['max_tokens'] = max_tokens
+        if base_url_override(self.name):
+            params['api_base'] = base_url_override(self.name)
+        # Retries are left to the provider's guard
+        params.setdefault('max_retries', 0)
+        # stream_options is an OpenAI parameter that not every route LiteLLM calls accepts (like LM Studio and Groq,
+        # it is left out); usage LiteLLM attaches to the last chunk is still read, else chunks are counted
+        return call_chat_completion(
+            self.client.completion, stage, title=title, include_usage=False, run=run, cache_namespace=self.cache_namespace(),
+            model=model, messages=flatten_messages(messages, system), timeout=self.timeout or PROVIDER_TIMEOUTS[self.name], **params
+        )
+
+class SearchClient(Provider):
+    """
+    Tavily QnA search over one pooled, keep-alive HTTP session, with a TTL cache and background prefetching.
+
+    Results are cached per normalized query (case and whitespace insensitive) for `ttl` seconds. `prefetch`
+    starts a search on a background thread as soon as the query is known; a later `qna_search` for the same
+    query waits for that search instead of starting another one. Counters are kept for the whole process and per
+    run (the current run id of the caller), since concurrent runs share the client.
+
+    Args:
+        api_key (str): Tavily API key.
+        timeout (float, optional): Request timeout in seconds.
+        ttl (float): Seconds a result is reused.
+        max_entries (int): Maximum number of cached queries.
+    """
+    name = 'tavily'
+
+    def __init__(self, api_key=None, timeout=None, ttl=SEARCH_CACHE_TTL_SECONDS, max_entries=SEARCH_CACHE_SIZE):
+        super().__init__()
+        self.api_key = api_key
+        self.timeout = timeout or PROVIDER_TIMEOUTS[self.name]
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.executor = None
+        self.counters = self.new_counters()
+        self.run_counters = OrderedDict()
+
+    @staticmethod
+    def new_counters():
+        return {'lookups': 0, 'hits': 0, 'prefetch_hits': 0, 'misses': 0, 'searches': 0, 'search_seconds': 0.0, 'wait_seconds': 0.0}
+
+    def count(self, run_id, key, amount=1):
+        # Must be called with the cache lock held
+        self.counters[key] += amount
+        if run_id is None:
+            return
+        counters = self.run_counters.get(run_id)
+        if counters is None:
+            counters = self.run_counters[run_id] = self.new_counters()
+            while len(self.run_counters) > SEARCH_STATS_MAX_RUNS:
+                self.run_counters.popitem(last=False)
+        counters[key] += amount
+
+    def create_client(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from tavily import TavilyClient
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=MAX_KEEPALIVE_CONNECTIONS, pool_maxsize=MAX_CONNECTIONS)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return TavilyClient(api_key=self.api_key, api_base_url=base_url_override(self.name), session=session)
+
+    @staticmethod
+    def normalize_query(query):
+        return " ".join(query.lower().split())
+
+    def search(self, query, run_id=None):
+        # Runs on a search worker thread, so the run is passed in rather than read from the context
+        start = time.perf_counter()
+        try:
+            return self.guard.call(lambda: self.client.qna_search(query=query, timeout=self.timeout))
+        finally:
+            with self.cache_lock:
+                self.count(run_id, 'searches')
+                self.count(run_id, 'search_seconds', time.perf_counter() - start)
+
+    def cached_entry(self, key):
+        # Must be called with the cache lock held; failed searches are not reused
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        future = entry['future']
+        if time.time() - entry['created_at'] > self.ttl or (future.done() and future.exception() is not None):
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return entry
+
+    def start_search(self, key, query, prefetched):
+        # Must be called with the cache lock held
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="maestro-search")
+        entry = {'created_at': time.time(), 'future': self.executor.submit(self.search, query, current_run_id.get()), 'prefetched': prefetched}
+        self.cache[key] = entry
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+        return entry
+
+    def prefetch(self, query):
+        """
+        Starts searching for `query` in the background unless a fresh result is already cached.
+        """
+        key = self.normalize_query(query)
+        with self.cache_lock:
+            if self.cached_entry(key) is None:
+                self.start_search(key, query, prefetched=True)
+
+    def qna_search(self, query):
+        """
+        Returns the answer for `query`, from the cache or a prefetch if possible.
+        """
+        key = self.normalize_query(query)
+        run_id = current_run_id.get()
+        with self.cache_lock:
+            self.count(run_id, 'lookups')
+            entry = self.cached_entry(key)
+            if entry is None:
+                self.count(run_id, 'misses')
+                entry = self.start_search(key, query, prefetched=False)
+            elif entry['prefetched']:
+                # The first lookup of a prefetched query is credited to the prefetch, later ones to the cache
+                self.count(run_id, 'prefetch_hits')
+                entry['prefetched'] = False
+            else:
+                self.count(run_id, 'hits')
+        start = time.perf_counter()
+        try:
+            return entry['future'].result()
+        finally:
+            with self.cache_lock:
+                self.count(run_id, 'wait_seconds', time.perf_counter() - start)
+
+    def stats(self, run_id=None):
+        """
+        Returns the search counters accumulated so far, of one run if `run_id` is given, else of the whole process.
+
+        Returns:
+            dict: lookups, hits, prefetch_hits, misses, searches, search_seconds and wait_seconds.
+        """
+        with self.cache_lock:
+            if run_id is None:
+                return dict(self.counters)
+            return dict(self.run_counters.get(run_id) or self.new_counters())
+
+    def print_stats(self, run_id=None):
+        """
+        Prints cache hit rate and search latency of one run if `run_id` is given, else of the whole process.
+        """
+        stats = self.stats(run_id)
+        if not stats['lookups']:
+            return
+        reused = stats['hits'] + stats['prefetch_hits']
+        average = stats['search_seconds'] / stats['searches'] if stats['searches'] else 0.0
+        console.print(Panel(
+            f"{stats['lookups']} lookups: {stats['hits']} cached, {stats['prefetch_hits']} prefetched, {stats['misses']} searched "
+            f"({reused / stats['lookups']:.0%} without waiting for a new search)\n"
+            f"{stats['searches']} searches, {average:.2f}s average latency, {stats['wait_seconds']:.2f}s spent waiting by sub-agents",
+            title="[bold]Search[/bold]", title_align="left", border_style="yellow"
+        ))
+
+provider_classes = {
+    'anthropic': AnthropicProvider,
+    'openai': OpenAIProvider,
+    'lmstudio': LMStudioProvider,
+    'groq': GroqProvider,
+    'ollama': OllamaProvider,
+    'litellm': LiteLLMProvider,
+    'tavily': SearchClient,
+}
+
+providers = {}
+providers_lock = threading.Lock()
+
+def get_provider(name, **config):
+    """
+    Returns the shared provider instance for `name` and `config`, creating it on first use.
+
+    Every backend module loaded in the same process (CLI, Flask app, batch runs) reuses the same clients, and
+    with them the same keep-alive connection pools.
+
+    Args:
+        name (str): One of 'anthropic', 'openai', 'lmstudio', 'groq', 'ollama', 'litellm' or 'tavily'.
+        config: Constructor arguments of the provider, e.g. api_key, base_url or host.
+
+    Returns:
+        Provider or SearchClient: The shared instance.
+    """
+    key = (name, tuple(sorted(config.items())))
+    with providers_lock:
+        if key not in providers:
+            providers[key] = provider_classes[name](**config)
+        return providers[key]
+
+def get_search_client(api_key=None):
+    """
+    Returns the shared Tavily search client for `api_key`.
+    """
+    return get_provider('tavily', api_key=api_key)
@@ -0,0 +1,314 @@
+import email.utils
+import os
+import random
+import threading
+import time
+from rich.console import Console
+
+console = Console()
+
+# Requests and tokens (prompt + completion) per minute allowed per provider; None (the default) means no limit, and
+# calls are only held back by adaptive concurrency and the providers' own 429s. Set them to your account's limits here
+# or in the environment (RATE_LIMIT_ENV), e.g. MAESTRO_GROQ_TOKENS_PER_MINUTE=6000 on Groq's free tier.
+PROVIDER_RATE_LIMITS = {
+    'anthropic': {'requests_per_minute': None, 'tokens_per_minute': None},
+    'openai': {'requests_per_minute': None, 'tokens_per_minute': None},
+    'groq': {'requests_per_minute': None, 'tokens_per_minute': None},
+    'litellm': {'requests_per_minute': None, 'tokens_per_minute': None},
+    'lmstudio': {'requests_per_minute': None, 'tokens_per_minute': None},
+    'ollama': {'requests_per_minute': None, 'tokens_per_minute': None},
+    'tavily': {'requests_per_minute': None, 'tokens_per_minute': None},
+}
+# Environment variable that sets a provider's limit, e.g. MAESTRO_ANTHROPIC_REQUESTS_PER_MINUTE; it wins over the table
+RATE_LIMIT_ENV = "MAESTRO_{}_{}"
+
+# Retries of a failed call (rate limited, overloaded, server error, timeout or dropped connection)
+MAX_RETRIES = 5
+# Exponential backoff with full jitter: a retry waits up to BACKOFF_BASE_SECONDS * 2 ** attempt, capped
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504, 529)
+# Statuses meaning the provider wants less traffic; they also shrink the concurrency limit
+THROTTLE_STATUS_CODES = (429, 503, 529)
+# Error body types classified whatever the HTTP status: an error event in the middle of a stream is raised by the
+# SDK with the stream's 200 status. Overload and rate limit errors throttle, server errors are retried.
+ERROR_TYPE_KINDS = {
+    'overloaded_error': 'throttled',
+    'rate_limit_error': 'throttled',
+    'api_error': 'retryable',
+}
+
+# AIMD concurrency per provider: the limit grows by ~1 per limit's worth of successful calls and halves when
+# throttled (at most once per cooldown, so one burst of 429s counts once)
+INITIAL_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 16
+CONCURRENCY_DECREASE_FACTOR = 0.5
+CONCURRENCY_DECREASE_COOLDOWN_SECONDS = 5.0
+
+class TokenBucket:
+    """
+    Token bucket refilled at `per_minute` tokens per minute, holding at most a minute's worth.
+
+    Args:
+        per_minute (float): Refill rate and capacity.
+    """
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        # Must be called with the lock held
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, amount=1):
+        """
+        Blocks until `amount` tokens are available (at most the capacity), then takes them.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def consume(self, amount):
+        """
+        Takes `amount` tokens without waiting; the bucket may go negative, which delays the next acquire.
+        """
+        with self.lock:
+            self.refill()
+            self.tokens -= amount
+
+class AdaptiveConcurrency:
+    """
+    AIMD (additive increase, multiplicative decrease) limit on the calls in flight to one provider.
+
+    Args:
+        initial (int): Starting limit.
+        minimum (int): The limit never drops below this.
+        maximum (int): The limit never grows above this.
+    """
+    def __init__(self, initial=INITIAL_CONCURRENCY, minimum=MIN_CONCURRENCY, maximum=MAX_CONCURRENCY):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.decreased_at = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, outcome):
+        """
+        Frees a slot. `outcome` is 'success' (grows the limit), 'throttled' (shrinks it) or 'error' (leaves it).
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if outcome == 'success':
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            elif outcome == 'throttled' and time.monotonic() - self.decreased_at >= CONCURRENCY_DECREASE_COOLDOWN_SECONDS:
+                self.limit = max(self.minimum, self.limit * CONCURRENCY_DECREASE_FACTOR)
+                self.decreased_at = time.monotonic()
+            self.condition.notify_all()
+
+def rate_limit(name, kind):
+    """
+    Returns the `kind` limit ('requests_per_minute' or 'tokens_per_minute') of provider `name`, from the environment
+    (see RATE_LIMIT_ENV) if set there, else from PROVIDER_RATE_LIMITS; None means no limit.
+    """
+    value = os.environ.get(RATE_LIMIT_ENV.format(name.upper(), kind.upper()))
+    if value:
+        return float(value)
+    return PROVIDER_RATE_LIMITS.get(name, {}).get(kind)
+
+def status_code(error):
+    """
+    Returns the HTTP status of an SDK error (Anthropic, OpenAI, Groq, Ollama, LiteLLM, requests), or None.
+    """
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+def error_type(error):
+    """
+    Returns the type given in the body of an SDK error (e.g. Anthropic's overloaded_error), or None.
+    """
+    body = getattr(error, 'body', None)
+    if not isinstance(body, dict):
+        return None
+    # Anthropic wraps the error as {"type": "error", "error": {"type": ...}}; OpenAI's body is the inner object
+    inner = body.get('error')
+    kind = inner.get('type') if isinstance(inner, dict) else body.get('type')
+    return kind if isinstance(kind, str) else None
+
+def retry_after(error):
+    """
+    Returns the seconds the provider asked to wait before retrying (retry-after-ms or retry-after header), or None.
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            # An HTTP date
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_timeout(error):
+    # SDKs wrap httpx/requests timeouts and connection errors in their own classes; their names give them away
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return any(part in type(error).__name__ for part in ('Timeout', 'ConnectionError', 'ConnectError'))
+
+def classify_error(error):
+    """
+    Returns 'throttled', 'retryable' or None (not worth retrying) for an error raised by a provider call, from its
+    HTTP status, the type in its body, or its class for timeouts and connection errors.
+    """
+    status = status_code(error)
+    kind = ERROR_TYPE_KINDS.get(error_type(error))
+    if status in THROTTLE_STATUS_CODES or kind == 'throttled':
+        return 'throttled'
+    if status in RETRYABLE_STATUS_CODES or kind == 'retryable' or (status is None and is_timeout(error)):
+        return 'retryable'
+    return None
+
+def backoff_delay(attempt):
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+class ProviderGuard:
+    """
+    Rate limiting, retries and adaptive concurrency for the calls of one provider.
+
+    Every call waits for a concurrency slot and for the provider's request and token buckets. A call that fails
+    with a rate limit, overload, server error, timeout or dropped connection is retried up to `max_retries` times,
+    after the provider's retry-after if it sent one, else after an exponential backoff with full jitter. A throttled
+    call also holds back every other call to the provider until the retry time, and halves the concurrency limit.
+
+    Args:
+        name (str): Provider name, the key of PROVIDER_RATE_LIMITS (see rate_limit).
+        max_retries (int): Retries of a failed call.
+    """
+    def __init__(self, name, max_retries=MAX_RETRIES):
+        requests_per_minute = rate_limit(name, 'requests_per_minute')
+        tokens_per_minute = rate_limit(name, 'tokens_per_minute')
+        self.name = name
+        self.max_retries = max_retries
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        self.counters = {'calls': 0, 'retries': 0, 'throttled': 0, 'failed': 0, 'wait_seconds': 0.0}
+
+    def wait_turn(self, estimated_tokens):
+        # Returns the seconds spent waiting for a pause, the buckets and a concurrency slot
+        start = time.monotonic()
+        with self.lock:
+            pause = self.paused_until - start
+        if pause > 0:
+            time.sleep(pause)
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens and estimated_tokens:
+            self.tokens.acquire(estimated_tokens)
+        self.concurrency.acquire()
+        return time.monotonic() - start
+
+    def call(self, function, estimated_tokens=0, on_retry=None, on_wait=None):
+        """
+        Calls `function` under the provider's limits, retrying it on transient errors.
+
+        Args:
+            function (callable): Performs the call; its result is returned.
+            estimated_tokens (int): Tokens the call is expected to use, taken from the token bucket up front
+                (see settle_tokens).
+            on_retry (callable, optional): Called with the error before every retry.
+            on_wait (callable, optional): Called with the seconds every attempt waited for its turn.
+
+        Returns:
+            The result of `function`.
+        """
+        attempt = 0
+        while True:
+            waited = self.wait_turn(estimated_tokens)
+            outcome = 'error'
+            try:
+                if on_wait:
+                    on_wait(waited)
+                result = function()
+                outcome = 'success'
+            except Exception as e:
+                error = e
+                kind = classify_error(e)
+                outcome = 'throttled' if kind == 'throttled' else 'error'
+            finally:
+                # Also when a KeyboardInterrupt or another BaseException goes through, which would otherwise keep the
+                # slot taken for the rest of the process
+                self.concurrency.release(outcome)
+            if outcome != 'success':
+                with self.lock:
+                    self.counters['wait_seconds'] += waited
+                    self.counters['throttled'] += kind == 'throttled'
+                    if kind is None or attempt >= self.max_retries:
+                        self.counters['failed'] += 1
+                        raise error
+                    self.counters['retries'] += 1
+                    requested = retry_after(error)
+                    delay = requested + random.uniform(0, BACKOFF_BASE_SECONDS) if requested is not None else backoff_delay(attempt)
+                    if kind == 'throttled':
+                        # Every caller waits, rather than each running into the same limit
+                        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                status = error_type(error) or status_code(error)
+                console.print(f"[yellow]{self.name}: {type(error).__name__}{f' ({status})' if status else ''}, retrying in {delay:.1f}s (retry {attempt + 1} of {self.max_retries})[/yellow]")
+                if on_retry:
+                    on_retry(error)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            with self.lock:
+                self.counters['calls'] += 1
+                self.counters['wait_seconds'] += waited
+            return result
+
+    def settle_tokens(self, estimated_tokens, used_tokens):
+        """
+        Corrects the token bucket once a call's real usage is known: the difference to the estimate taken up front
+        is taken (or given back).
+        """
+        if self.tokens:
+            self.tokens.consume(used_tokens - min(estimated_tokens, self.tokens.capacity))
+
+    def stats(self):
+        """
+        Returns calls, retries, throttled, failed, wait_seconds and the current concurrency limit.
+        """
+        with self.lock:
+            return {**self.counters, 'concurrency_limit': int(self.concurrency.limit)}
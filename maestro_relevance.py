@@ -0,0 +1,228 @@
+import math
+import re
+import threading
+from collections import Counter
+from rich.console import Console
+from rich.panel import Panel
+from maestro_compaction import estimate_tokens
+
+console = Console()
+
+# Once the previous tasks given to a sub-agent pass this many (estimated) tokens, only the parts of them most
+# relevant to its task are given, e.g. 8000; None (the default) always gives every previous task in full
+SUB_AGENT_CONTEXT_TOKEN_BUDGET = None
+# Results are indexed in chunks of about this many tokens, cut at blank lines outside code blocks
+CHUNK_TOKENS = 300
+# The most recent tasks are always given in full if they fit the budget
+KEEP_RECENT_TASKS = 1
+# BM25 parameters: term frequency saturation and document length normalization
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Marks the parts of a result left out of the context
+OMITTED_MARKER = "[...]"
+
+TERM_PATTERN = re.compile(r'[a-z0-9]+')
+# Words every task prompt has, which would make any chunk look relevant
+STOP_WORDS = frozenset(
+    "a an and are as at be by do for from has have in is it its of on or that the this to was will with you your "
+    "should must can use using write create make add new task result".split()
+)
+
+def terms(text):
+    # Identifiers are split into their words, so "parse_csv" and "parseCsv" both match "csv"
+    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text).lower()
+    return [term for term in TERM_PATTERN.findall(text.replace('_', ' ')) if term not in STOP_WORDS]
+
+def split_chunks(text, chunk_tokens=CHUNK_TOKENS):
+    """
+    Splits a result into chunks of about `chunk_tokens` tokens, at blank lines outside code blocks; a code block is
+    only cut when it is more than twice that long.
+
+    Returns:
+        list of str: The chunks, which joined with newlines give back the text.
+    """
+    chunks = []
+    lines = []
+    size = 0
+    in_code = False
+    for line in text.split('\n'):
+        if line.strip().startswith('```'):
+            in_code = not in_code
+        lines.append(line)
+        size += estimate_tokens(line)
+        boundary = not line.strip() and not in_code
+        if (size >= chunk_tokens and boundary) or size >= 2 * chunk_tokens:
+            chunks.append('\n'.join(lines))
+            lines = []
+            size = 0
+    if lines:
+        chunks.append('\n'.join(lines))
+    return chunks
+
+def format_task(task, result):
+    return f"Task: {task}\nResult: {result}"
+
+class RelevanceIndex:
+    """
+    Local BM25 index over the chunks of a run's previous sub-task results, used to give each sub-agent only the
+    previous work relevant to its task.
+
+    Tasks are added (or replaced, for a result escalated by the cascade) as their results arrive, which updates the
+    term statistics in place. As long as the previous tasks fit `token_budget` they are given in full, which keeps
+    the prompt prefix stable for prompt caching. Past the budget, the last `keep_recent` tasks are kept whole and
+    the remaining budget goes to the highest scoring chunks of the older ones, each shown under its task.
+
+    Args:
+        token_budget (int, optional): Estimated token budget of the previous tasks; None disables selection.
+        chunk_tokens (int): Target chunk size.
+        keep_recent (int): Number of most recent tasks always given in full if they fit.
+    """
+    def __init__(self, token_budget=SUB_AGENT_CONTEXT_TOKEN_BUDGET, chunk_tokens=CHUNK_TOKENS, keep_recent=KEEP_RECENT_TASKS):
+        self.token_budget = token_budget
+        self.chunk_tokens = chunk_tokens
+        self.keep_recent = keep_recent
+        # Task and chunks per task position; a chunk has its text, tokens (estimated), term counts and length
+        self.tasks = {}
+        self.document_frequency = Counter()
+        self.chunk_count = 0
+        self.total_length = 0
+        self.lock = threading.Lock()
+        self.counters = {'calls': 0, 'selected_calls': 0, 'full_tokens': 0, 'sent_tokens': 0}
+
+    def add(self, position, task, result):
+        """
+        Indexes the task at `position` of the run's task list, replacing what was indexed there before.
+        """
+        if self.token_budget is None:
+            return
+        chunks = []
+        task_terms = terms(task)
+        for text in split_chunks(result, self.chunk_tokens):
+            # The task's own words count for every chunk of its result
+            counts = Counter(terms(text) + task_terms)
+            chunks.append({'text': text, 'tokens': estimate_tokens(text), 'counts': counts, 'length': sum(counts.values())})
+        with self.lock:
+            self.remove(position)
+            self.tasks[position] = {'task': task, 'chunks': chunks}
+            for chunk in chunks:
+                self.document_frequency.update(chunk['counts'].keys())
+                self.total_length += chunk['length']
+            self.chunk_count += len(chunks)
+
+    def remove(self, position):
+        # Must be called with the lock held
+        entry = self.tasks.pop(position, None)
+        if entry is None:
+            return
+        for chunk in entry['chunks']:
+            self.document_frequency.subtract(chunk['counts'].keys())
+            self.total_length -= chunk['length']
+        self.chunk_count -= len(entry['chunks'])
+        # Drops the terms no chunk has any more
+        self.document_frequency += Counter()
+
+    def score(self, query_terms, chunk):
+        # Must be called with the lock held
+        average_length = self.total_length / self.chunk_count if self.chunk_count else 1
+        score = 0.0
+        for term in query_terms:
+            frequency = chunk['counts'].get(term)
+            if not frequency:
+                continue
+            df = self.document_frequency[term]
+            idf = math.log(1 + (self.chunk_count - df + 0.5) / (df + 0.5))
+            score += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * (1 - BM25_B + BM25_B * chunk['length'] / average_length))
+        return score
+
+    def select(self, query, previous_tasks):
+        """
+        Returns the previous tasks to give a sub-agent whose task is `query`.
+
+        Args:
+            query (str): The sub-task prompt.
+            previous_tasks (list of dict): The run's previous tasks ("task" and "result"), indexed by position.
+
+        Returns:
+            list of dict: Tasks with the "result" cut down to the selected chunks (OMITTED_MARKER marks what was
+            left out), in task order; `previous_tasks` itself if it fits the budget.
+        """
+        full_tokens = sum(estimate_tokens(format_task(task['task'], task['result'])) for task in previous_tasks)
+        if self.token_budget is None or full_tokens <= self.token_budget:
+            self.count(full_tokens, full_tokens, selected=False)
+            return previous_tasks
+
+        count = len(previous_tasks)
+        budget = self.token_budget
+        selected = set()
+        # The most recent tasks are usually what the new task builds on
+        for position in range(count - 1, max(count - self.keep_recent, 0) - 1, -1):
+            tokens = estimate_tokens(format_task(previous_tasks[position]['task'], previous_tasks[position]['result']))
+            if tokens > budget:
+                break
+            selected.add(position)
+            budget -= tokens
+
+        query_terms = set(terms(query))
+        with self.lock:
+            # Only what the caller's task list holds: a rerun sub-task must not see results of its own step
+            candidates = [(self.score(query_terms, chunk), position, index, chunk)
+                          for position, entry in self.tasks.items() if position < count and position not in selected
+                          for index, chunk in enumerate(entry['chunks'])]
+        chunks_by_task = {}
+        for score, position, index, chunk in sorted(candidates, key=lambda candidate: (-candidate[0], -candidate[1], candidate[2])):
+            if score <= 0:
+                break
+            # A task's prompt is paid for once, with its first selected chunk
+            tokens = chunk['tokens'] + (0 if position in chunks_by_task else estimate_tokens(format_task(previous_tasks[position]['task'], "")))
+            if tokens > budget:
+                continue
+            chunks_by_task.setdefault(position, []).append(index)
+            budget -= tokens
+
+        context = []
+        for position in sorted(selected | set(chunks_by_task)):
+            task = previous_tasks[position]
+            if position in selected:
+                context.append(task)
+                continue
+            chunks = self.tasks[position]['chunks']
+            indexes = sorted(chunks_by_task[position])
+            parts = []
+            for number, index in enumerate(indexes):
+                if (index > 0 and number == 0) or (number > 0 and index != indexes[number - 1] + 1):
+                    parts.append(OMITTED_MARKER)
+                parts.append(chunks[index]['text'])
+            if indexes[-1] < len(chunks) - 1:
+                parts.append(OMITTED_MARKER)
+            context.append({'task': task['task'], 'result': '\n'.join(parts)})
+        sent_tokens = sum(estimate_tokens(format_task(task['task'], task['result'])) for task in context)
+        self.count(full_tokens, sent_tokens, selected=True)
+        console.print(f"Sub-agent context: {len(context)} of {count} previous tasks, {sent_tokens} of {full_tokens} estimated tokens")
+        return context
+
+    def count(self, full_tokens, sent_tokens, selected):
+        with self.lock:
+            self.counters['calls'] += 1
+            self.counters['selected_calls'] += int(selected)
+            self.counters['full_tokens'] += full_tokens
+            self.counters['sent_tokens'] += sent_tokens
+
+    def stats(self):
+        """
+        Returns calls, selected_calls (calls past the budget), full_tokens, sent_tokens and saved_tokens.
+        """
+        with self.lock:
+            return {**self.counters, 'saved_tokens': self.counters['full_tokens'] - self.counters['sent_tokens']}
+
+    def print_stats(self):
+        """
+        Prints the tokens of previous tasks the index saved in this run.
+        """
+        stats = self.stats()
+        if not stats['selected_calls']:
+            return
+        console.print(Panel(
+            f"Sub-agent previous tasks: {stats['full_tokens']} -> {stats['sent_tokens']} estimated tokens over {stats['calls']} calls "
+            f"({stats['saved_tokens']} saved, {stats['selected_calls']} calls past the {self.token_budget} token budget)",
+            title="[bold]Relevant Context[/bold]", title_align="left", border_style="cyan"
+        ))
@@ -1,10 +1,37 @@
+import contextvars
 import re
 import os
+import json
+from contextlib import contextmanager
 from rich.panel import Panel
 from rich.console import Console
+from maestro_fences import parse_code_fences, FILENAME_LABEL_PATTERN
+from maestro_materialize import materialize
 
 console = Console()
 
+# Directory the current run writes its exchange log and project folder to; the working directory if None
+current_output_dir = contextvars.ContextVar('current_output_dir', default=None)
+
+@contextmanager
+def output_context(directory):
+    """
+    Makes runs started inside the block write their outputs to `directory` instead of the working directory.
+    """
+    os.makedirs(directory, exist_ok=True)
+    token = current_output_dir.set(directory)
+    try:
+        yield directory
+    finally:
+        current_output_dir.reset(token)
+
+def output_path(path):
+    """
+    Returns `path` inside the current run's output directory.
+    """
+    directory = current_output_dir.get()
+    return os.path.join(directory, path) if directory else path
+
 def read_file(file_path):
     try:
         with open(file_path, 'r') as file:
@@ -57,97 +84,130 @@ def extract_project_name(input_text, backup_name="Maestro_Project"):
     
     return backup_name
 
-def extract_and_write_project_files(input_text, project_dir_name):
+def extract_and_write_project_files(input_text, project_dir_name, start_marker="Refined Final Output"):
     """
     Extract and write 'code' files with content based on patterns in the input text.
     
-    This function processes a multi-line string to search for specific file name patterns within backticks or other markers, extracts 
-    filenames (while removing non-alphanumeric characters), generates unique names if duplicates exist, and writes extracted files with content into specified directory.
+    The text is tokenized in one pass by maestro_fences.CodeFenceParser. Every code block whose filename can be found
+    (on its fence line or in the lines just above it) is written into the project directory, with duplicate
+    filenames made unique.
     
     Parameters:
         input_text (str): Multiline string containing potential filename patterns and file contents.
-        project_directory (str): Path to the directory where extracted files will be written into. 
-        If not specified, defaults to the current working directory.
+        project_dir_name (str): Path to the directory where extracted files will be written into, inside the current output directory (see output_context).
+        start_marker (str, optional): Only code blocks after the first line containing this text are extracted;
+            None extracts from the whole text.
     
     Returns:
         code_blocks (list of tuple): List containing tuples with filename and file content for each generated unique filename found within input text.
     """
-    
-    lines = input_text.split('\n')
-    filename = None
-    file_content = []
-    inside_backticks = False
-    line_buffer = []
-    processing = False
+    events, _ = parse_code_fences(input_text, start_marker)
+    project_dir_name = output_path(project_dir_name)
     code_blocks = []
     existing_filenames = set()
 
-    filename_patterns = [
-        re.compile(r'`([^`]+?\.[a-zA-Z0-9]+)`'),                  # `filename.ext`
-        re.compile(r'\*\*FileName: ([^\s]+?\.[a-zA-Z0-9]+)\*\*'), # **FileName: filename.ext**
-        re.compile(r'# ([^\s]+?\.[a-zA-Z0-9]+)'),                 # # filename.ext
-        re.compile(r'File: ([^\s]+?\.[a-zA-Z0-9]+)'),             # File: filename.ext
-        re.compile(r'\'([^\']+?\.[a-zA-Z0-9]+)\''),               # 'filename.ext'
-        re.compile(r'filename:\(([^\)]+?\.[a-zA-Z0-9]+)\)'),      # filename:(filename.ext)
-        re.compile(r'\b([^\s]+?\.[a-zA-Z0-9]+)\b')                # filename.ext (as a fallback)
-    ]
-
     # Create project directory
     os.makedirs(project_dir_name, exist_ok=True)
     console.print(Panel(f"Created project directory: [bold]{project_dir_name}[/bold]", title="[bold green]Project Directory[/bold green]", title_align="left", border_style="green"))
 
-    for i, line in enumerate(lines):
-        #print(f"Processing line {i}: {line}")  # Debugging line processing
-        if not processing:
-            if "Refined Final Output" in line:
-                processing = True
-                #print("Found 'Refined Final Output' line. Starting processing.")
-            continue
-        
-        line_buffer.append(line)
-        if len(line_buffer) > 3:
-            line_buffer.pop(0)
-
-        if re.search(r'```', line):
-            # Check previous 3 lines for a filename
-            for buffer_line in line_buffer:
-                for pattern in filename_patterns:
-                    match = pattern.search(buffer_line)
-                    if match:
-                        filename = generate_unique_name(match.group(1), existing_filenames)
-                        filename = os.path.join(project_dir_name, filename)
-                        #print(f"Found potential filename: {filename} within buffer lines.")
-                        break
-                if filename:
-                    break
-            
-            os.makedirs(os.path.dirname(filename), exist_ok=True)
-            if inside_backticks and filename:
-                with open(filename, 'w') as f:
-                    f.write('\n'.join(file_content))
-                console.print(Panel(f"Created file: [bold]{filename}[/bold]", title="[bold green]File Creation[/bold green]", title_align="left", border_style="green"))
-                code_blocks.append((filename, '\n'.join(file_content)))
-
-            inside_backticks = not inside_backticks
-            if inside_backticks:
-                file_content = []
+    for filename, _, content in events:
+        if filename:
+            code_blocks.append((os.path.join(project_dir_name, generate_unique_name(filename, existing_filenames)), content))
+    materialize(code_blocks)
+    return code_blocks
+
+def create_folder_structure(project_name, folder_structure, code_blocks):
+    """
+    Creates the project folder and its folder structure, then writes every file of the structure that has a code block.
+
+    Returns:
+        dict: The write report of maestro_materialize ('written', 'unchanged' and 'failed'), or None if the project
+            folder could not be created.
+    """
+    # Create the project folder
+    try:
+        os.makedirs(project_name, exist_ok=True)
+        console.print(Panel(f"Created project folder: [bold]{project_name}[/bold]", title="[bold green]Project Folder[/bold green]", title_align="left", border_style="green"))
+    except OSError as e:
+        console.print(Panel(f"Error creating project folder: [bold]{project_name}[/bold]\nError: {e}", title="[bold red]Project Folder Creation Error[/bold red]", title_align="left", border_style="red"))
+        return None
+
+    # Index the code blocks by filename once; the first block of a name wins
+    code_index = {}
+    for file, code in code_blocks:
+        code_index.setdefault(file, code)
+
+    # Recursively create the folder structure, then write the files in parallel
+    files = []
+    create_folders_and_files(project_name, folder_structure, code_index, files)
+    return materialize(files)
+
+def create_folders_and_files(current_path, structure, code_index, files):
+    """
+    Creates the folders of `structure` and collects (path, content) in `files` for every file with a code block.
+    """
+    for key, value in structure.items():
+        path = os.path.join(current_path, key)
+        if isinstance(value, dict):
+            try:
+                os.makedirs(path, exist_ok=True)
+                create_folders_and_files(path, value, code_index, files)
+            except OSError as e:
+                console.print(Panel(f"Error creating folder: [bold]{path}[/bold]\nError: {e}", title="[bold red]Folder Creation Error[/bold red]", title_align="left", border_style="red"))
+        else:
+            code_content = code_index.get(key)
+            if code_content:
+                files.append((path, code_content))
             else:
-                filename = None
-                file_content = []
-            #print(f"Backticks {'opened' if inside_backticks else 'closed'} on line {i}")
-
-        elif inside_backticks:
-            file_content.append(line)
-            #print(f"Added line {i} to file content.")
-
-    # If the last file content was not written (no closing backticks)
-    if inside_backticks and filename:
-        with open(filename, 'w') as f:
-            f.write('\n'.join(file_content))
-        console.print(Panel(f"Created file: [bold]{filename}[/bold]", title="[bold green]File Creation[/bold green]", title_align="left", border_style="green"))
-        code_blocks.append((filename, '\n'.join(file_content)))
+                console.print(Panel(f"Code content not found for file: [bold]{key}[/bold]", title="[bold yellow]Missing Code Content[/bold yellow]", title_align="left", border_style="yellow"))
+
+def write_project_from_folder_structure(refined_output, backup_name):
+    """
+    Creates the project described by a refined output that follows the 'Project Name:', <folder_structure> and
+    'Filename:' conventions of the refine prompt.
+
+    Args:
+        refined_output (str): The refiner's final output.
+        backup_name (str): Project name used if the output does not name one.
+
+    Returns:
+        code_blocks (list of tuple): (filename, content) for each code file found in the output.
+    """
+    # One pass over the output collects the project name, the folder structure and the 'Filename:' code blocks
+    events, parser = parse_code_fences(refined_output, filename_patterns=[FILENAME_LABEL_PATTERN])
+    project_name = parser.project_name or backup_name
+
+    folder_structure = {}
+    if parser.folder_structure:
+        json_string = parser.folder_structure
+        try:
+            folder_structure = json.loads(json_string)
+        except json.JSONDecodeError as e:
+            console.print(Panel(f"Error parsing JSON: {e}", title="[bold red]JSON Parsing Error[/bold red]", title_align="left", border_style="red"))
+            console.print(Panel(f"Invalid JSON string: [bold]{json_string}[/bold]", title="[bold red]Invalid JSON String[/bold red]", title_align="left", border_style="red"))
+
+    code_blocks = [(filename, content) for filename, _, content in events if filename]
+
+    # Create the folder structure and code files
+    create_folder_structure(output_path(project_name), folder_structure, code_blocks)
     return code_blocks
 
+def split_file_path_from_objective(objective):
+    """
+    Splits a file path typed at the end of an objective (e.g. "Summarize this ./notes.txt") from the objective.
+
+    Args:
+        objective (str): The objective as entered by the user.
+
+    Returns:
+        tuple: (objective without the file path, file path or None)
+    """
+    if "./" in objective or "/" in objective:
+        file_paths = re.findall(r'[./\w]+\.[\w]+', objective)
+        if file_paths:
+            return objective.split(file_paths[0])[0].strip(), file_paths[0]
+    return objective, None
+
 #content = read_file("/home/drm/Documents/GitHub/maestro/15-39-49_create_a_snake_game_using.md")
 #pname = extract_project_name(content)
 #extract_and_write_project_files(content, pname)
\ No newline at end of file
@@ -0,0 +1,33 @@
+import os
+import maestro_api_router
+import maestro_batch
+import maestro_utils
+
+def test_resume_reruns_failed_runs_with_their_ids_in_their_folders(tmp_path, monkeypatch):
+    calls = []
+    down = [True]
+
+    def run_module(module_name, objective, run_id=None, **options):
+        calls.append((objective, run_id, maestro_utils.output_path("out.md")))
+        if objective == "Break" and down[0]:
+            raise RuntimeError("provider down")
+
+    monkeypatch.setattr(maestro_api_router, "get_module", lambda module_name: None)
+    monkeypatch.setattr(maestro_api_router, "get_required_args", lambda module_name: [])
+    monkeypatch.setattr(maestro_api_router, "run_module", run_module)
+    batch_dir, results, wall_seconds = maestro_batch.run_batch("maestro.py", [{'objective': "Work"}, {'objective': "Break"}],
+                                                               workers=1, output_dir=str(tmp_path))
+    maestro_batch.save_summary(batch_dir, "maestro.py", 1, wall_seconds, results)
+    assert [result['status'] for result in results] == ["succeeded", "failed"]
+
+    calls.clear()
+    down[0] = False
+    module_name, resumed, _ = maestro_batch.resume_batch(batch_dir, workers=1)
+
+    assert module_name == "maestro.py"
+    assert calls == [("Break", results[1]['run_id'], os.path.join(results[1]['output_dir'], "out.md"))]
+    assert [result['status'] for result in resumed] == ["succeeded", "succeeded"]
+    assert maestro_batch.load_summary(batch_dir)['runs'] == resumed
+    # The log of the failed attempt is kept
+    with open(os.path.join(results[1]['output_dir'], "run.log")) as log:
+        assert "provider down" in log.read()
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+import maestro_cache
+import maestro_llm
+from maestro_events import run_context
+from maestro_llm import LLMResponse
+from maestro_loop import Stage
+from maestro_metrics import get_metrics
+from maestro_providers import LMStudioProvider, OpenAIProvider
+
+def test_response_cache_hits_bypass_the_guard_and_count_as_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(maestro_cache, "RESPONSE_CACHE", True)
+    monkeypatch.setattr(maestro_cache, "response_cache", maestro_cache.ResponseCache(path=str(tmp_path / "responses.sqlite3")))
+    requests = []
+
+    def request(create, stage, title, stream, include_usage, **kwargs):
+        requests.append(kwargs)
+        return LLMResponse("Hello", 10, 5, "stop", None, 0.5)
+
+    monkeypatch.setattr(maestro_llm, "request_chat_completion", request)
+    provider = OpenAIProvider(api_key="test")
+    provider.sdk_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=None)))
+    stage = Stage(provider, "gpt-4o", "Sub-agent")
+
+    with run_context("cache-test"):
+        responses = [stage.complete("Sub-agent", [{"role": "user", "content": "Say hello"}]) for _ in range(3)]
+
+    assert [response.cached for response in responses] == [False, True, True]
+    assert len(requests) == 1
+    # Only the request itself went through the provider's rate limits and concurrency limit
+    assert provider.guard.stats()["calls"] == 1
+    stats = get_metrics().run_summary("cache-test")["Sub-agent"]
+    assert (stats["calls"], stats["cached_calls"], stats["input_tokens"], stats["output_tokens"]) == (1, 2, 10, 5)
+
+def test_same_model_on_two_servers_does_not_share_cached_responses(tmp_path, monkeypatch):
+    monkeypatch.setattr(maestro_cache, "RESPONSE_CACHE", True)
+    monkeypatch.setattr(maestro_cache, "response_cache", maestro_cache.ResponseCache(path=str(tmp_path / "responses.sqlite3")))
+    requests = []
+
+    def request(create, stage, title, stream, include_usage, **kwargs):
+        requests.append(kwargs)
+        return LLMResponse("Hello", 10, 5, "stop", None, 0.5)
+
+    monkeypatch.setattr(maestro_llm, "request_chat_completion", request)
+    stages = []
+    for provider in (OpenAIProvider(api_key="test"), LMStudioProvider(), LMStudioProvider(base_url="http://other:1234/v1")):
+        provider.sdk_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=None)))
+        stages.append(Stage(provider, "local-model", "Sub-agent"))
+
+    responses = [stage.complete("Sub-agent", [{"role": "user", "content": "Say hello"}]) for stage in stages + stages]
+
+    assert [response.cached for response in responses] == [False] * 3 + [True] * 3
+    assert len(requests) == 3
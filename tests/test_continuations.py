@@ -0,0 +1,60 @@
+import pytest
+from maestro_llm import LLMResponse
+from maestro_loop import CONTINUE_PROMPT, Backend, Stage, complete_with_continuations
+from maestro_providers import AnthropicProvider, GroqProvider, LMStudioProvider, OllamaProvider, OpenAIProvider
+
+PARTIAL = "Filename: app.py\n```python\ndef main():\n    print('hello')\n\n"
+REST = "main()\n```\n"
+
+def scripted_stage(provider_class, responses):
+    """
+    Returns a stage whose provider answers with `responses` in order and keeps the messages of every request.
+    """
+    class ScriptedProvider(provider_class):
+        def complete(self, stage, model, messages, system=None, max_tokens=None, title=None, **params):
+            self.requests.append(messages)
+            return responses.pop(0)
+
+    provider = ScriptedProvider()
+    provider.requests = []
+    return Stage(provider, "model", "Sub-agent")
+
+def run(stage):
+    backend = Backend("Test", stage, stage, stage)
+    messages = [{"role": "user", "content": "Write app.py"}]
+    return complete_with_continuations(backend, stage, "Sub-agent", messages), stage.provider.requests
+
+@pytest.mark.parametrize("provider_class", [OpenAIProvider, GroqProvider, LMStudioProvider, OllamaProvider])
+def test_chat_completion_providers_continue_in_a_user_turn(provider_class):
+    stage = scripted_stage(provider_class, [LLMResponse(PARTIAL, stop_reason="length"), LLMResponse(REST, stop_reason="stop")])
+
+    text, requests = run(stage)
+
+    assert text == PARTIAL + REST
+    continuation = requests[1]
+    assert [message["role"] for message in continuation] == ["user", "user"]
+    assert continuation[-1]["content"] == CONTINUE_PROMPT.format(text=PARTIAL)
+
+def test_chat_completion_continuation_that_restarts_the_answer_is_stitched_without_the_repeat():
+    # Models asked to continue often repeat the last lines first
+    stage = scripted_stage(OpenAIProvider, [LLMResponse(PARTIAL, stop_reason="length"), LLMResponse("    print('hello')\n\n" + REST, stop_reason="stop")])
+
+    text, _ = run(stage)
+
+    assert text == PARTIAL + REST
+
+def test_anthropic_continues_with_an_assistant_prefill():
+    stage = scripted_stage(AnthropicProvider, [LLMResponse(PARTIAL, stop_reason="max_tokens"), LLMResponse("\n\n" + REST, stop_reason="end_turn")])
+
+    text, requests = run(stage)
+
+    assert text == PARTIAL.rstrip() + "\n\n" + REST
+    assert requests[1][-1] == {"role": "assistant", "content": PARTIAL.rstrip()}
+
+def test_anthropic_prefill_continuation_keeps_a_line_that_repeats_the_end():
+    # The continuation is new text: the same statement twice in a row is what the model wrote
+    stage = scripted_stage(AnthropicProvider, [LLMResponse(PARTIAL, stop_reason="max_tokens"), LLMResponse("\n    print('hello')\n" + REST, stop_reason="end_turn")])
+
+    text, _ = run(stage)
+
+    assert text == PARTIAL.rstrip() + "\n    print('hello')\n" + REST
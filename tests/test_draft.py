@@ -0,0 +1,85 @@
+import functools
+import re
+import pytest
+import maestro_loop
+from maestro_draft import IncrementalDraft
+from maestro_journal import RunJournal
+from maestro_llm import LLMResponse
+from maestro_loop import TASK_COMPLETE, Backend, Stage, run_maestro_loop
+from maestro_providers import OpenAIProvider
+
+def text_of(messages):
+    return "\n".join(message["content"] if isinstance(message["content"], str) else "".join(block["text"] for block in message["content"])
+                     for message in messages)
+
+class ScriptedProvider(OpenAIProvider):
+    """
+    Plays a two-step run: the orchestrator asks for PART-A then PART-B, and each merge lists the results in its draft.
+    """
+    def __init__(self):
+        super().__init__(api_key="test")
+        self.calls = []
+        self.failing_merges = 0
+        self.refiner_error = None
+
+    def complete(self, stage, model, messages, system=None, max_tokens=None, title=None, run=None, **params):
+        text = text_of(messages)
+        self.calls.append((stage, text))
+        if stage == "Orchestrator":
+            reply = f"{TASK_COMPLETE} done" if "RESULT-B" in text else "Write PART-B" if "RESULT-A" in text else "Write PART-A"
+        elif stage == "Sub-agent":
+            reply = "RESULT-B" if "PART-B" in text else "RESULT-A"
+        elif stage == "Draft":
+            if self.failing_merges:
+                self.failing_merges -= 1
+                return LLMResponse("", stop_reason="stop")
+            reply = "DRAFT " + " ".join(sorted(set(re.findall(r"RESULT-[AB]", text))))
+        else:
+            if self.refiner_error:
+                raise self.refiner_error
+            reply = "Final output"
+        return LLMResponse(reply, stop_reason="stop")
+
+@pytest.fixture
+def scripted(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(maestro_loop, "RunJournal", functools.partial(RunJournal, directory=str(tmp_path / "runs")))
+    provider = ScriptedProvider()
+    stage = Stage(provider, "model", "Stage")
+    return provider, Backend("Test", stage, stage, stage, incremental_refine=True)
+
+def test_resumed_run_merges_results_of_failed_merges_instead_of_replaying_a_journaled_draft(scripted):
+    provider, backend = scripted
+    # The first step merges, the second step's merge and the retry of its results fail, then the refiner fails
+    provider.failing_merges = 2
+    provider.refiner_error = RuntimeError("refiner down")
+    with pytest.raises(RuntimeError):
+        run_maestro_loop(backend, "Build it", run_id="resume-test")
+
+    provider.calls = []
+    provider.failing_merges = 1
+    provider.refiner_error = None
+    run_maestro_loop(backend, "Build it", run_id="resume-test")
+
+    merges = [text for stage, text in provider.calls if stage == "Draft"]
+    # The first merge is replayed; the second fails again and its results are merged by the retry
+    assert len(merges) == 2
+    assert "RESULT-B" in merges[-1]
+    refine_input = [text for stage, text in provider.calls if stage == "Refiner"][0]
+    assert "DRAFT RESULT-A RESULT-B" in refine_input
+    assert not any(stage in ("Orchestrator", "Sub-agent") for stage, _ in provider.calls)
+
+def test_leftover_retry_has_no_sequence():
+    calls = []
+
+    def merge(step, draft, results, replacements, sequence):
+        calls.append((step, results, sequence))
+        # Only the retry of leftover results succeeds
+        return "merged" if sequence is None else None
+
+    draft = IncrementalDraft(merge)
+    draft.add(1, ["a"])
+    draft.add(2, ["b"])
+    assert draft.result() == "merged"
+    draft.close()
+    assert calls == [(1, ["a"], 0), (2, ["a", "b"], 1), (2, ["a", "b"], None)]
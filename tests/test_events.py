@@ -0,0 +1,50 @@
+import threading
+from maestro_events import EventBus, current_run_id, run_context
+
+def test_events_are_dropped_instead_of_blocking_when_the_queue_is_full():
+    delivering = threading.Event()
+    release = threading.Event()
+    delivered = []
+
+    def slow_subscriber(batch):
+        delivering.set()
+        release.wait(5)
+        delivered.extend(batch)
+
+    bus = EventBus(max_size=2, batch_size=1, interval=0)
+    bus.subscribe(slow_subscriber)
+    assert bus.publish(0)
+    assert delivering.wait(5)
+    # The dispatcher is stuck on event 0, so the queue holds two more events
+    assert [bus.publish(number) for number in (1, 2, 3)] == [True, True, False]
+    assert (bus.published, bus.dropped) == (3, 1)
+    assert not bus.flush(timeout=0.05)
+
+    release.set()
+    assert bus.flush(timeout=5)
+    assert delivered == [0, 1, 2]
+
+def test_events_are_delivered_in_batches_to_every_subscriber():
+    batches = []
+    bus = EventBus(batch_size=3, interval=0.5)
+
+    def failing_subscriber(batch):
+        raise RuntimeError("socket closed")
+
+    bus.subscribe(failing_subscriber)
+    bus.subscribe(batches.append)
+    for number in range(7):
+        bus.publish(number)
+    assert bus.flush(timeout=5)
+
+    # A failing subscriber does not keep the batches from the others; the last batch is sent once the interval is up
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+    bus.unsubscribe(batches.append)
+    bus.publish(7)
+    assert bus.flush(timeout=5)
+    assert len(batches) == 3
+
+def test_run_context_tags_the_current_run():
+    with run_context("run"):
+        assert current_run_id.get() == "run"
+    assert current_run_id.get() is None
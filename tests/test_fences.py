@@ -0,0 +1,60 @@
+from maestro_fences import CodeFenceParser, parse_code_fences
+
+RESPONSE = """Project Name: **demo**
+
+Here is `app.py`:
+```python
+def main():
+    print("hi")
+```
+
+<folder_structure>
+```json
+{"demo": {"app.py": null}}
+```
+</folder_structure>
+
+README.md
+````markdown
+Usage:
+```bash
+python app.py
+```
+````
+"""
+
+def feed_in_chunks(text, size):
+    parser = CodeFenceParser()
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    events.extend(parser.close())
+    return events, parser
+
+def test_chunk_boundaries_do_not_change_the_blocks():
+    expected, parser = parse_code_fences(RESPONSE)
+    assert [filename for filename, _, _ in expected] == ["app.py", "README.md"]
+    for size in (1, 2, 3, 7, 64):
+        events, chunked = feed_in_chunks(RESPONSE, size)
+        assert events == expected
+        assert (chunked.project_name, chunked.folder_structure) == (parser.project_name, parser.folder_structure)
+    assert parser.project_name == "demo"
+    assert parser.folder_structure == '{"demo": {"app.py": null}}'
+
+def test_a_block_is_returned_when_its_closing_fence_arrives():
+    parser = CodeFenceParser()
+    assert parser.feed("File: main.py\n```python\nx = 1\n") == []
+    assert parser.feed("``") == []
+    assert parser.feed("`\nmore text") == [("main.py", "python", "x = 1")]
+
+def test_a_shorter_fence_inside_a_block_is_content():
+    events, _ = parse_code_fences(RESPONSE)
+    assert events[1] == ("README.md", "markdown", "Usage:\n```bash\npython app.py\n```")
+
+def test_an_unterminated_block_is_closed_at_the_end():
+    events, _ = parse_code_fences("```python config.py\nDEBUG = True")
+    assert events == [("config.py", "python", "DEBUG = True")]
+
+def test_text_before_the_start_marker_is_ignored():
+    events, _ = parse_code_fences("```\nignored.py\n```\nFINAL\n```\nkept\n```", start_marker="FINAL")
+    assert [content for _, _, content in events] == ["kept"]
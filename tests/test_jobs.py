@@ -0,0 +1,56 @@
+import threading
+import time
+import pytest
+from maestro_jobs import JobQueue, QueueFullError
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_a_full_queue_rejects_submissions_until_a_worker_frees_a_place():
+    release = threading.Event()
+    updates = []
+
+    def run_job(job):
+        release.wait(5)
+        if job.objective == "fail":
+            raise RuntimeError("broken")
+
+    jobs = JobQueue(run_job, max_workers=1, max_queued=1, on_update=lambda job: updates.append((job.objective, job.status)))
+    running = jobs.submit("maestro.py", "run")
+    wait_for(lambda: running.status == 'running')
+    queued = jobs.submit("maestro.py", "fail")
+    with pytest.raises(QueueFullError):
+        jobs.submit("maestro.py", "rejected")
+    assert [job.objective for job in jobs.list()] == ["run", "fail"]
+
+    release.set()
+    wait_for(lambda: ("fail", 'failed') in updates)
+    assert (running.status, queued.status, queued.error) == ('succeeded', 'failed', "broken")
+    assert [status for objective, status in updates if objective == "fail"] == ['queued', 'running', 'failed']
+    assert jobs.stats()['counts'] == {'succeeded': 1, 'failed': 1}
+    jobs.submit("maestro.py", "accepted again")
+
+def test_only_the_latest_finished_jobs_are_kept():
+    jobs = JobQueue(lambda job: None, max_workers=1, max_finished=2)
+    submitted = [jobs.submit("maestro.py", str(number)) for number in range(4)]
+    wait_for(lambda: all(job.finished_at is not None for job in submitted) and len(jobs.list()) == 2)
+    assert [job.objective for job in jobs.list()] == ["2", "3"]
+    assert jobs.get(submitted[0].id) is None
+
+def test_the_app_answers_503_with_retry_after_when_the_queue_is_full(monkeypatch):
+    app_module = pytest.importorskip("flask_app.app")
+    # No workers, so submitted jobs stay queued
+    monkeypatch.setattr(app_module, "jobs", JobQueue(lambda job: None, max_workers=0, max_queued=1))
+    monkeypatch.setattr(app_module.maestro, "get_required_args", lambda module_name: [])
+    client = app_module.app.test_client()
+
+    accepted = client.post("/", data={'selected_file': "maestro.py", 'objective': "Build it"})
+    rejected = client.post("/", data={'selected_file': "maestro.py", 'objective': "Build it"})
+
+    assert accepted.status_code == 202 and accepted.get_json()['status'] == "queued"
+    assert rejected.status_code == 503
+    assert rejected.headers['Retry-After'] == '30'
+    assert rejected.get_json()['status'] == "rejected"
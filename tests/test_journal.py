@@ -0,0 +1,109 @@
+import functools
+import pytest
+import maestro_loop
+from maestro_journal import RunJournal, latest_unfinished_run, read_journal, write_report
+from maestro_llm import LLMResponse
+from maestro_loop import TASK_COMPLETE, Backend, Stage, run_maestro_loop
+from maestro_providers import OpenAIProvider
+
+class FlakyProvider(OpenAIProvider):
+    """
+    Plays a two-step run whose second sub-agent call fails once.
+    """
+    def __init__(self):
+        super().__init__(api_key="test")
+        self.calls = []
+        self.failures = 1
+
+    def complete(self, stage, model, messages, system=None, max_tokens=None, title=None, run=None, **params):
+        text = "\n".join(str(message["content"]) for message in messages)
+        self.calls.append(stage)
+        if stage == "Orchestrator":
+            reply = f"{TASK_COMPLETE} done" if "RESULT-B" in text else "Write PART-B" if "RESULT-A" in text else "Write PART-A"
+        elif stage == "Sub-agent":
+            if "PART-B" in text and self.failures:
+                self.failures -= 1
+                raise RuntimeError("provider down")
+            reply = "RESULT-B" if "PART-B" in text else "RESULT-A"
+        else:
+            reply = "Final output"
+        return LLMResponse(reply, stop_reason="stop")
+
+def test_reopening_a_journal_replays_its_state_and_continues_its_numbering(tmp_path):
+    directory = str(tmp_path)
+    journal = RunJournal("run", directory)
+    journal.append('run_started', objective="Build it", use_search=False, parallel=True)
+    journal.append('orchestrator', step=0, prompt="Write it")
+    journal.append('sub_agent', step=0, index=0, result="cheap", tier=0)
+    journal.append('cascade_rejected', step=0, index=0, tier=0)
+    journal.append('sub_agent', step=0, index=1, result="kept", tier=0)
+    journal.append('search', query="q", answer="a")
+    journal.close()
+    with open(journal.path, 'a') as file:
+        file.write('{"seq": 6, "type": "refi')
+
+    resumed = RunJournal("run", directory)
+    state = resumed.state
+
+    assert resumed.resumed and state.started['objective'] == "Build it"
+    assert state.orchestrator[0]['prompt'] == "Write it"
+    # The rejected result runs again on the next tier; the other one is replayed
+    assert state.sub_agents == {(0, 1): "kept"}
+    assert state.escalations == {(0, 0): 1}
+    assert state.searches == {"q": "a"}
+    assert state.refined is None and not state.finished
+    # The line cut off by the crash is dropped and its sequence number reused
+    assert resumed.append('refine', text="Final")['seq'] == 6
+    resumed.close()
+    assert [event['type'] for event in read_journal("run", directory)][-2:] == ['search', 'refine']
+
+def test_a_resumed_run_replays_the_journal_and_continues_from_the_failed_call(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(maestro_loop, "RunJournal", functools.partial(RunJournal, directory=str(tmp_path / "runs")))
+    provider = FlakyProvider()
+    stage = Stage(provider, "model", "Stage")
+    backend = Backend("Test", stage, stage, stage)
+    with pytest.raises(RuntimeError):
+        run_maestro_loop(backend, "Build it", run_id="resume-test")
+    assert provider.calls == ["Orchestrator", "Sub-agent", "Orchestrator", "Sub-agent"]
+
+    provider.calls = []
+    # The objective comes from the journal
+    exchanges = run_maestro_loop(backend, "Ignored", run_id="resume-test")
+
+    assert provider.calls == ["Sub-agent", "Orchestrator", "Refiner"]
+    assert [result for _, result in exchanges] == ["RESULT-A", "RESULT-B"]
+    events = list(read_journal("resume-test", str(tmp_path / "runs")))
+    assert [event['type'] for event in events].count('run_started') == 1
+    assert events[-1]['type'] == 'run_finished'
+
+def test_a_run_is_unfinished_until_its_last_event_is_run_finished(tmp_path):
+    directory = str(tmp_path)
+    assert latest_unfinished_run(directory) is None
+    journal = RunJournal("run", directory)
+    journal.append('run_started', objective="Build it")
+    assert latest_unfinished_run(directory) == "run"
+    journal.append('run_finished')
+    journal.close()
+    assert latest_unfinished_run(directory) is None
+    assert RunJournal("run", directory).state.finished
+
+def test_report_ends_with_the_code_blocks_of_a_code_fence_run(tmp_path):
+    events = [
+        {'type': 'run_started', 'objective': "Build it"},
+        {'type': 'sub_agent', 'index': 0, 'prompt': "Write it", 'result': "Done"},
+        {'type': 'refine', 'text': "Final output\n"},
+        {'type': 'files', 'paths': ["app.py", "util.py"], 'blocks': [["app.py", "print(1)\n"], ["util.py", "x = 2\n"]]},
+    ]
+    path = tmp_path / "report.md"
+    write_report(events, str(path))
+
+    report = path.read_text()
+    assert report.startswith("Objective: Build it\n\n")
+    assert "Task 1:\nPrompt: Write it\nResult: Done\n\n" in report
+    assert report.endswith("Final output\napp.py\nprint(1)\nutil.py\nx = 2\n")
+
+def test_files_without_blocks_add_nothing(tmp_path):
+    path = tmp_path / "report.md"
+    write_report([{'type': 'refine', 'text': "Final output"}, {'type': 'files', 'paths': ["app.py"]}], str(path))
+    assert path.read_text().endswith("Final output")
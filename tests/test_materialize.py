@@ -0,0 +1,29 @@
+import os
+import maestro_materialize
+from maestro_materialize import FILE_MODE, materialize
+
+def test_unchanged_files_are_skipped_and_changed_ones_rewritten(tmp_path):
+    app, util = str(tmp_path / "src" / "app.py"), str(tmp_path / "util.py")
+    assert materialize([(app, "print(1)\n"), (util, "x = 1\n")])['written'] == [app, util]
+    os.utime(app, (0, 0))
+
+    report = materialize([(app, "print(1)\n"), (util, "x = 2\n")])
+
+    assert (report['written'], report['unchanged'], report['failed']) == ([util], [app], [])
+    assert os.path.getmtime(app) == 0
+    assert open(util).read() == "x = 2\n"
+    assert os.stat(util).st_mode & 0o777 == FILE_MODE
+
+def test_a_failed_write_keeps_the_old_file_and_leaves_no_temporary_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "app.py")
+    materialize([(path, "old\n")])
+
+    def replace(source, target):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(maestro_materialize.os, "replace", replace)
+    report = materialize([(path, "new\n")])
+
+    assert report['failed'] == [(path, "disk full")]
+    assert open(path).read() == "old\n"
+    assert os.listdir(tmp_path) == ["app.py"]
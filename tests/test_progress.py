@@ -0,0 +1,59 @@
+import json
+from maestro_progress import ProgressStore
+
+def events(run_id, count, start=0):
+    return [{'run_id': run_id, 'message': f"event {number}"} for number in range(start, start + count)]
+
+def messages(page):
+    return [event['message'] for event in page['events']]
+
+def test_pages_past_the_ring_buffer_are_read_from_disk(tmp_path):
+    store = ProgressStore(str(tmp_path), max_events_per_run=3)
+    store.append(events("run", 10))
+
+    first = store.page("run", 0, limit=4)
+    assert messages(first) == [f"event {number}" for number in range(4)]
+    assert (first['next_offset'], first['total']) == (4, 10)
+    last = store.page("run", 8, limit=4)
+    assert messages(last) == ["event 8", "event 9"]
+    assert [event['seq'] for event in last['events']] == [8, 9]
+    assert store.page("run", 10)['events'] == []
+
+def test_evicted_runs_are_served_from_disk_and_keep_their_numbering(tmp_path):
+    store = ProgressStore(str(tmp_path), max_runs=1)
+    store.append(events("first", 2))
+    store.append(events("second", 1))
+    assert list(store.runs) == ["second"]
+
+    assert store.page("first")['total'] == 2
+    assert messages(store.page("first")) == ["event 0", "event 1"]
+    stored = store.append(events("first", 1, start=2))
+    assert stored[0]['seq'] == 2
+
+def test_memory_only_store_pages_its_ring_buffer():
+    store = ProgressStore(None, max_events_per_run=2)
+    store.append(events("run", 5))
+    assert messages(store.page("run", 3)) == ["event 3", "event 4"]
+    assert store.page("run", 0)['events'] == []
+
+def test_a_line_still_being_written_is_not_read(tmp_path):
+    store = ProgressStore(str(tmp_path), max_runs=1)
+    store.append(events("run", 2))
+    store.append(events("other", 1))
+    with open(store.path_for("run"), 'a') as file:
+        file.write(json.dumps({'run_id': "run", 'message': "event 2"})[:10])
+
+    page = store.page("run")
+    assert messages(page) == ["event 0", "event 1"]
+    assert page['total'] == 2
+    # Once the run is loaded again, the cut off line is dropped instead of being glued to the next event
+    store.append(events("run", 1, start=2))
+    assert messages(store.page("run")) == ["event 0", "event 1", "event 2"]
+
+def test_run_ids_are_the_original_ids(tmp_path):
+    store = ProgressStore(str(tmp_path), max_runs=1)
+    store.append(events("job/1", 1))
+    store.append(events("job 2", 1))
+
+    assert store.run_ids() == ["job 2", "job/1"]
+    assert ProgressStore(str(tmp_path)).run_ids() in (["job 2", "job/1"], ["job/1", "job 2"])
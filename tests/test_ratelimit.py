@@ -0,0 +1,73 @@
+import json
+import pytest
+import maestro_ratelimit
+from maestro_llm import request_anthropic
+from maestro_ratelimit import ProviderGuard, classify_error
+
+anthropic = pytest.importorskip("anthropic")
+# The HTTP library the installed SDK is built on (its mock transport answers the requests)
+httpx = getattr(anthropic._base_client, "httpx", None) or getattr(anthropic._base_client, "httpx2")
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+MESSAGE_START = sse("message_start", {"type": "message_start", "message": {
+    "id": "msg_1", "type": "message", "role": "assistant", "model": "claude-3-haiku-20240307", "content": [],
+    "stop_reason": None, "stop_sequence": None, "usage": {"input_tokens": 10, "output_tokens": 1},
+}})
+
+def streamed_error(error_type):
+    # The API reports errors that happen after the stream started as an error event on a 200 response
+    return MESSAGE_START + sse("error", {"type": "error", "error": {"type": error_type, "message": "Overloaded"}})
+
+STREAMED_MESSAGE = MESSAGE_START + "".join([
+    sse("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}),
+    sse("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "Hello"}}),
+    sse("content_block_stop", {"type": "content_block_stop", "index": 0}),
+    sse("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": 2}}),
+    sse("message_stop", {"type": "message_stop"}),
+])
+
+def client_streaming(bodies):
+    """
+    Returns an Anthropic client whose requests are answered with the SSE `bodies` in order, each with a 200 status.
+    """
+    def handler(request):
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=bodies.pop(0).encode("utf-8"))
+
+    return anthropic.Anthropic(api_key="test", base_url="http://mock", max_retries=0, http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+
+def stream(client):
+    return request_anthropic(client, "Sub-agent", stream=True, model="claude-3-haiku-20240307", max_tokens=16, messages=[{"role": "user", "content": "Hi"}])
+
+@pytest.mark.parametrize("error_type, kind", [("overloaded_error", "throttled"), ("rate_limit_error", "throttled"), ("api_error", "retryable"), ("invalid_request_error", None)])
+def test_streamed_error_events_are_classified_by_their_type(error_type, kind):
+    with pytest.raises(anthropic.APIStatusError) as raised:
+        stream(client_streaming([streamed_error(error_type)]))
+
+    assert raised.value.status_code == 200
+    assert classify_error(raised.value) == kind
+
+def test_streamed_overload_is_retried(monkeypatch):
+    monkeypatch.setattr(maestro_ratelimit, "backoff_delay", lambda attempt: 0.0)
+    client = client_streaming([streamed_error("overloaded_error"), STREAMED_MESSAGE])
+    guard = ProviderGuard("test")
+    retried = []
+
+    response = guard.call(lambda: stream(client), on_retry=retried.append)
+
+    assert response.text == "Hello"
+    assert len(retried) == 1
+    assert guard.stats()["throttled"] == 1
+
+def test_interrupted_call_releases_its_concurrency_slot():
+    guard = ProviderGuard("test")
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        guard.call(interrupted)
+
+    assert guard.concurrency.in_flight == 0
+    assert guard.call(lambda: "done") == "done"
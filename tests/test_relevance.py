@@ -0,0 +1,65 @@
+from maestro_compaction import estimate_tokens
+from maestro_relevance import OMITTED_MARKER, RelevanceIndex, split_chunks, terms
+
+def paragraphs(topic, count, words=60):
+    return "\n\n".join(" ".join(f"{topic}{number}" for number in range(words)) for _ in range(count))
+
+def test_terms_split_identifiers_and_drop_stop_words():
+    assert terms("Write parse_csv and parseJson for the task") == ["parse", "csv", "parse", "json"]
+
+def test_split_chunks_cuts_at_blank_lines_and_keeps_short_code_blocks_whole():
+    code = "```python\n" + "\n\n".join(f"x{line} = {line}" for line in range(15)) + "\n```"
+    text = paragraphs("intro", 3) + "\n\n" + code + "\n\nTail."
+    chunks = split_chunks(text, chunk_tokens=60)
+
+    assert "\n".join(chunks) == text
+    # The code block has blank lines, but is only cut when it is more than twice the chunk size
+    assert any(code in chunk for chunk in chunks)
+
+def test_split_chunks_cuts_long_code_blocks():
+    code = "```\n" + "\n\n".join("value = " + "1" * 40 for _ in range(30)) + "\n```"
+    chunks = split_chunks(code, chunk_tokens=20)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 2 * 20 + 15 for chunk in chunks)
+
+def test_no_budget_gives_every_task():
+    index = RelevanceIndex(token_budget=None)
+    tasks = [{"task": "Write the parser", "result": paragraphs("parser", 20)}]
+    index.add(0, tasks[0]["task"], tasks[0]["result"])
+    assert index.select("Write the database layer", tasks) is tasks
+
+def test_past_the_budget_the_best_matching_chunks_are_given():
+    tasks = [
+        {"task": "Write the database layer", "result": "The database uses sqlite tables for users.\n\n" + paragraphs("filler", 6, words=10)},
+        {"task": "Write the css styles", "result": "Styles for the page colors.\n\n" + paragraphs("padding", 6, words=10)},
+        {"task": "Write the router", "result": "Routes map urls to handlers."},
+    ]
+    index = RelevanceIndex(token_budget=150, chunk_tokens=40, keep_recent=1)
+    for position, task in enumerate(tasks):
+        index.add(position, task["task"], task["result"])
+
+    context = index.select("Query the sqlite database for users", tasks)
+
+    # The most recent task is kept whole, and the database chunk wins over the styles
+    assert context[-1] == tasks[-1]
+    database = next(task for task in context if task["task"] == tasks[0]["task"])
+    assert database["result"].startswith("The database uses sqlite tables")
+    assert OMITTED_MARKER in database["result"]
+    assert all(task["task"] != tasks[1]["task"] for task in context)
+    stats = index.stats()
+    assert stats["selected_calls"] == 1 and stats["saved_tokens"] > 0
+
+def test_an_escalated_result_replaces_the_indexed_one():
+    index = RelevanceIndex(token_budget=50, chunk_tokens=40, keep_recent=0)
+    index.add(0, "Write the module", "The cheap answer mentions kafka queues.")
+    index.add(1, "Write the other module", paragraphs("unrelated", 4))
+    before = (index.chunk_count, index.total_length)
+    index.add(0, "Write the module", "The escalated answer mentions redis caches.")
+
+    assert index.chunk_count == before[0]
+    assert index.document_frequency["kafka"] == 0 and "kafka" not in index.document_frequency
+    assert index.document_frequency["redis"] == 1
+    tasks = [{"task": "Write the module", "result": "The escalated answer mentions redis caches."},
+             {"task": "Write the other module", "result": paragraphs("unrelated", 4)}]
+    context = index.select("Configure redis", tasks)
+    assert context[0]["result"] == "The escalated answer mentions redis caches."